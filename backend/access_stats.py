@@ -0,0 +1,415 @@
+"""
+nginx 访问日志统计
+从上次读取的位置增量读取 access.log，在进程池中解析 combined 格式，按分钟聚合后保留最近一段时间的滚动统计：
+请求速率、状态码分布、访问最多 / 最慢的路径、$request_time 的 p50 / p95 / p99
+
+- 解析是 CPU 密集的，放在进程池中执行，不占用 API 的事件循环和 SSH 线程池
+- request_time 用可以直接合并的分位数草图统计，分钟之间、服务器之间都能合并，全量统计不需要保留原始数据
+"""
+import asyncio
+import math
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from ssh_manager import ssh_manager, server_connect_kwargs
+from log_parser import LOG_SOURCES
+from log_tail import read_log_range
+
+
+# 滚动统计保留的分钟数
+ACCESS_STATS_WINDOW_MINUTES = int(os.getenv("ACCESS_STATS_WINDOW_MINUTES", "60"))
+# 首次读取时从文件末尾回溯的字节数
+ACCESS_STATS_INITIAL_BYTES = int(os.getenv("ACCESS_STATS_INITIAL_BYTES", str(8 * 1024 * 1024)))
+# 两次增量读取的最短间隔（秒），间隔内的请求直接返回已有统计
+ACCESS_STATS_MIN_REFRESH = float(os.getenv("ACCESS_STATS_MIN_REFRESH", "2"))
+# 解析进程数，以及每个解析任务的大小
+ACCESS_STATS_WORKERS = int(os.getenv("ACCESS_STATS_WORKERS", "2"))
+ACCESS_STATS_CHUNK_BYTES = 1024 * 1024
+# 每分钟保留的路径数（按请求数），避免路径很多时内存无限增长
+ACCESS_STATS_MAX_PATHS = 500
+
+ACCESS_LOG_PATH = LOG_SOURCES["nginx-access"]["path"]
+
+# combined 格式，可选的 $request_time 在行尾：
+# 1.2.3.4 - - [10/Oct/2026:13:55:36 +0800] "GET /api/x?a=1 HTTP/1.1" 200 612 "-" "Mozilla/5.0" 0.012
+_ACCESS_LINE = re.compile(
+    r'\S+ \S+ \S+ \[(?P<minute>\d{2}/\w{3}/\d{4}:\d{2}:\d{2}):(?P<second>\d{2}) (?P<tz>[+-]\d{4})\] '
+    r'"\S+ (?P<path>[^ ?"]*)[^"]*" (?P<status>\d{3}) (?P<bytes>\d+|-)'
+    r'(?:.*\s(?P<request_time>\d+\.\d+))?\s*$'
+)
+_MONTHS = {name: index for index, name in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1
+)}
+
+
+class QuantileSketch:
+    """
+    对数分桶的分位数草图（DDSketch）：值落在 gamma 的整数次幂区间中，分位数的相对误差不超过 relative_accuracy
+    两个草图合并只需把各桶计数相加
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        # 小于 1 毫秒的值（包括 0）单独计数
+        self.zero = 0
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        if value > self.max:
+            self.max = value
+        if value < 0.001:
+            self.zero += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def merge(self, other: "QuantileSketch"):
+        self.count += other.count
+        self.zero += other.zero
+        self.max = max(self.max, other.max)
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # 桶 (gamma^(i-1), gamma^i] 的代表值
+                return min(2 * self.gamma ** index / (self.gamma + 1), self.max)
+        return self.max
+
+
+class MinuteStats:
+    """一分钟内的访问统计"""
+
+    __slots__ = ("requests", "bytes", "status", "paths", "request_time")
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.status: Counter = Counter()
+        # 路径 -> [请求数, request_time 总和, request_time 最大值, 带 request_time 的请求数]
+        self.paths: Dict[str, List[float]] = {}
+        self.request_time = QuantileSketch()
+
+    def merge(self, other: "MinuteStats"):
+        self.requests += other.requests
+        self.bytes += other.bytes
+        self.status.update(other.status)
+        for path, values in other.paths.items():
+            current = self.paths.get(path)
+            if current is None:
+                self.paths[path] = list(values)
+            else:
+                current[0] += values[0]
+                current[1] += values[1]
+                current[2] = max(current[2], values[2])
+                current[3] += values[3]
+        self.request_time.merge(other.request_time)
+
+    def trim_paths(self, limit: int = ACCESS_STATS_MAX_PATHS):
+        if len(self.paths) > limit:
+            kept = sorted(self.paths.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+            self.paths = dict(kept)
+
+
+def parse_access_chunk(text: str) -> Dict[str, Any]:
+    """
+    解析一段 access.log（在进程池中执行）
+
+    Returns:
+        {"minutes": {分钟时间戳: MinuteStats}, "parsed": int, "skipped": int}
+    """
+    minutes: Dict[int, MinuteStats] = {}
+    minute_cache: Dict[str, int] = {}
+    parsed = skipped = 0
+    match_line = _ACCESS_LINE.match
+    for line in text.splitlines():
+        match = match_line(line)
+        if not match:
+            if line.strip():
+                skipped += 1
+            continue
+        parsed += 1
+        # 同一分钟的时间只解析一次
+        key = match.group("minute") + match.group("tz")
+        minute = minute_cache.get(key)
+        if minute is None:
+            minute = _minute_epoch(match.group("minute"), match.group("tz"))
+            minute_cache[key] = minute
+        stats = minutes.get(minute)
+        if stats is None:
+            stats = minutes[minute] = MinuteStats()
+
+        stats.requests += 1
+        size = match.group("bytes")
+        if size != "-":
+            stats.bytes += int(size)
+        stats.status[match.group("status")] += 1
+        path_stats = stats.paths.get(match.group("path"))
+        if path_stats is None:
+            path_stats = stats.paths[match.group("path")] = [0, 0.0, 0.0, 0]
+        path_stats[0] += 1
+        request_time = match.group("request_time")
+        if request_time is not None:
+            value = float(request_time)
+            stats.request_time.add(value)
+            path_stats[1] += value
+            path_stats[3] += 1
+            if value > path_stats[2]:
+                path_stats[2] = value
+    for stats in minutes.values():
+        stats.trim_paths()
+    return {"minutes": minutes, "parsed": parsed, "skipped": skipped}
+
+
+def _minute_epoch(minute: str, tz: str) -> int:
+    """10/Oct/2026:13:55 +0800 -> 该分钟开始的 UTC 时间戳"""
+    day, month, rest = minute.split("/")
+    year, hour, mins = rest.split(":")
+    days = _days_from_civil(int(year), _MONTHS[month], int(day))
+    offset = (int(tz[1:3]) * 60 + int(tz[3:5])) * (1 if tz[0] == "+" else -1)
+    return (days * 1440 + int(hour) * 60 + int(mins) - offset) * 60
+
+
+def _days_from_civil(year: int, month: int, day: int) -> int:
+    """公历日期距 1970-01-01 的天数"""
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _split_chunks(text: str, size: int) -> List[str]:
+    """按行边界切分为大约 size 字符的若干段"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + size)
+        end = len(text) if end < 0 else end + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def summarize(minutes: Dict[int, MinuteStats], window_minutes: int, top: int = 10, now: Optional[float] = None) -> Dict[str, Any]:
+    """把窗口内的分钟统计汇总为接口返回的格式"""
+    now = now if now is not None else time.time()
+    start = (int(now) // 60 - window_minutes + 1) * 60
+    total = MinuteStats()
+    series = []
+    for minute in sorted(minutes):
+        if minute < start:
+            continue
+        stats = minutes[minute]
+        total.merge(stats)
+        errors = sum(count for status, count in stats.status.items() if status >= "500")
+        series.append({"minute": minute, "requests": stats.requests, "errors": errors, "rps": round(stats.requests / 60, 3)})
+
+    # 当前分钟还没过完，最近一分钟的速率按已经过去的秒数计算
+    current = minutes.get(int(now) // 60 * 60)
+    elapsed = max(now - int(now) // 60 * 60, 1)
+    status_classes = Counter()
+    for status, count in total.status.items():
+        status_classes[f"{status[0]}xx"] += count
+
+    paths = [
+        {
+            "path": path,
+            "requests": int(values[0]),
+            "avg_time": round(values[1] / values[3], 4) if values[3] else None,
+            "max_time": round(values[2], 4) if values[3] else None,
+        }
+        for path, values in total.paths.items()
+    ]
+    top_paths = sorted(paths, key=lambda item: item["requests"], reverse=True)[:top]
+    # 最慢的路径：至少有 5 次带 request_time 的请求，按平均耗时排序
+    slow_paths = sorted(
+        (item for item in paths if item["avg_time"] is not None and total.paths[item["path"]][3] >= 5),
+        key=lambda item: item["avg_time"],
+        reverse=True,
+    )[:top]
+
+    sketch = total.request_time
+    return {
+        "window_minutes": window_minutes,
+        "from": start,
+        "to": now,
+        "requests": total.requests,
+        "bytes": total.bytes,
+        "rps": round(total.requests / (window_minutes * 60), 3),
+        "rps_current": round((current.requests if current else 0) / elapsed, 3),
+        "status": dict(sorted(total.status.items())),
+        "status_classes": dict(sorted(status_classes.items())),
+        "error_rate": round(status_classes.get("5xx", 0) / total.requests, 4) if total.requests else 0.0,
+        "top_paths": top_paths,
+        "slow_paths": slow_paths,
+        "request_time": {
+            "count": sketch.count,
+            "p50": sketch.quantile(0.5),
+            "p95": sketch.quantile(0.95),
+            "p99": sketch.quantile(0.99),
+            "max": sketch.max if sketch.count else None,
+        },
+        "series": series,
+    }
+
+
+class ServerAccessStats:
+    """一台服务器 access.log 的增量读取位置和滚动统计"""
+
+    def __init__(self, server_id: str):
+        self.server_id = server_id
+        self.cursor: Optional[str] = None
+        self.minutes: Dict[int, MinuteStats] = {}
+        self.parsed = 0
+        self.skipped = 0
+        self.refreshed_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.missing = False
+        self.lock = asyncio.Lock()
+
+    def add(self, partial: Dict[str, Any]):
+        for minute, stats in partial["minutes"].items():
+            current = self.minutes.get(minute)
+            if current is None:
+                self.minutes[minute] = stats
+            else:
+                current.merge(stats)
+                current.trim_paths()
+        self.parsed += partial["parsed"]
+        self.skipped += partial["skipped"]
+
+    def evict(self, window_minutes: int, now: float):
+        oldest = (int(now) // 60 - window_minutes + 1) * 60
+        for minute in [minute for minute in self.minutes if minute < oldest]:
+            del self.minutes[minute]
+
+
+class AccessStatsCollector:
+    """各服务器 access.log 统计的全局入口"""
+
+    def __init__(self, window_minutes: int = ACCESS_STATS_WINDOW_MINUTES, workers: int = ACCESS_STATS_WORKERS):
+        self.window_minutes = window_minutes
+        self.workers = workers
+        self._servers: Dict[str, ServerAccessStats] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        """应用退出时关闭解析进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _parse(self, text: str) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        return await asyncio.gather(*(
+            loop.run_in_executor(pool, parse_access_chunk, chunk)
+            for chunk in _split_chunks(text, ACCESS_STATS_CHUNK_BYTES)
+        ))
+
+    async def refresh(self, server_config: Dict[str, Any], force: bool = False) -> ServerAccessStats:
+        """读取一台服务器 access.log 自上次以来新增的内容并更新统计"""
+        server_id = server_config["server_id"]
+        stats = self._servers.setdefault(server_id, ServerAccessStats(server_id))
+        async with stats.lock:
+            now = time.time()
+            if not force and stats.refreshed_at is not None and now - stats.refreshed_at < ACCESS_STATS_MIN_REFRESH:
+                return stats
+            result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
+            if not result.get("success"):
+                stats.error = f"SSH连接失败: {result.get('message')}"
+                return stats
+            conn = result["connection"]
+            while True:
+                range_result = await ssh_manager.run_blocking(
+                    read_log_range, conn, ACCESS_LOG_PATH, stats.cursor, initial_bytes=ACCESS_STATS_INITIAL_BYTES
+                )
+                if not range_result["success"]:
+                    stats.error = range_result["error"]
+                    break
+                stats.error = None
+                stats.missing = range_result["missing"]
+                if stats.missing:
+                    break
+                if range_result["content"]:
+                    for partial in await self._parse(range_result["content"]):
+                        stats.add(partial)
+                stats.cursor = range_result["cursor"]
+                if not range_result["has_more"] or not range_result["content"]:
+                    break
+            stats.refreshed_at = time.time()
+            stats.evict(self.window_minutes, stats.refreshed_at)
+            return stats
+
+    def _response(self, stats: ServerAccessStats, window_minutes: int, top: int) -> Dict[str, Any]:
+        return {
+            "server_id": stats.server_id,
+            "success": stats.error is None,
+            "error": stats.error,
+            "missing": stats.missing,
+            "log_file": ACCESS_LOG_PATH,
+            "refreshed_at": stats.refreshed_at,
+            "parsed_lines": stats.parsed,
+            "skipped_lines": stats.skipped,
+            **summarize(stats.minutes, window_minutes, top),
+        }
+
+    async def server_stats(self, server_config: Dict[str, Any], window_minutes: Optional[int] = None, top: int = 10) -> Dict[str, Any]:
+        """一台服务器的统计"""
+        window = min(window_minutes or self.window_minutes, self.window_minutes)
+        stats = await self.refresh(server_config)
+        return self._response(stats, window, top)
+
+    async def fleet_stats(self, servers: List[Dict[str, Any]], window_minutes: Optional[int] = None, top: int = 10) -> Dict[str, Any]:
+        """所有服务器合并后的统计，以及每台服务器的概况"""
+        window = min(window_minutes or self.window_minutes, self.window_minutes)
+        refreshed = await asyncio.gather(*(self.refresh(server) for server in servers), return_exceptions=True)
+        merged: Dict[int, MinuteStats] = {}
+        per_server = {}
+        for server, stats in zip(servers, refreshed):
+            if isinstance(stats, Exception):
+                per_server[server["server_id"]] = {"success": False, "error": str(stats)}
+                continue
+            summary = self._response(stats, window, top)
+            per_server[stats.server_id] = {
+                key: summary[key]
+                for key in ("success", "error", "missing", "requests", "rps", "rps_current", "error_rate", "request_time", "status_classes")
+            }
+            for minute, minute_stats in stats.minutes.items():
+                target = merged.setdefault(minute, MinuteStats())
+                target.merge(minute_stats)
+        for minute_stats in merged.values():
+            minute_stats.trim_paths()
+        return {
+            "success": all(item["success"] for item in per_server.values()),
+            **summarize(merged, window, top),
+            "servers": per_server,
+        }
+
+
+# 全局访问日志统计实例
+access_stats = AccessStatsCollector()
@@ -43,6 +43,19 @@ engine = create_engine(
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 日志索引库（见 log_index.py）
+# 依赖 SQLite 的 FTS5 全文索引，即使配置库使用 PostgreSQL 也始终是独立的 SQLite 文件，
+# 同时避免日志的大量写入和配置库争用锁
+LOG_INDEX_DATABASE_URL = os.getenv(
+    "LOG_INDEX_DATABASE_URL",
+    f"sqlite:///{Path(__file__).parent.parent / 'opsdashboard_logs.db'}"
+)
+log_index_engine = create_engine(
+    LOG_INDEX_DATABASE_URL,
+    echo=False,
+    connect_args={"check_same_thread": False}
+)
+
 # 创建基础模型类
 Base = declarative_base()
 
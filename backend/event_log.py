@@ -0,0 +1,70 @@
+"""
+进度事件记录
+启动编排（orchestrator.py）和后台任务（jobs.py）共用：事件按顺序编号，最多保留 max_events 条，
+follow() 供 SSE 接口从指定序号开始持续读取；以及按上限清理已结束记录的 trim_finished()
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, AsyncIterator, Callable, Tuple
+
+
+class EventLog:
+    """
+    有上限的事件列表
+
+    事件序号从 0 开始连续编号，超过 max_events 时丢弃最早的事件（dropped 为已丢弃的条数），
+    因此序号不等于 events 中的下标
+    """
+
+    def __init__(self, max_events: int):
+        self.max_events = max_events
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._changed = asyncio.Condition()
+
+    @property
+    def total(self) -> int:
+        """已产生的事件总数（下一个事件的序号）"""
+        return self.dropped + len(self.events)
+
+    async def emit(self, event: Dict[str, Any]):
+        self.events.append(event)
+        if len(self.events) > self.max_events:
+            del self.events[0]
+            self.dropped += 1
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def follow(self, finished: Callable[[], bool], after: int = 0, heartbeat: float = 15) -> AsyncIterator[Optional[Tuple[int, Dict[str, Any]]]]:
+        """
+        从序号 after 开始产生 (已产生的事件数, 事件)，直到 finished() 为真；前者即断线重连时的 after；
+        heartbeat 秒没有新事件时产生 None（after 之后的事件已被丢弃时从保留的最早事件开始）
+        """
+        index = after
+        while True:
+            # 切片和 dropped 在同一时刻读取；yield 期间新产生的事件在下一轮读取
+            start = max(index - self.dropped, 0)
+            index = self.dropped + start
+            for event in self.events[start:]:
+                index += 1
+                yield index, event
+            if finished():
+                return
+            idle = False
+            async with self._changed:
+                if index >= self.total and not finished():
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout=heartbeat)
+                    except asyncio.TimeoutError:
+                        idle = True
+            if idle:
+                yield None
+
+
+def trim_finished(records: "OrderedDict[str, Any]", max_records: int):
+    """记录数超过上限时，按加入顺序删除最早的已结束记录（record.finished 为真），未结束的记录保留"""
+    while len(records) > max_records:
+        oldest = next((key for key, record in records.items() if record.finished), None)
+        if oldest is None:
+            break
+        del records[oldest]
@@ -0,0 +1,332 @@
+"""
+后台任务队列
+重启项目、本地服务重启、代码同步和前端构建等耗时操作提交为任务后立即返回任务ID，
+由固定数量的 worker 在后台执行，同一主机同时执行的任务数有上限；任务状态和进度事件
+通过 /api/jobs/{job_id}（及 /stream）查看，提交和结束时写入配置库的 jobs 表
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, AsyncIterator, Awaitable, Callable, Tuple
+
+from database import SessionLocal
+from event_log import EventLog, trim_finished
+from models import JobRecord
+
+
+# worker 数量（所有主机合计同时执行的任务数）
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# 同一主机同时执行的任务数
+JOB_HOST_CONCURRENCY = int(os.getenv("JOB_HOST_CONCURRENCY", "2"))
+# 内存中保留的已结束任务数（更早的任务只能从数据库查询）
+JOB_MAX_RETAINED = 200
+# 每个任务保留的进度事件数
+JOB_MAX_EVENTS = 500
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Job:
+    """
+    一个后台任务
+
+    work(job) 是执行任务的协程，通过 await job.progress(...) 报告进度，
+    返回结果字典（success 为 False 时任务失败）；取消任务会取消正在执行的协程
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        host: str,
+        work: Callable[["Job"], Awaitable[Optional[Dict[str, Any]]]],
+        title: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ):
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.host = host
+        self.title = title
+        self.params = params or {}
+        self.work = work
+        self.state = "queued"
+        self.percent: Optional[int] = None
+        self.message: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = _now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.log = EventLog(JOB_MAX_EVENTS)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def events(self) -> List[Dict[str, Any]]:
+        """保留的进度事件（最多 JOB_MAX_EVENTS 条）"""
+        return self.log.events
+
+    async def _emit(self, event: Dict[str, Any]):
+        await self.log.emit({"time": time.time(), **event})
+
+    async def progress(self, message: str, percent: Optional[int] = None, **data):
+        """报告进度：message 为进度说明，percent 为进度百分比（可选），data 随事件一起推送"""
+        self.message = message
+        if percent is not None:
+            self.percent = max(0, min(100, int(percent)))
+        await self._emit({"type": "progress", "message": message, "progress": self.percent, **data})
+
+    async def _set_state(self, state: str):
+        self.state = state
+        await self._emit({"type": "state", "state": state, "error": self.error})
+
+    def to_dict(self) -> Dict[str, Any]:
+        def seconds(start, end):
+            return round((end - start).total_seconds(), 3) if start and end else None
+
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "host": self.host,
+            "title": self.title,
+            "params": self.params,
+            "state": self.state,
+            "progress": self.percent,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "queued_seconds": seconds(self.created_at, self.started_at),
+            "elapsed_seconds": seconds(self.started_at, self.finished_at or (_now() if self.started_at else None)),
+        }
+
+    def follow(self, after: int = 0, heartbeat: float = 15) -> AsyncIterator[Optional[Tuple[int, Dict[str, Any]]]]:
+        """从第 after 个事件开始产生 (事件数, 事件)，直到任务结束；heartbeat 秒没有新事件时产生 None（见 EventLog.follow）"""
+        return self.log.follow(lambda: self.finished, after, heartbeat)
+
+
+class JobQueue:
+    """
+    任务队列
+
+    等待中的任务按提交顺序排队，worker 每次取出第一个所在主机未达到并发上限的任务，
+    因此一台主机上排队的任务不会占住 worker 而阻塞其它主机的任务
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, host_concurrency: int = JOB_HOST_CONCURRENCY, max_retained: int = JOB_MAX_RETAINED):
+        self.workers = max(1, workers)
+        self.host_concurrency = max(1, host_concurrency)
+        self.max_retained = max_retained
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: deque = deque()
+        self._running: Dict[str, int] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._workers: List[asyncio.Task] = []
+        self._cond: Optional[asyncio.Condition] = None
+
+    async def start(self):
+        """启动 worker，并把上次退出时未结束的任务记为失败"""
+        if self._workers:
+            return
+        self._cond = asyncio.Condition()
+        await asyncio.to_thread(self._abandon_stale)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._workers + list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._tasks.values(), return_exceptions=True)
+        self._workers = []
+        self._tasks.clear()
+
+    async def submit(
+        self,
+        kind: str,
+        host: str,
+        work: Callable[[Job], Awaitable[Optional[Dict[str, Any]]]],
+        title: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Job:
+        """提交任务，立即返回"""
+        if not self._workers:
+            await self.start()
+        job = Job(kind, host, work, title=title, params=params)
+        self.jobs[job.id] = job
+        trim_finished(self.jobs, self.max_retained)
+        await asyncio.to_thread(self._persist, job)
+        await job._emit({"type": "state", "state": job.state, "error": None})
+        async with self._cond:
+            self._pending.append(job)
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def list(self, host: Optional[str] = None, state: Optional[str] = None) -> List[Job]:
+        return [
+            job for job in reversed(self.jobs.values())
+            if (host is None or job.host == host) and (state is None or job.state == state)
+        ]
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务：排队中的任务直接移出队列，执行中的任务取消其协程；返回任务，不存在时返回 None"""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        async with self._cond:
+            if job in self._pending:
+                self._pending.remove(job)
+                job.error = "任务已取消"
+                job.finished_at = _now()
+                await job._set_state("cancelled")
+                await asyncio.to_thread(self._persist, job)
+                return job
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {state: 0 for state in JOB_STATES}
+        for job in self.jobs.values():
+            counts[job.state] += 1
+        return {
+            "workers": self.workers,
+            "host_concurrency": self.host_concurrency,
+            "queued": len(self._pending),
+            "running_by_host": {host: count for host, count in self._running.items() if count},
+            "states": counts,
+        }
+
+    def _next_runnable(self) -> Optional[Job]:
+        for job in self._pending:
+            if self._running.get(job.host, 0) < self.host_concurrency:
+                return job
+        return None
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._next_runnable() is not None)
+                job = self._next_runnable()
+                self._pending.remove(job)
+                self._running[job.host] = self._running.get(job.host, 0) + 1
+            try:
+                task = asyncio.create_task(self._run(job))
+                self._tasks[job.id] = task
+                try:
+                    await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    # 只是任务本身被取消时 worker 继续运行；队列停止时 worker 也退出
+                    if not task.done():
+                        task.cancel()
+                        raise
+            finally:
+                self._tasks.pop(job.id, None)
+                async with self._cond:
+                    self._running[job.host] -= 1
+                    self._cond.notify_all()
+
+    async def _run(self, job: Job):
+        job.started_at = _now()
+        await job._set_state("running")
+        try:
+            result = await job.work(job)
+            job.result = result
+            if isinstance(result, dict) and result.get("success") is False:
+                job.error = str(result.get("error") or result.get("message") or "任务失败")
+                state = "failed"
+            else:
+                state = "succeeded"
+        except asyncio.CancelledError:
+            job.error = "任务已取消"
+            state = "cancelled"
+        except Exception as e:
+            print(f"Error running job {job.id} ({job.kind}): {e}")
+            job.error = str(getattr(e, "detail", None) or e)
+            state = "failed"
+        job.finished_at = _now()
+        if state == "succeeded":
+            job.percent = 100
+        await job._set_state(state)
+        try:
+            await asyncio.to_thread(self._persist, job)
+        except Exception as e:
+            print(f"Error saving job {job.id}: {e}")
+
+    def _persist(self, job: Job):
+        db = SessionLocal()
+        try:
+            record = db.query(JobRecord).filter(JobRecord.job_id == job.id).first()
+            if record is None:
+                record = JobRecord(job_id=job.id, kind=job.kind, host=job.host, created_at=job.created_at)
+                db.add(record)
+            record.title = job.title
+            record.params = job.params
+            record.state = job.state
+            record.progress = job.percent
+            record.message = job.message
+            record.result = job.result
+            record.error = job.error
+            record.events = job.events if job.finished else None
+            record.started_at = job.started_at
+            record.finished_at = job.finished_at
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error saving job {job.id}: {e}")
+        finally:
+            db.close()
+
+    def _abandon_stale(self):
+        db = SessionLocal()
+        try:
+            stale = db.query(JobRecord).filter(JobRecord.state.in_(("queued", "running"))).all()
+            for record in stale:
+                record.state = "failed"
+                record.error = "服务重启，任务中断"
+                record.finished_at = _now()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error cleaning up stale jobs: {e}")
+        finally:
+            db.close()
+
+    def history(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """从数据库查询已不在内存中的任务（阻塞调用）"""
+        db = SessionLocal()
+        try:
+            record = db.query(JobRecord).filter(JobRecord.job_id == job_id).first()
+            return {**record.to_dict(), "events": record.events or []} if record else None
+        finally:
+            db.close()
+
+    def recent(self, host: Optional[str] = None, state: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """从数据库查询最近的任务（阻塞调用）"""
+        db = SessionLocal()
+        try:
+            query = db.query(JobRecord)
+            if host:
+                query = query.filter(JobRecord.host == host)
+            if state:
+                query = query.filter(JobRecord.state == state)
+            return [record.to_dict() for record in query.order_by(JobRecord.created_at.desc()).limit(limit).all()]
+        finally:
+            db.close()
+
+
+# 全局任务队列实例
+job_queue = JobQueue()
@@ -0,0 +1,330 @@
+"""
+本机进程和端口探测
+直接读取 /proc（/proc/net/tcp{,6} 的监听端口、/proc/<pid>/cmdline 的命令行），
+不需要 fork ss / netstat / pgrep；用于本地服务状态检查（所有服务共用一份按周期刷新的快照）、
+本地服务重启时等待旧进程退出和新进程就绪，以及读取受守护进程的资源占用（/proc/<pid>/stat、statm）
+"""
+import asyncio
+import functools
+import os
+import pwd
+import re
+import signal
+import threading
+import time
+from typing import Optional, Dict, Any, List, Set, Tuple, Callable, Awaitable, Iterable
+
+from readiness import probe_command
+
+
+# 本地服务停止后等待旧进程 / 端口消失的超时（秒），超时后对残留进程发送 SIGKILL
+LOCAL_STOP_TIMEOUT = float(os.getenv("LOCAL_STOP_TIMEOUT", "10"))
+# 本地服务启动后等待就绪探测通过的超时（秒）
+LOCAL_READY_TIMEOUT = float(os.getenv("LOCAL_READY_TIMEOUT", "60"))
+# 轮询的初始间隔和最大间隔（秒），每次未满足后间隔乘以 1.5
+LOCAL_POLL_INTERVAL = float(os.getenv("LOCAL_POLL_INTERVAL", "0.05"))
+LOCAL_POLL_MAX_INTERVAL = 1.0
+# 本地状态快照的有效期（秒）：有效期内的状态检查共用同一份快照
+LOCAL_SNAPSHOT_TTL = float(os.getenv("LOCAL_SNAPSHOT_TTL", "1"))
+
+_PROC = "/proc"
+# /proc/net/tcp 中 LISTEN 状态的编码
+_TCP_LISTEN = "0A"
+
+
+def listening_ports() -> Set[int]:
+    """本机处于 LISTEN 状态的 TCP 端口（IPv4 和 IPv6）"""
+    ports = set()
+    for name in ("tcp", "tcp6"):
+        try:
+            with open(os.path.join(_PROC, "net", name)) as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == _TCP_LISTEN:
+                        ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+        except OSError:
+            continue
+    return ports
+
+
+def pid_alive(pid: int) -> bool:
+    """进程是否存在（僵尸进程视为已退出）"""
+    try:
+        with open(os.path.join(_PROC, str(pid), "stat")) as f:
+            # 第三个字段是状态，comm 中可能有空格，从最后一个右括号之后开始取
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return False
+
+
+def process_cmdlines() -> Dict[int, str]:
+    """所有进程的命令行（参数之间用空格连接），不包括当前进程"""
+    cmdlines = {}
+    own = os.getpid()
+    for entry in os.listdir(_PROC):
+        if not entry.isdigit() or int(entry) == own:
+            continue
+        try:
+            with open(os.path.join(_PROC, entry, "cmdline"), "rb") as f:
+                raw = f.read()
+        except OSError:
+            continue
+        if raw:
+            cmdlines[int(entry)] = raw.rstrip(b"\0").replace(b"\0", b" ").decode("utf-8", "replace")
+    return cmdlines
+
+
+def matching_pids(pattern: str, cmdlines: Optional[Dict[int, str]] = None) -> List[int]:
+    """命令行匹配正则的进程"""
+    regex = re.compile(pattern)
+    if cmdlines is None:
+        cmdlines = process_cmdlines()
+    return sorted(pid for pid, cmdline in cmdlines.items() if regex.search(cmdline))
+
+
+async def wait_until(
+    check: Callable[[], Awaitable[bool]],
+    timeout: float,
+    interval: float = LOCAL_POLL_INTERVAL,
+    max_interval: float = LOCAL_POLL_MAX_INTERVAL,
+) -> bool:
+    """以递增间隔轮询 check()，在超时前返回 True 时结束；返回是否满足"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if await check():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(interval, remaining))
+        interval = min(interval * 1.5, max_interval)
+
+
+async def wait_stopped(pids: Iterable[int], ports: Iterable[int], timeout: float = LOCAL_STOP_TIMEOUT) -> Dict[str, Any]:
+    """
+    等待旧进程退出、端口不再监听；超时后对残留进程发送 SIGKILL 再等待一次
+
+    Returns:
+        {"stopped": bool, "forced": [被强制结束的PID], "remaining_ports": [...]}
+    """
+    pids = list(pids)
+    ports = set(ports)
+
+    async def gone():
+        return not any(pid_alive(pid) for pid in pids) and not (ports & listening_ports())
+
+    if await wait_until(gone, timeout):
+        return {"stopped": True, "forced": [], "remaining_ports": []}
+    forced = [pid for pid in pids if pid_alive(pid)]
+    for pid in forced:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    stopped = await wait_until(gone, 2.0)
+    return {"stopped": stopped, "forced": forced, "remaining_ports": sorted(ports & listening_ports())}
+
+
+async def probe_ready(readiness: Dict[str, Any], run_command: Callable[[str], Awaitable[bool]]) -> bool:
+    """
+    执行一次就绪探测：端口和进程直接读取 /proc（进程需要遍历所有命令行，在线程中执行），
+    其它类型（pg_isready、http、command）由 run_command 执行 readiness.probe_command 生成的命令，
+    退出码为 0 即就绪
+    """
+    if readiness["type"] == "port":
+        return int(readiness["port"]) in listening_ports()
+    if readiness["type"] == "process":
+        return bool(await asyncio.to_thread(matching_pids, readiness["pattern"]))
+    command = probe_command(readiness)
+    return bool(command) and await run_command(command)
+
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def process_tree(pid: int) -> List[int]:
+    """进程及其所有子孙进程（读取 /proc/<pid>/task/*/children）"""
+    tree = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        if current in tree:
+            continue
+        tree.append(current)
+        try:
+            tasks = os.listdir(os.path.join(_PROC, str(current), "task"))
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open(os.path.join(_PROC, str(current), "task", task, "children")) as f:
+                    pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                continue
+    return tree
+
+
+def process_usage(pids: Iterable[int]) -> Dict[str, Any]:
+    """
+    一组进程的资源占用合计（读取 /proc/<pid>/stat 和 statm）
+
+    Returns:
+        {"pids": [...], "cpu_seconds": float, "rss_bytes": int, "threads": int}
+    """
+    usage = {"pids": [], "cpu_seconds": 0.0, "rss_bytes": 0, "threads": 0}
+    for pid in pids:
+        try:
+            with open(os.path.join(_PROC, str(pid), "stat")) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(os.path.join(_PROC, str(pid), "statm")) as f:
+                resident = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        # ) 之后的字段从 state（第 3 个字段）开始：utime 为第 14 个，stime 第 15 个，num_threads 第 20 个
+        usage["pids"].append(pid)
+        usage["cpu_seconds"] += (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+        usage["threads"] += int(fields[17])
+        usage["rss_bytes"] += resident * _PAGE_SIZE
+    usage["cpu_seconds"] = round(usage["cpu_seconds"], 2)
+    return usage
+
+
+@functools.lru_cache(maxsize=256)
+def _user_name(uid: int) -> str:
+    """与 ps 的 USER 列相同：超过 8 个字符时截断为 7 个字符加 +，没有用户名时为 UID"""
+    try:
+        name = pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
+    return name if len(name) <= 8 else name[:7] + "+"
+
+
+def process_table() -> Dict[int, str]:
+    """
+    所有进程的 "USER PID COMMAND" 行，对应 ps aux 输出中的这三列：
+    COMMAND 为命令行，命令行为空的进程（内核线程等）与 ps 一样显示为 [进程名]
+    """
+    table = {}
+    for entry in os.listdir(_PROC):
+        if not entry.isdigit():
+            continue
+        path = os.path.join(_PROC, entry)
+        try:
+            uid = os.stat(path).st_uid
+            with open(os.path.join(path, "cmdline"), "rb") as f:
+                raw = f.read()
+            if raw:
+                command = raw.rstrip(b"\0").replace(b"\0", b" ").decode("utf-8", "replace")
+            else:
+                with open(os.path.join(path, "comm")) as f:
+                    command = f"[{f.read().strip()}]"
+        except OSError:
+            continue
+        table[int(entry)] = f"{_user_name(uid)} {entry} {command}"
+    return table
+
+
+class LocalSnapshot:
+    """某一时刻本机的监听端口和进程表（见 process_table）"""
+
+    def __init__(self):
+        self.taken_at = time.monotonic()
+        self.ports = listening_ports()
+        self.lines = process_table()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.taken_at
+
+    def processes(self, pattern: re.Pattern, exclude: Iterable[str] = ()) -> List[int]:
+        """进程行匹配正则、且不包含 exclude 中任一子串的进程"""
+        return sorted(
+            pid for pid, line in self.lines.items()
+            if pattern.search(line) and not any(word in line for word in exclude)
+        )
+
+
+_snapshot: Optional[LocalSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def local_snapshot(max_age: float = LOCAL_SNAPSHOT_TTL) -> LocalSnapshot:
+    """共用的本机快照，超过 max_age 秒时重新采集"""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.age > max_age:
+            _snapshot = LocalSnapshot()
+        return _snapshot
+
+
+# 前端使用的检查命令形式：
+#   ps aux | grep -E "<正则>" | grep -v grep [| grep -v "<排除>"]... || echo "NOT_RUNNING"
+#   if lsof -i:<端口> ...; then echo "RUNNING"; elif [ -n "$(ps aux | grep -E \"<正则>\" | grep -v ... | head -1)" ]; ... fi
+_PS_GREP = re.compile(
+    r"""^ps aux \| grep -E (?P<q>\\?["'])(?P<pattern>.+?)(?P=q)(?P<excludes>(?: \| grep -v (?:\\?["'][^"'|]+?\\?["']|[^\s|"']+))*)"""
+)
+_EXCLUDE = re.compile(r"""grep -v (?:\\?["']([^"'|]+?)\\?["']|([^\s|"']+))""")
+_NOT_RUNNING_TAIL = re.compile(r"""^ \|\| echo (["'])NOT_RUNNING\1$""")
+_LSOF_IF = re.compile(
+    r"""^if lsof -i:(?P<port>\d+) >/dev/null 2>&1; then echo (["'])RUNNING\2; elif \[ -n "\$\((?P<ps>.+?) \| head -1\)" \]; then echo (["'])RUNNING\4; else echo (["'])NOT_RUNNING\5; fi$"""
+)
+
+
+def _parse_ps_grep(command: str) -> Optional[Tuple[str, Tuple[str, ...], str]]:
+    match = _PS_GREP.match(command)
+    if not match:
+        return None
+    excludes = tuple(quoted or bare for quoted, bare in _EXCLUDE.findall(match.group("excludes")))
+    pattern = match.group("pattern")
+    if match.group("q").endswith('"'):
+        # 双引号内的 \\ 由 shell 转义为 \
+        pattern = pattern.replace("\\\\", "\\")
+    return pattern, excludes, command[match.end():]
+
+
+@functools.lru_cache(maxsize=256)
+def native_check(command: str) -> Optional[Dict[str, Any]]:
+    """
+    把常见的检查命令转换为基于快照的检查，无法识别时返回 None（需要执行命令）
+
+    ps aux | grep 的正则匹配的是整行，快照只有 USER、PID 和 COMMAND 三列，
+    %CPU、VSZ、TTY、STAT、START 等列没有；带 ^ 锚点的正则可能按列位置匹配，也返回 None
+
+    Returns:
+        {"process": 编译后的正则, "exclude": (...), "port": Optional[int]}
+    """
+    command = command.strip()
+    port = None
+    lsof = _LSOF_IF.match(command)
+    if lsof:
+        port = int(lsof.group("port"))
+        parsed = _parse_ps_grep(lsof.group("ps"))
+        if not parsed or parsed[2]:
+            return None
+    else:
+        parsed = _parse_ps_grep(command)
+        if not parsed or not _NOT_RUNNING_TAIL.match(parsed[2]):
+            return None
+    pattern, excludes, _ = parsed
+    if "^" in pattern:
+        return None
+    try:
+        regex = re.compile(pattern)
+    except re.error:
+        return None
+    return {"process": regex, "exclude": excludes, "port": port}
+
+
+def evaluate_check(check: Dict[str, Any], snapshot: LocalSnapshot) -> Dict[str, Any]:
+    """
+    在快照上执行 native_check 的检查
+
+    Returns:
+        {"running": bool, "pids": [...]}
+    """
+    if check["port"] is not None and check["port"] in snapshot.ports:
+        return {"running": True, "pids": []}
+    pids = snapshot.processes(check["process"], check["exclude"])
+    return {"running": bool(pids), "pids": pids}
@@ -0,0 +1,485 @@
+"""
+日志索引
+后台定期把各服务器允许查看的日志文件（LOG_SOURCES）增量同步到本地 SQLite，建立 FTS5 全文索引，
+/api/logs/search 直接查询本地索引，不再每次读取远程文件
+
+- 每台服务器的每个日志源保存 read_log_range 的游标，每轮只拉取新增的内容，游标和记录在同一事务中写入
+- 按天分区：每天一张记录表和一张 FTS5 表，过期数据按分区整表删除
+"""
+import asyncio
+import base64
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import event, text
+
+from database import log_index_engine
+from ssh_manager import ssh_manager, server_connect_kwargs
+from log_parser import LOG_SOURCES, parse_records, orphan_record, split_lines
+from log_tail import read_log_range, decode_cursor
+
+
+# 同步间隔（秒），为 0 时关闭后台同步
+LOG_INDEX_INTERVAL = float(os.getenv("LOG_INDEX_INTERVAL", "60"))
+# 同时同步的服务器数量
+LOG_INDEX_CONCURRENCY = int(os.getenv("LOG_INDEX_CONCURRENCY", "4"))
+# 保留天数，更早的分区整表删除
+LOG_INDEX_RETENTION_DAYS = int(os.getenv("LOG_INDEX_RETENTION_DAYS", "7"))
+# 首次同步时从文件末尾回溯的字节数
+LOG_INDEX_INITIAL_BYTES = int(os.getenv("LOG_INDEX_INITIAL_BYTES", str(1024 * 1024)))
+# 每个文件每轮最多拉取的字节数，积压的内容留到下一轮
+LOG_INDEX_MAX_BYTES_PER_RUN = int(os.getenv("LOG_INDEX_MAX_BYTES_PER_RUN", str(8 * 1024 * 1024)))
+
+
+@event.listens_for(log_index_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL 模式下同步写入时不阻塞搜索
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _bucket_of(ts: float) -> str:
+    """记录所属的分区（本机时区的日期）"""
+    return datetime.fromtimestamp(ts).strftime("%Y%m%d")
+
+
+def _encode_search_cursor(bucket: str, ts: float, record_id: int) -> str:
+    raw = f"{bucket}:{ts!r}:{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_search_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        bucket, ts, record_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        if len(bucket) != 8 or not bucket.isdigit():
+            raise ValueError(bucket)
+        return bucket, float(ts), int(record_id)
+    except Exception:
+        raise ValueError("无效的搜索游标")
+
+
+class LogIndex:
+    """本地日志索引：分区管理、增量同步和搜索"""
+
+    def __init__(
+        self,
+        engine=log_index_engine,
+        interval: float = LOG_INDEX_INTERVAL,
+        concurrency: int = LOG_INDEX_CONCURRENCY,
+        retention_days: int = LOG_INDEX_RETENTION_DAYS,
+    ):
+        self.engine = engine
+        self.interval = interval
+        self.concurrency = concurrency
+        self.retention_days = retention_days
+        self._buckets: Optional[set] = None
+        self._tokenizer: Optional[str] = None
+        # SQLite 同时只允许一个写事务，同步写入在进程内串行执行
+        self._write_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- 表结构 ----------
+
+    def _ensure_schema(self, conn, reload: bool = False):
+        """建表并读取分区列表；reload 为 True 时重新检查（分区列表整体替换，查询中不会读到 None）"""
+        if self._buckets is not None and not reload:
+            return
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS log_partitions ("
+            "bucket TEXT PRIMARY KEY, created_at REAL NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS log_ingest_state ("
+            "server_id TEXT NOT NULL, source TEXT NOT NULL, cursor TEXT, "
+            "updated_at REAL, last_error TEXT, records INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (server_id, source))"
+        ))
+        # trigram 分词支持中文和任意子串搜索（SQLite 3.34+），不支持时退回默认分词
+        try:
+            conn.execute(text("CREATE VIRTUAL TABLE temp.log_fts_probe USING fts5(raw, tokenize='trigram')"))
+            conn.execute(text("DROP TABLE temp.log_fts_probe"))
+            self._tokenizer = "trigram"
+        except Exception:
+            self._tokenizer = "unicode61"
+        self._buckets = {row[0] for row in conn.execute(text("SELECT bucket FROM log_partitions"))}
+
+    def _ensure_partition(self, conn, bucket: str) -> bool:
+        """
+        在当前事务中创建分区，返回是否新建；新建的分区由调用方在事务提交后加入 _buckets，
+        查询只会看到已提交的分区
+        """
+        if bucket in self._buckets:
+            return False
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS log_records_{bucket} ("
+            "id INTEGER PRIMARY KEY, server_id TEXT NOT NULL, source TEXT NOT NULL, "
+            "ts REAL NOT NULL, timestamp TEXT, level TEXT NOT NULL, offset INTEGER, raw TEXT NOT NULL)"
+        ))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_log_records_{bucket}_ts ON log_records_{bucket} (ts)"))
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS log_fts_{bucket} USING fts5("
+            f"raw, content='log_records_{bucket}', content_rowid='id', tokenize='{self._tokenizer}')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS log_records_{bucket}_ai AFTER INSERT ON log_records_{bucket} BEGIN "
+            f"INSERT INTO log_fts_{bucket}(rowid, raw) VALUES (new.id, new.raw); END"
+        ))
+        conn.execute(
+            text("INSERT OR IGNORE INTO log_partitions (bucket, created_at) VALUES (:bucket, :now)"),
+            {"bucket": bucket, "now": time.time()},
+        )
+        return True
+
+    # ---------- 写入 ----------
+
+    def _load_cursor(self, server_id: str, source: str) -> Optional[str]:
+        with self.engine.connect() as conn:
+            self._ensure_schema(conn)
+            conn.commit()
+            row = conn.execute(
+                text("SELECT cursor FROM log_ingest_state WHERE server_id = :server_id AND source = :source"),
+                {"server_id": server_id, "source": source},
+            ).first()
+        return row[0] if row else None
+
+    def _save_state(self, conn, server_id: str, source: str, cursor: Optional[str], records: int = 0, error: Optional[str] = None):
+        conn.execute(
+            text(
+                "INSERT INTO log_ingest_state (server_id, source, cursor, updated_at, last_error, records) "
+                "VALUES (:server_id, :source, :cursor, :now, :error, :records) "
+                "ON CONFLICT (server_id, source) DO UPDATE SET "
+                "cursor = excluded.cursor, updated_at = excluded.updated_at, "
+                "last_error = excluded.last_error, records = log_ingest_state.records + excluded.records"
+            ),
+            {"server_id": server_id, "source": source, "cursor": cursor, "now": time.time(), "error": error, "records": records},
+        )
+
+    def store(self, server_id: str, source: str, records: List[Dict[str, Any]], cursor: Optional[str]) -> int:
+        """写入一批记录并保存同步游标（同一事务）"""
+        now = time.time()
+        rows_by_bucket: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            # 无法解析时间的记录按同步时间归档
+            ts = record["ts"] if record["ts"] is not None else now
+            if ts < now - self.retention_days * 86400:
+                continue
+            rows_by_bucket.setdefault(_bucket_of(ts), []).append({
+                "server_id": server_id,
+                "source": source,
+                "ts": ts,
+                "timestamp": record["timestamp"],
+                "level": record["level"],
+                "offset": record["offset"],
+                "raw": record["raw"],
+            })
+        stored = sum(len(rows) for rows in rows_by_bucket.values())
+        with self._write_lock:
+            created = []
+            try:
+                with self.engine.begin() as conn:
+                    self._ensure_schema(conn)
+                    for bucket, rows in rows_by_bucket.items():
+                        if self._ensure_partition(conn, bucket):
+                            created.append(bucket)
+                        conn.execute(
+                            text(
+                                f"INSERT INTO log_records_{bucket} (server_id, source, ts, timestamp, level, offset, raw) "
+                                "VALUES (:server_id, :source, :ts, :timestamp, :level, :offset, :raw)"
+                            ),
+                            rows,
+                        )
+                    self._save_state(conn, server_id, source, cursor, records=stored)
+            except Exception:
+                # 事务回滚：本次新建的分区不加入分区列表；首次写入时回滚的还可能包括基础表，重新建表
+                try:
+                    with self.engine.begin() as conn:
+                        self._ensure_schema(conn, reload=True)
+                except Exception as e:
+                    print(f"Error reloading log index partitions: {e}")
+                raise
+            self._buckets.update(created)
+        return stored
+
+    def _record_error(self, server_id: str, source: str, cursor: Optional[str], error: str):
+        with self._write_lock, self.engine.begin() as conn:
+            self._ensure_schema(conn)
+            self._save_state(conn, server_id, source, cursor, error=error)
+
+    def ingest_source(self, conn, server_id: str, source: str, max_bytes: int = LOG_INDEX_MAX_BYTES_PER_RUN) -> Dict[str, Any]:
+        """
+        把一个日志源自上次同步以来新增的内容写入索引（阻塞调用）
+
+        Returns:
+            {"source", "success", "records", "bytes", "reset", "missing", "error"}
+        """
+        path = LOG_SOURCES[source]["path"]
+        summary = {"source": source, "success": False, "records": 0, "bytes": 0, "reset": False, "missing": False, "error": None}
+        cursor = self._load_cursor(server_id, source)
+        while True:
+            try:
+                range_result = read_log_range(conn, path, cursor, initial_bytes=LOG_INDEX_INITIAL_BYTES)
+            except ValueError:
+                # 游标损坏时从文件末尾重新开始
+                cursor = None
+                continue
+            if not range_result["success"]:
+                summary["error"] = range_result["error"]
+                self._record_error(server_id, source, cursor, range_result["error"])
+                return summary
+            if range_result["missing"]:
+                summary["missing"] = True
+                break
+            summary["reset"] = summary["reset"] or range_result["reset"]
+
+            data = range_result["content"].encode("utf-8")
+            end = decode_cursor(range_result["cursor"])[1]
+            records, orphans = parse_records(split_lines(data, end - len(data)), source)
+            if orphans:
+                records.insert(0, orphan_record(orphans, source))
+            summary["records"] += self.store(server_id, source, records, range_result["cursor"])
+            summary["bytes"] += len(data)
+            cursor = range_result["cursor"]
+            if not range_result["has_more"] or summary["bytes"] >= max_bytes or not data:
+                break
+        summary["success"] = True
+        return summary
+
+    def ingest_server(self, conn, server_id: str) -> Dict[str, Any]:
+        """同步一台服务器的所有日志源（阻塞调用）"""
+        started = time.monotonic()
+        sources = {}
+        for source in LOG_SOURCES:
+            try:
+                sources[source] = self.ingest_source(conn, server_id, source)
+            except Exception as e:
+                print(f"Error indexing {source} on {server_id}: {e}")
+                sources[source] = {"source": source, "success": False, "error": str(e)}
+        return {
+            "server_id": server_id,
+            "success": all(result["success"] for result in sources.values()),
+            "elapsed": round(time.monotonic() - started, 3),
+            "sources": sources,
+        }
+
+    def apply_retention(self) -> List[str]:
+        """删除超过保留天数的分区，返回删除的分区"""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime("%Y%m%d")
+        with self._write_lock, self.engine.begin() as conn:
+            self._ensure_schema(conn)
+            expired = sorted(bucket for bucket in self._buckets if bucket < cutoff)
+            for bucket in expired:
+                conn.execute(text(f"DROP TABLE IF EXISTS log_fts_{bucket}"))
+                conn.execute(text(f"DROP TABLE IF EXISTS log_records_{bucket}"))
+                conn.execute(text("DELETE FROM log_partitions WHERE bucket = :bucket"), {"bucket": bucket})
+            # 提交后再从分区列表中移除（查询复制分区列表后遍历，列表本身不会置空）
+        self._buckets.difference_update(expired)
+        return expired
+
+    # ---------- 查询 ----------
+
+    def _match_clauses(self, q: str, params: Dict[str, Any]) -> List[str]:
+        """把搜索词转换为 FTS MATCH 条件；trigram 分词下不足 3 个字符的词改用 LIKE"""
+        clauses = []
+        phrases = []
+        for index, term in enumerate(q.split()):
+            if self._tokenizer == "trigram" and len(term) < 3:
+                key = f"like_{index}"
+                escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                params[key] = f"%{escaped}%"
+                clauses.append(f"r.raw LIKE :{key} ESCAPE '\\'")
+            else:
+                phrases.append('"' + term.replace('"', '""') + '"')
+        if phrases:
+            params["match"] = " AND ".join(phrases)
+            clauses.append("r.id IN (SELECT rowid FROM log_fts_{bucket} WHERE log_fts_{bucket} MATCH :match)")
+        return clauses
+
+    def search(
+        self,
+        q: Optional[str] = None,
+        server_id: Optional[str] = None,
+        source: Optional[str] = None,
+        levels: Optional[List[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        搜索本地索引，结果从新到旧
+
+        Raises:
+            ValueError: 游标无效
+
+        Returns:
+            {"success", "records", "next_cursor", "took_ms", "partitions"}
+        """
+        started = time.perf_counter()
+        after = _decode_search_cursor(cursor) if cursor else None
+        params: Dict[str, Any] = {}
+        conditions = []
+        if server_id:
+            conditions.append("r.server_id = :server_id")
+            params["server_id"] = server_id
+        if source:
+            conditions.append("r.source = :source")
+            params["source"] = source
+        if levels:
+            names = []
+            for index, level in enumerate(levels):
+                params[f"level_{index}"] = level
+                names.append(f":level_{index}")
+            conditions.append(f"r.level IN ({', '.join(names)})")
+        if since is not None:
+            conditions.append("r.ts >= :since")
+            params["since"] = since
+        if until is not None:
+            conditions.append("r.ts <= :until")
+            params["until"] = until
+        if q and q.strip():
+            conditions.extend(self._match_clauses(q, params))
+
+        records: List[Dict[str, Any]] = []
+        scanned = 0
+        with self.engine.connect() as conn:
+            self._ensure_schema(conn)
+            conn.commit()
+            low = _bucket_of(since) if since is not None else None
+            high = _bucket_of(until) if until is not None else None
+            for bucket in sorted(self._buckets.copy(), reverse=True):
+                if len(records) > limit:
+                    break
+                if (low and bucket < low) or (high and bucket > high) or (after and bucket > after[0]):
+                    continue
+                bucket_conditions = [condition.format(bucket=bucket) for condition in conditions]
+                bucket_params = dict(params)
+                if after and bucket == after[0]:
+                    bucket_conditions.append("(r.ts < :after_ts OR (r.ts = :after_ts AND r.id < :after_id))")
+                    bucket_params.update({"after_ts": after[1], "after_id": after[2]})
+                # 多取一条用于判断是否还有下一页
+                bucket_params["limit"] = limit + 1 - len(records)
+                where = f"WHERE {' AND '.join(bucket_conditions)}" if bucket_conditions else ""
+                rows = conn.execute(
+                    text(
+                        "SELECT r.id, r.server_id, r.source, r.ts, r.timestamp, r.level, r.offset, r.raw "
+                        f"FROM log_records_{bucket} r {where} ORDER BY r.ts DESC, r.id DESC LIMIT :limit"
+                    ),
+                    bucket_params,
+                ).fetchall()
+                scanned += 1
+                records.extend(
+                    {
+                        "id": row[0],
+                        "bucket": bucket,
+                        "server_id": row[1],
+                        "source": row[2],
+                        "ts": row[3],
+                        "timestamp": row[4],
+                        "level": row[5],
+                        "offset": row[6],
+                        "raw": row[7],
+                    }
+                    for row in rows
+                )
+
+        next_cursor = None
+        if len(records) > limit:
+            del records[limit:]
+            last = records[-1]
+            next_cursor = _encode_search_cursor(last["bucket"], last["ts"], last["id"])
+        for record in records:
+            del record["bucket"]
+
+        return {
+            "success": True,
+            "records": records,
+            "next_cursor": next_cursor,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+            "partitions": scanned,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """各服务器日志源的同步状态和分区列表"""
+        with self.engine.connect() as conn:
+            self._ensure_schema(conn)
+            conn.commit()
+            states = [
+                {
+                    "server_id": row[0],
+                    "source": row[1],
+                    "updated_at": row[2],
+                    "last_error": row[3],
+                    "records": row[4],
+                }
+                for row in conn.execute(text(
+                    "SELECT server_id, source, updated_at, last_error, records FROM log_ingest_state ORDER BY server_id, source"
+                ))
+            ]
+        return {
+            "success": True,
+            "interval": self.interval,
+            "retention_days": self.retention_days,
+            "tokenizer": self._tokenizer,
+            "partitions": sorted(self._buckets.copy(), reverse=True),
+            "sources": states,
+        }
+
+    # ---------- 后台同步 ----------
+
+    async def sync_server(self, server_config: Dict[str, Any]) -> Dict[str, Any]:
+        """同步一台服务器（异步调用）"""
+        server_id = server_config.get("server_id")
+        result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
+        if not result.get("success"):
+            return {"server_id": server_id, "success": False, "error": result.get("message") or "SSH连接失败"}
+        return await ssh_manager.run_blocking(self.ingest_server, result["connection"], server_id)
+
+    async def start(self):
+        """启动后台同步任务（interval 为 0 时不启动）"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台同步任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _sync_guarded(self, server_config: Dict[str, Any], semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                await self.sync_server(server_config)
+            except Exception as e:
+                print(f"Error indexing logs of server {server_config.get('server_id')}: {e}")
+
+    async def _run(self):
+        from status_poller import _list_active_servers
+
+        while True:
+            try:
+                servers = await ssh_manager.run_blocking(_list_active_servers)
+                semaphore = asyncio.Semaphore(self.concurrency)
+                await asyncio.gather(*(self._sync_guarded(server, semaphore) for server in servers))
+                await ssh_manager.run_blocking(self.apply_retention)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in log indexer: {e}")
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+
+# 全局日志索引实例
+log_index = LogIndex()
@@ -0,0 +1,296 @@
+"""
+多服务器日志合并
+同时跟踪多台服务器上的同一个日志源（每台一个 LogFollower），按解析出的时间用堆做 k 路归并后推送
+
+- 每台服务器最多缓存 LOG_MERGE_BUFFER 条尚未推送的记录，达到上限时读取线程暂停，内存占用有上限
+- 一条记录最多等待 LOG_MERGE_HOLD 秒：其他服务器在此期间没有更早的记录就直接推送，
+  慢的或没有新日志的服务器不会卡住整个流，晚到的记录标记 late
+- 定期推送每台服务器的延迟（lag）
+"""
+import asyncio
+import heapq
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, AsyncIterator
+
+from log_parser import LOG_SOURCES, parse_records, orphan_record, split_lines
+from log_tail import LogFollower
+
+
+# 每台服务器最多缓存的未推送记录数
+LOG_MERGE_BUFFER = int(os.getenv("LOG_MERGE_BUFFER", "2000"))
+# 记录最多等待其他服务器的时间（秒）
+LOG_MERGE_HOLD = float(os.getenv("LOG_MERGE_HOLD", "2"))
+# 推送延迟信息的间隔（秒）
+LOG_MERGE_LAG_INTERVAL = float(os.getenv("LOG_MERGE_LAG_INTERVAL", "5"))
+
+
+class HostFeed:
+    """一台服务器的日志跟踪：读取线程解析记录，合并协程取走记录"""
+
+    def __init__(self, server_id: str, source: str, conn=None, error: Optional[str] = None, buffer: int = LOG_MERGE_BUFFER):
+        self.server_id = server_id
+        self.source = source
+        self.buffer = buffer
+        self.follower = LogFollower(conn, LOG_SOURCES[source]["path"]) if conn is not None else None
+        self.state = "error" if error else "connecting"
+        self.error = error
+        self.state_changed = True
+        self.received = 0
+        self.emitted = 0
+        self.last_ts: Optional[float] = None
+        self.last_received: Optional[float] = None
+        # 尚未推送的记录数（包括还没被合并协程取走的），用于读取线程的背压
+        self.pending = 0
+        self._incoming: List[Any] = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("error", "closed")
+
+    def run(self, wakeup):
+        """读取线程：跟踪文件并解析为记录，wakeup 通知合并协程"""
+        partial = ""
+        try:
+            for event in self.follower.events():
+                if event["type"] == "data":
+                    self._set_state("following")
+                    text = partial + event["data"]
+                    cut = text.rfind("\n") + 1
+                    partial = text[cut:]
+                    if cut:
+                        data = text[:cut].encode("utf-8")
+                        records, orphans = parse_records(split_lines(data, event["offset"] - len(data) - len(partial.encode("utf-8"))), self.source)
+                        if records or orphans:
+                            self._push(records, orphans)
+                elif event["type"] == "reset":
+                    partial = ""
+                    self._set_state("following", f"日志文件已{'截断' if event['reason'] == 'truncated' else '替换'}")
+                elif event["type"] == "missing":
+                    self._set_state("missing")
+                wakeup()
+                if self._closed:
+                    break
+            self._set_state("closed")
+        except Exception as e:
+            if not self._closed:
+                print(f"Error following {self.source} on {self.server_id}: {e}")
+            self._set_state("error", str(e))
+        finally:
+            wakeup()
+
+    def _set_state(self, state: str, error: Optional[str] = None):
+        with self._cond:
+            if state != self.state or error != self.error:
+                self.state = state
+                self.error = error
+                self.state_changed = True
+
+    def _push(self, records: List[Dict[str, Any]], orphans):
+        with self._cond:
+            while self.pending >= self.buffer and not self._closed:
+                self._cond.wait(timeout=1)
+            self._incoming.append((records, orphans))
+            self.pending += len(records) + (1 if orphans else 0)
+
+    def take(self) -> List[Any]:
+        """取走读取线程新解析的记录"""
+        with self._cond:
+            batches, self._incoming = self._incoming, []
+        return batches
+
+    def release(self, count: int, emitted: bool = True):
+        """合并协程推送（或合并掉）了 count 条记录，读取线程可以继续"""
+        with self._cond:
+            self.pending -= count
+            if emitted:
+                self.emitted += count
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self.follower is not None:
+            self.follower.close()
+
+
+class MergedLogStream:
+    """按时间合并多台服务器同一日志源的新增记录"""
+
+    def __init__(
+        self,
+        source: str,
+        connections: Dict[str, Any],
+        errors: Optional[Dict[str, str]] = None,
+        hold: float = LOG_MERGE_HOLD,
+        buffer: int = LOG_MERGE_BUFFER,
+        lag_interval: float = LOG_MERGE_LAG_INTERVAL,
+    ):
+        """
+        Args:
+            source: 日志源标识（LOG_SOURCES 的键）
+            connections: 服务器ID -> 连接池中的 SSHConnection
+            errors: 无法连接的服务器ID -> 错误信息（在 host 事件中报告）
+        """
+        self.source = source
+        self.hold = hold
+        self.lag_interval = lag_interval
+        self.feeds: Dict[str, HostFeed] = {
+            server_id: HostFeed(server_id, source, conn=conn, buffer=buffer)
+            for server_id, conn in connections.items()
+        }
+        for server_id, error in (errors or {}).items():
+            self.feeds[server_id] = HostFeed(server_id, source, error=error, buffer=buffer)
+        # 每台服务器待推送的记录：(排序时间, 到达时间, 记录)，同一台服务器内按到达顺序
+        self._queues: Dict[str, deque] = {server_id: deque() for server_id in self.feeds}
+        # 各服务器队首记录组成的最小堆：(排序时间, 序号, 服务器ID)
+        self._heap: List[Any] = []
+        self._seq = 0
+        # 已推送记录的最大时间，之后到达的更早记录标记为 late
+        self.watermark: Optional[float] = None
+
+    def _enqueue(self, feed: HostFeed, records: List[Dict[str, Any]], orphans, now: float):
+        queue = self._queues[feed.server_id]
+        if orphans:
+            if queue:
+                # 续行（如异常堆栈）到达时上一条记录还没推送，直接合并
+                last = queue[-1][2]
+                text = "\n".join(line for _, line in orphans)
+                last["message"] += "\n" + text
+                last["raw"] += "\n" + text
+                feed.release(1, emitted=False)
+            else:
+                records = [orphan_record(orphans, self.source)] + records
+        for record in records:
+            # 同一台服务器内保持时间单调，没有时间的记录沿用上一条的时间
+            ts = record["ts"]
+            if ts is None:
+                ts = feed.last_ts if feed.last_ts is not None else time.time()
+            elif feed.last_ts is not None and ts < feed.last_ts:
+                ts = feed.last_ts
+            feed.last_ts = ts
+            record["server_id"] = feed.server_id
+            if not queue:
+                heapq.heappush(self._heap, (ts, self._seq, feed.server_id))
+                self._seq += 1
+            queue.append((ts, now, record))
+            feed.received += 1
+        if records:
+            feed.last_received = now
+
+    def _pop_ready(self, now: float) -> List[Dict[str, Any]]:
+        """弹出可以推送的记录：其他服务器都已有更晚的记录、服务器已结束，或者已等待超过 hold 秒"""
+        ready = []
+        released: Dict[str, int] = {}
+        while self._heap:
+            ts, _, server_id = self._heap[0]
+            queue = self._queues[server_id]
+            arrived = queue[0][1]
+            waiting = [
+                other for other, feed in self.feeds.items()
+                if other != server_id and not self._queues[other] and not feed.done
+            ]
+            if waiting and now - arrived < self.hold:
+                break
+            heapq.heappop(self._heap)
+            _, _, record = queue.popleft()
+            # 排序时间被调整过，是否晚到按记录本身的时间判断
+            if self.watermark is not None and record["ts"] is not None and record["ts"] < self.watermark:
+                record["late"] = True
+            self.watermark = ts if self.watermark is None else max(self.watermark, ts)
+            ready.append(record)
+            released[server_id] = released.get(server_id, 0) + 1
+            if queue:
+                heapq.heappush(self._heap, (queue[0][0], self._seq, server_id))
+                self._seq += 1
+        for server_id, count in released.items():
+            self.feeds[server_id].release(count)
+        return ready
+
+    def _next_deadline(self, now: float) -> float:
+        """下一次需要检查等待超时的时间"""
+        if not self._heap:
+            return now + self.lag_interval
+        server_id = self._heap[0][2]
+        return self._queues[server_id][0][1] + self.hold
+
+    def lag(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        每台服务器的延迟
+
+        lag_seconds 为该服务器最新记录落后于所有服务器中最新记录的时间，idle_seconds 为距上次收到记录的时间
+        """
+        now = now if now is not None else time.monotonic()
+        newest = max((feed.last_ts for feed in self.feeds.values() if feed.last_ts is not None), default=None)
+        hosts = {}
+        for server_id, feed in self.feeds.items():
+            hosts[server_id] = {
+                "state": feed.state,
+                "error": feed.error,
+                "last_ts": feed.last_ts,
+                "lag_seconds": round(newest - feed.last_ts, 3) if newest is not None and feed.last_ts is not None else None,
+                "idle_seconds": round(now - feed.last_received, 3) if feed.last_received is not None else None,
+                "buffered": len(self._queues[server_id]),
+                "received": feed.received,
+                "emitted": feed.emitted,
+            }
+        return {"watermark": self.watermark, "hosts": hosts}
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        产生合并后的事件：
+            {"type": "records", "records": [...]}    按时间合并的新记录（每条带 server_id）
+            {"type": "host", "server_id", "state", "error"}  某台服务器的跟踪状态变化
+            {"type": "lag", "watermark", "hosts"}    定期的延迟信息
+            {"type": "end"}                           所有服务器都已结束
+        """
+        loop = asyncio.get_running_loop()
+        wakeup_event = asyncio.Event()
+
+        def wakeup():
+            loop.call_soon_threadsafe(wakeup_event.set)
+
+        for feed in self.feeds.values():
+            if feed.follower is not None:
+                # tail -F 会一直运行，每台服务器使用单独的线程读取，避免长期占用SSH线程池
+                threading.Thread(target=feed.run, args=(wakeup,), name=f"merge-{self.source}-{feed.server_id}", daemon=True).start()
+
+        next_lag = time.monotonic() + self.lag_interval
+        while True:
+            for feed in self.feeds.values():
+                if feed.state_changed:
+                    feed.state_changed = False
+                    yield {"type": "host", "server_id": feed.server_id, "state": feed.state, "error": feed.error}
+
+            now = time.monotonic()
+            for feed in self.feeds.values():
+                for records, orphans in feed.take():
+                    self._enqueue(feed, records, orphans, now)
+            ready = self._pop_ready(now)
+            if ready:
+                yield {"type": "records", "records": ready}
+
+            if now >= next_lag:
+                next_lag = now + self.lag_interval
+                yield {"type": "lag", **self.lag(now)}
+
+            if all(feed.done for feed in self.feeds.values()) and not self._heap:
+                yield {"type": "lag", **self.lag(now)}
+                yield {"type": "end"}
+                return
+
+            timeout = max(0.05, min(self._next_deadline(now), next_lag) - time.monotonic())
+            try:
+                await asyncio.wait_for(wakeup_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            wakeup_event.clear()
+
+    def close(self):
+        for feed in self.feeds.values():
+            feed.close()
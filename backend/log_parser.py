@@ -0,0 +1,270 @@
+"""
+日志解析
+把允许查看的日志文件的原始内容解析为结构化记录（时间、级别、来源、消息），并按条件过滤
+"""
+import re
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+
+# 允许查看的日志源：标识 -> 文件路径和日志格式
+LOG_SOURCES = {
+    "backend-error": {"path": "/tmp/oj_error.log", "format": "python", "label": "Backend Error Log"},
+    "backend-access": {"path": "/tmp/oj_access.log", "format": "generic", "label": "Backend Access Log"},
+    "nginx-access": {"path": "/var/log/nginx/access.log", "format": "nginx_access", "label": "Nginx Access Log"},
+    "nginx-error": {"path": "/var/log/nginx/error.log", "format": "nginx_error", "label": "Nginx Error Log"},
+    "scratch-editor": {"path": "/tmp/scratch_editor.log", "format": "generic", "label": "Scratch Editor Log"},
+    "scratch-runner": {"path": "/home/ubuntu/MetaSeekOJ/logs/scratch-runner.log", "format": "generic", "label": "Scratch Runner Log"},
+}
+
+# 日志级别（按严重程度排序）
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+_LEVEL_ALIASES = {
+    "debug": "DEBUG",
+    "info": "INFO",
+    "notice": "INFO",
+    "log": "INFO",
+    "warn": "WARNING",
+    "warning": "WARNING",
+    "error": "ERROR",
+    "err": "ERROR",
+    "crit": "CRITICAL",
+    "critical": "CRITICAL",
+    "fatal": "CRITICAL",
+    "alert": "CRITICAL",
+    "emerg": "CRITICAL",
+}
+
+# Python logging / Django：2024-01-01 12:00:00,123 ERROR ... 或 [2024-01-01 12:00:00] ERROR ...
+_PYTHON_LINE = re.compile(
+    r"^\[?(?P<ts>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})(?:[,.]\d+)?\]?\s*"
+    r"(?:[\[(]?(?P<level>DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL)[\])]?\s*)?"
+)
+# nginx error.log：2024/01/01 12:00:00 [error] 1234#0: *1 ...
+_NGINX_ERROR_LINE = re.compile(r"^(?P<ts>\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}) \[(?P<level>\w+)\]\s*")
+# nginx combined 格式（可选的 $request_time 在行尾）
+_NGINX_ACCESS_LINE = re.compile(
+    r'^(?P<remote>\S+) \S+ (?P<user>\S+) \[(?P<ts>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)(?: (?P<protocol>[^"]*))?" '
+    r'(?P<status>\d{3}) (?P<bytes>\d+|-)'
+    r'(?: "(?P<referer>[^"]*)" "(?P<agent>[^"]*)")?'
+    r'(?:.*?\s(?P<request_time>\d+\.\d+))?\s*$'
+)
+# 通用格式：行首的 ISO 时间
+_GENERIC_TS = re.compile(r"^\[?(?P<ts>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})(?:[,.]\d+)?(?:Z|[+-]\d{2}:?\d{2})?\]?\s*")
+# 通用格式中的级别关键字
+_LEVEL_WORD = re.compile(r"\b(DEBUG|INFO|WARN(?:ING)?|ERROR|CRITICAL|FATAL)\b", re.IGNORECASE)
+
+
+def normalize_level(level: Optional[str]) -> Optional[str]:
+    """把各种写法的级别统一为 LEVELS 中的值"""
+    if not level:
+        return None
+    return _LEVEL_ALIASES.get(level.lower())
+
+
+def parse_timestamp(value: str) -> Optional[float]:
+    """
+    解析日志中的时间，返回时间戳（秒）
+
+    不带时区的时间按本机时区处理；解析失败返回 None
+    """
+    value = value.strip()
+    for fmt in ("%d/%b/%Y:%H:%M:%S %z", "%Y/%m/%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00").replace(",", ".")).timestamp()
+    except ValueError:
+        return None
+
+
+def _heuristic_level(line: str) -> str:
+    """没有明确级别时按关键字判断"""
+    lower = line.lower()
+    if "error" in lower or "exception" in lower or "traceback" in lower:
+        return "ERROR"
+    if "warn" in lower:
+        return "WARNING"
+    return "INFO"
+
+
+def parse_line(line: str, log_format: str) -> Optional[Dict[str, Any]]:
+    """
+    解析一行日志的开头
+
+    Returns:
+        记录字典 {"timestamp", "ts", "level", "message", "fields"}；
+        该行不是一条新记录的开头（如异常堆栈的后续行）时返回 None
+    """
+    if log_format == "nginx_access":
+        match = _NGINX_ACCESS_LINE.match(line)
+        if not match:
+            return {"timestamp": None, "ts": None, "level": _heuristic_level(line), "message": line, "fields": {}}
+        status = int(match.group("status"))
+        fields = {
+            "remote": match.group("remote"),
+            "method": match.group("method"),
+            "path": match.group("path"),
+            "status": status,
+            "bytes": 0 if match.group("bytes") == "-" else int(match.group("bytes")),
+            "request_time": float(match.group("request_time")) if match.group("request_time") else None,
+        }
+        level = "ERROR" if status >= 500 else "WARNING" if status >= 400 else "INFO"
+        return {
+            "timestamp": match.group("ts"),
+            "ts": parse_timestamp(match.group("ts")),
+            "level": level,
+            "message": line,
+            "fields": fields,
+        }
+
+    if log_format == "nginx_error":
+        match = _NGINX_ERROR_LINE.match(line)
+    elif log_format == "python":
+        match = _PYTHON_LINE.match(line)
+    else:
+        match = _GENERIC_TS.match(line)
+        if not match:
+            # 通用格式中缩进的行视为上一条记录的后续内容（如 Node.js 堆栈）
+            if line[:1].isspace():
+                return None
+            return {"timestamp": None, "ts": None, "level": _heuristic_level(line), "message": line, "fields": {}}
+    if not match:
+        return None
+
+    groups = match.groupdict()
+    message = line[match.end():]
+    level = normalize_level(groups.get("level"))
+    if level is None:
+        word = _LEVEL_WORD.search(message[:80])
+        level = normalize_level(word.group(1)) if word else _heuristic_level(message)
+    return {
+        "timestamp": groups["ts"],
+        "ts": parse_timestamp(groups["ts"]),
+        "level": level,
+        "message": message,
+        "fields": {},
+    }
+
+
+def parse_records(lines: Iterable[Tuple[int, str]], source: str) -> Tuple[List[Dict[str, Any]], List[Tuple[int, str]]]:
+    """
+    把若干行解析为记录，异常堆栈等后续行合并到上一条记录中
+
+    Args:
+        lines: (字节偏移, 行内容) 序列
+        source: 日志源标识（LOG_SOURCES 的键）
+
+    Returns:
+        (记录列表, 第一条记录之前无法归属的后续行)
+    """
+    log_format = LOG_SOURCES.get(source, {}).get("format", "generic")
+    records: List[Dict[str, Any]] = []
+    orphans: List[Tuple[int, str]] = []
+    for offset, line in lines:
+        if not line.strip():
+            continue
+        record = parse_line(line, log_format)
+        if record is None:
+            if records:
+                records[-1]["message"] += "\n" + line
+                records[-1]["raw"] += "\n" + line
+            else:
+                orphans.append((offset, line))
+            continue
+        record.update({"offset": offset, "source": source, "raw": line})
+        records.append(record)
+    return records, orphans
+
+
+def orphan_record(lines: List[Tuple[int, str]], source: str) -> Dict[str, Any]:
+    """没有找到开头的后续行（如超长的堆栈）单独作为一条记录"""
+    text = "\n".join(line for _, line in lines)
+    return {
+        "offset": lines[0][0],
+        "source": source,
+        "timestamp": None,
+        "ts": None,
+        "level": _heuristic_level(text),
+        "message": text,
+        "fields": {},
+        "raw": text,
+    }
+
+
+def split_lines(data: bytes, base_offset: int) -> List[Tuple[int, str]]:
+    """按行切分字节内容，返回 (字节偏移, 行内容)"""
+    lines = []
+    position = 0
+    for raw in data.split(b"\n"):
+        if raw:
+            lines.append((base_offset + position, raw.rstrip(b"\r").decode("utf-8", "replace")))
+        position += len(raw) + 1
+    return lines
+
+
+class LogFilter:
+    """日志过滤条件：级别、文本、时间范围"""
+
+    def __init__(
+        self,
+        levels: Optional[List[str]] = None,
+        text: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ):
+        self.levels = {normalize_level(level) for level in levels if normalize_level(level)} if levels else None
+        self.text = text.lower() if text else None
+        self.since = since
+        self.until = until
+
+    @classmethod
+    def from_params(
+        cls,
+        level: Optional[str] = None,
+        q: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> "LogFilter":
+        """
+        根据接口参数创建过滤条件
+
+        Raises:
+            ValueError: 级别或时间格式错误
+        """
+        levels = [part.strip() for part in level.split(",") if part.strip()] if level else None
+        if levels and any(normalize_level(part) is None for part in levels):
+            raise ValueError(f"无效的日志级别: {level}")
+        bounds = []
+        for value in (since, until):
+            if not value:
+                bounds.append(None)
+                continue
+            ts = parse_timestamp(value)
+            if ts is None:
+                raise ValueError(f"无效的时间: {value}")
+            bounds.append(ts)
+        return cls(levels=levels, text=q, since=bounds[0], until=bounds[1])
+
+    @property
+    def has_time_range(self) -> bool:
+        return self.since is not None or self.until is not None
+
+    def matches(self, record: Dict[str, Any]) -> bool:
+        if self.levels is not None and record["level"] not in self.levels:
+            return False
+        if self.has_time_range:
+            # 有时间条件时，无法确定时间的记录不返回
+            ts = record["ts"]
+            if ts is None:
+                return False
+            if self.since is not None and ts < self.since:
+                return False
+            if self.until is not None and ts > self.until:
+                return False
+        if self.text is not None and self.text not in record["raw"].lower():
+            return False
+        return True
@@ -0,0 +1,507 @@
+"""
+远程日志文件跟踪
+- LogFollower：在一个常驻的SSH channel 上运行 tail -F，从指定字节偏移开始持续接收文件新增的内容
+- read_log_range：按游标（inode:offset:size）一次往返读取自上次以来新增的内容
+- query_log_records：从文件末尾向前分段读取，解析为结构化记录并按条件过滤、分页
+都不再每次重新执行 tail -n 读取整个窗口
+"""
+import base64
+import codecs
+import os
+import re
+import shlex
+from typing import Optional, Dict, Any, Iterator, Tuple
+
+from ssh_manager import CommandStream
+from log_parser import LogFilter, parse_records, orphan_record, split_lines
+
+
+# 首次打开时最多回放的历史字节数（相当于原来 tail -n 500 的窗口）
+LOG_TAIL_INITIAL_BYTES = int(os.getenv("LOG_TAIL_INITIAL_BYTES", str(64 * 1024)))
+
+# 远程脚本输出的第一行：@@follow <inode> <起始偏移> <原因>
+_HEADER = re.compile(rb"^@@follow (\d+) (\d+) ?(\w*)\n")
+# tail -F 的提示信息（LC_ALL=C，和文件内容一起从 stdout 输出，保证先后顺序）
+_NOTICE = re.compile(rb"tail: [^\n]*?(file truncated|has been replaced|has appeared|has become inaccessible|cannot open|inotify)[^\n]*\n")
+_NOTICE_PREFIX = b"tail: "
+_NOTICE_EVENTS = {
+    b"file truncated": ("reset", "truncated"),
+    b"has been replaced": ("reset", "rotated"),
+    b"has appeared": ("reset", "rotated"),
+    b"has become inaccessible": ("missing", None),
+    b"cannot open": ("missing", None),
+}
+
+
+def build_follow_script(path: str, offset: Optional[int], inode: Optional[int], initial_bytes: int) -> str:
+    """
+    生成跟踪脚本：先确定起始偏移（文件被截断或替换时从头开始），输出 @@follow 头，再 exec tail -F
+    """
+    quoted = shlex.quote(path)
+    if offset is None:
+        choose_start = f'start=$(( size > {initial_bytes} ? size - {initial_bytes} : 0 )); reason=initial'
+    else:
+        inode_check = f'[ "$ino" != "{inode}" ]' if inode else "false"
+        choose_start = (
+            f'start={offset}; reason=; '
+            f'if {inode_check}; then start=0; reason=rotated; '
+            f'elif [ "$size" -lt "$start" ]; then start=0; reason=truncated; fi'
+        )
+    return (
+        "export LC_ALL=C; "
+        f"set -- $(stat -c '%i %s' -- {quoted} 2>/dev/null) 0 0; ino=$1; size=$2; "
+        f"{choose_start}; "
+        "printf '@@follow %s %s %s\\n' \"$ino\" \"$start\" \"$reason\"; "
+        f"exec tail -c +$((start + 1)) -F -- {quoted} 2>&1"
+    )
+
+
+class LogFollower:
+    """
+    跟踪远程文件的新增内容（类似 tail -F），events() 阻塞地产生事件：
+        {"type": "data", "data": str, "offset": int, "inode": int|None}  新增内容，offset 为读到的位置
+        {"type": "reset", "reason": "truncated"|"rotated", "offset": 0, "inode": int|None}  文件被截断或替换，从头重新读取
+        {"type": "missing"}  文件不存在或已被删除
+    """
+
+    def __init__(
+        self,
+        conn,
+        path: str,
+        offset: Optional[int] = None,
+        inode: Optional[int] = None,
+        initial_bytes: int = LOG_TAIL_INITIAL_BYTES,
+    ):
+        """
+        Args:
+            conn: 连接池中的 SSHConnection
+            path: 远程文件路径
+            offset: 起始字节偏移，为 None 时从文件末尾往前 initial_bytes 处开始
+            inode: offset 对应的文件 inode，与当前文件不一致时视为文件已被替换
+        """
+        self.conn = conn
+        self.path = path
+        self.offset = offset
+        self.inode = inode
+        self.initial_bytes = initial_bytes
+        self._stream: Optional[CommandStream] = None
+        self._closed = False
+
+    def _data_event(self, data: bytes, decoder) -> Optional[Dict[str, Any]]:
+        self.offset += len(data)
+        text = decoder.decode(data)
+        if not text:
+            return None
+        return {"type": "data", "data": text, "offset": self.offset, "inode": self.inode}
+
+    def events(self) -> Iterator[Dict[str, Any]]:
+        """打开 channel 并持续产生事件，直到 close() 或连接断开（阻塞，应在单独的线程中执行）"""
+        script = build_follow_script(self.path, self.offset, self.inode, self.initial_bytes)
+        self._stream = self.conn.stream_command(script, max_bytes=0, encoding=None)
+        if self._closed:
+            self._stream.close()
+            return
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = b""
+        header_done = False
+        skip_partial_line = False
+
+        for name, chunk in self._stream:
+            buffer += chunk
+            if not header_done:
+                match = _HEADER.match(buffer)
+                if not match:
+                    if b"\n" in buffer:
+                        raise IOError(f"无法跟踪日志文件: {buffer.decode('utf-8', 'replace').strip()}")
+                    continue
+                header_done = True
+                buffer = buffer[match.end():]
+                inode = int(match.group(1)) or None
+                start = int(match.group(2))
+                reason = match.group(3).decode()
+                self.inode = inode
+                self.offset = start
+                if reason in ("truncated", "rotated"):
+                    yield {"type": "reset", "reason": reason, "offset": 0, "inode": inode}
+                # 从文件中间开始时跳过第一行的剩余部分，避免输出半行
+                skip_partial_line = reason == "initial" and start > 0
+
+            while buffer:
+                match = _NOTICE.search(buffer)
+                if match:
+                    data, notice, buffer = buffer[:match.start()], match.group(1), buffer[match.end():]
+                else:
+                    # 末尾可能是尚未收完的提示信息，先保留
+                    hold = buffer.rfind(_NOTICE_PREFIX)
+                    if hold < 0 or b"\n" in buffer[hold:]:
+                        partial = next((i for i in range(len(_NOTICE_PREFIX) - 1, 0, -1) if buffer.endswith(_NOTICE_PREFIX[:i])), 0)
+                        hold = len(buffer) - partial
+                    data, notice, buffer = buffer[:hold], None, buffer[hold:]
+
+                if skip_partial_line and data:
+                    newline = data.find(b"\n")
+                    if newline < 0:
+                        self.offset += len(data)
+                        data = b""
+                    else:
+                        self.offset += newline + 1
+                        data = data[newline + 1:]
+                        skip_partial_line = False
+                if data:
+                    event = self._data_event(data, decoder)
+                    if event:
+                        yield event
+
+                if notice is None:
+                    break
+                event_type, reason = _NOTICE_EVENTS.get(notice, (None, None))
+                if event_type == "reset":
+                    # 新文件的 inode 未知，之后的断点续传只按文件大小判断截断
+                    self.offset = 0
+                    self.inode = None
+                    skip_partial_line = False
+                    decoder.reset()
+                    yield {"type": "reset", "reason": reason, "offset": 0, "inode": None}
+                elif event_type == "missing":
+                    yield {"type": "missing"}
+
+    def close(self):
+        """关闭 channel，events() 随之结束（可在其他线程调用）"""
+        self._closed = True
+        if self._stream is not None:
+            self._stream.close()
+
+
+# 按游标增量读取时单次最多返回的字节数
+LOG_RANGE_MAX_BYTES = int(os.getenv("LOG_RANGE_MAX_BYTES", str(512 * 1024)))
+
+# 远程脚本输出的第一行：@@range <inode> <文件大小> <起始偏移> <原因>，文件不存在时为 @@range missing
+_RANGE_HEADER = re.compile(rb"^@@range (?:missing|(\d+) (\d+) (\d+) ?(\w*))\n")
+
+
+def encode_cursor(inode: Optional[int], offset: int, size: int) -> str:
+    """生成不透明游标（inode:offset:size 的 base64）"""
+    raw = f"{inode or 0}:{offset}:{size}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[int], int, int]:
+    """
+    解析游标
+
+    Returns:
+        (inode, offset, size)
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        inode, offset, size = (int(part) for part in raw.split(":"))
+    except Exception:
+        raise ValueError("无效的日志游标")
+    if offset < 0 or size < offset:
+        raise ValueError("无效的日志游标")
+    return inode or None, offset, size
+
+
+def build_range_script(path: str, cursor: Optional[Tuple[Optional[int], int, int]], initial_bytes: int, max_bytes: int) -> str:
+    """
+    生成一次往返完成的区间读取脚本：stat 确定文件 inode / 大小和起始偏移，再用 tail -c +N | head -c 读取
+    读取的终点固定为 stat 时的文件大小，保证返回的内容和游标一致
+    """
+    quoted = shlex.quote(path)
+    if cursor is None:
+        choose_start = f'start=$(( size > {initial_bytes} ? size - {initial_bytes} : 0 )); reason=initial'
+    else:
+        inode, offset, size = cursor
+        inode_check = f'[ "$ino" != "{inode}" ]' if inode else "false"
+        choose_start = (
+            f'start={offset}; reason=; '
+            f'if {inode_check}; then start=0; reason=rotated; '
+            f'elif [ "$size" -lt {size} ]; then start=0; reason=truncated; fi'
+        )
+    return (
+        "export LC_ALL=C; "
+        f"set -- $(stat -c '%i %s' -- {quoted} 2>/dev/null); "
+        "if [ $# -lt 2 ]; then echo '@@range missing'; exit 0; fi; "
+        "ino=$1; size=$2; "
+        f"{choose_start}; "
+        f"count=$(( size - start > {max_bytes} ? {max_bytes} : size - start )); "
+        "printf '@@range %s %s %s %s\\n' \"$ino\" \"$size\" \"$start\" \"$reason\"; "
+        f"if [ $count -gt 0 ]; then tail -c +$((start + 1)) -- {quoted} | head -c $count; fi"
+    )
+
+
+def read_log_range(
+    conn,
+    path: str,
+    cursor: Optional[str] = None,
+    initial_bytes: int = LOG_TAIL_INITIAL_BYTES,
+    max_bytes: int = LOG_RANGE_MAX_BYTES,
+) -> Dict[str, Any]:
+    """
+    按游标读取日志文件自上次以来新增的内容（阻塞调用）
+
+    Args:
+        conn: 连接池中的 SSHConnection
+        path: 远程文件路径
+        cursor: 上次返回的游标；为空时读取文件末尾 initial_bytes 字节
+        max_bytes: 单次最多读取的字节数，剩余内容通过 has_more 提示继续读取
+
+    Returns:
+        {
+            "success": bool,
+            "content": str,           # 只包含完整的行，未写完的最后一行留到下次返回
+            "cursor": Optional[str],  # 下次请求时传回
+            "reset": bool,            # 文件被截断或替换，客户端应清空已有内容
+            "reason": Optional[str],  # "truncated" / "rotated"
+            "missing": bool,          # 文件不存在
+            "has_more": bool,         # 本次读取达到 max_bytes 上限，还有内容可以继续读取
+            "error": Optional[str]
+        }
+    """
+    parsed = decode_cursor(cursor) if cursor else None
+    result = {
+        "success": False,
+        "content": "",
+        "cursor": cursor or None,
+        "reset": False,
+        "reason": None,
+        "missing": False,
+        "has_more": False,
+        "error": None,
+    }
+
+    exec_result = conn.execute_command(
+        build_range_script(path, parsed, initial_bytes, max_bytes),
+        max_bytes=max_bytes + 1024,
+        encoding=None,
+        compress=True,
+    )
+    stdout = exec_result.get("stdout") or b""
+    header = _RANGE_HEADER.match(stdout)
+    if not header:
+        result["error"] = exec_result.get("error") or "读取日志失败"
+        return result
+    result["success"] = True
+    if header.group(1) is None:
+        result["missing"] = True
+        return result
+
+    inode, size, start = int(header.group(1)), int(header.group(2)), int(header.group(3))
+    reason = header.group(4).decode()
+    data = stdout[header.end():]
+    if reason in ("truncated", "rotated"):
+        result["reset"] = True
+        result["reason"] = reason
+
+    offset = start
+    read_bytes = len(data)
+    if reason == "initial" and start > 0:
+        # 从文件中间开始时跳过第一行的剩余部分
+        newline = data.find(b"\n")
+        skipped = newline + 1 if newline >= 0 else len(data)
+        offset += skipped
+        data = data[skipped:]
+    # 只返回完整的行，未写完的最后一行留到下次返回；单行超过 max_bytes 时整段返回，避免卡住
+    last_newline = data.rfind(b"\n")
+    if last_newline >= 0:
+        data = data[:last_newline + 1]
+    elif read_bytes < max_bytes:
+        data = b""
+    offset += len(data)
+
+    result["content"] = data.decode("utf-8", "replace")
+    result["cursor"] = encode_cursor(inode, offset, size)
+    result["has_more"] = start + read_bytes < size
+    return result
+
+
+# 向前翻页时每次读取的字节数，以及一次查询最多扫描的字节数（过滤条件很少命中时避免读完整个文件）
+LOG_QUERY_WINDOW_BYTES = int(os.getenv("LOG_QUERY_WINDOW_BYTES", str(256 * 1024)))
+LOG_QUERY_SCAN_BYTES = int(os.getenv("LOG_QUERY_SCAN_BYTES", str(4 * 1024 * 1024)))
+
+# 远程脚本输出的第一行：@@window <inode> <文件大小> <起始偏移> <结束偏移> <原因>
+_WINDOW_HEADER = re.compile(rb"^@@window (?:missing|(\d+) (\d+) (\d+) (\d+) ?(\w*))\n")
+
+
+def build_window_script(path: str, inode: Optional[int], end: Optional[int], window: int) -> str:
+    """
+    生成读取 [end - window, end) 区间的脚本；end 为空或文件已被替换/截断时从文件末尾开始
+    """
+    quoted = shlex.quote(path)
+    if end is None:
+        choose_end = "end=$size; reason="
+    else:
+        inode_check = f'[ "$ino" != "{inode}" ]' if inode else "false"
+        choose_end = (
+            f"end={end}; reason=; "
+            f"if {inode_check}; then end=$size; reason=rotated; "
+            f'elif [ "$size" -lt {end} ]; then end=$size; reason=truncated; fi'
+        )
+    return (
+        "export LC_ALL=C; "
+        f"set -- $(stat -c '%i %s' -- {quoted} 2>/dev/null); "
+        "if [ $# -lt 2 ]; then echo '@@window missing'; exit 0; fi; "
+        "ino=$1; size=$2; "
+        f"{choose_end}; "
+        f"start=$(( end > {window} ? end - {window} : 0 )); "
+        "printf '@@window %s %s %s %s %s\\n' \"$ino\" \"$size\" \"$start\" \"$end\" \"$reason\"; "
+        f"if [ $end -gt $start ]; then tail -c +$((start + 1)) -- {quoted} | head -c $((end - start)); fi"
+    )
+
+
+def read_log_window(conn, path: str, inode: Optional[int], end: Optional[int], window: int) -> Dict[str, Any]:
+    """
+    读取日志文件中结束于 end 的一段内容（阻塞调用）
+
+    Returns:
+        {"success", "missing", "inode", "size", "start", "end", "reason", "data": bytes, "error"}
+    """
+    result = {
+        "success": False,
+        "missing": False,
+        "inode": None,
+        "size": 0,
+        "start": 0,
+        "end": 0,
+        "reason": None,
+        "data": b"",
+        "error": None,
+    }
+    exec_result = conn.execute_command(
+        build_window_script(path, inode, end, window),
+        max_bytes=window + 1024,
+        encoding=None,
+        compress=True,
+        size_hint=window,
+    )
+    stdout = exec_result.get("stdout") or b""
+    header = _WINDOW_HEADER.match(stdout)
+    if not header:
+        result["error"] = exec_result.get("error") or "读取日志失败"
+        return result
+    result["success"] = True
+    if header.group(1) is None:
+        result["missing"] = True
+        return result
+    result.update({
+        "inode": int(header.group(1)),
+        "size": int(header.group(2)),
+        "start": int(header.group(3)),
+        "end": int(header.group(4)),
+        "reason": header.group(5).decode() or None,
+        "data": stdout[header.end():],
+    })
+    return result
+
+
+def query_log_records(
+    conn,
+    source: str,
+    path: str,
+    log_filter: LogFilter,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    window: int = LOG_QUERY_WINDOW_BYTES,
+    scan_bytes: int = LOG_QUERY_SCAN_BYTES,
+) -> Dict[str, Any]:
+    """
+    从新到旧查询符合条件的日志记录（阻塞调用）
+
+    从 cursor 指向的位置（为空时从文件末尾）向前分段读取，跨段的多行记录（异常堆栈）
+    留到下一段一起解析；扫描量达到 scan_bytes 仍不足 limit 条时先返回，next_cursor 指向扫描到的位置
+
+    Returns:
+        {
+            "success": bool,
+            "records": list,              # 从新到旧
+            "next_cursor": Optional[str], # 继续向前翻页；已到文件开头时为 None
+            "tail_cursor": Optional[str], # 首页返回，配合 read_log_range 获取之后新增的记录
+            "reset": bool,                # 游标对应的文件已被截断或替换，结果从文件末尾重新开始
+            "reason": Optional[str],
+            "missing": bool,
+            "scanned_bytes": int,
+            "error": Optional[str]
+        }
+    """
+    inode, end, _ = decode_cursor(cursor) if cursor else (None, None, 0)
+    result = {
+        "success": False,
+        "records": [],
+        "next_cursor": None,
+        "tail_cursor": None,
+        "reset": False,
+        "reason": None,
+        "missing": False,
+        "scanned_bytes": 0,
+        "error": None,
+    }
+    want_tail = cursor is None
+    size = 0
+    chunks = 0
+    while True:
+        chunk = read_log_window(conn, path, inode, end, window)
+        if not chunk["success"]:
+            result["error"] = chunk["error"]
+            return result
+        if chunk["missing"]:
+            result["success"] = True
+            result["missing"] = True
+            return result
+        if chunk["reason"]:
+            if chunks > 0:
+                # 翻页过程中文件被替换：先返回已有结果，下次请求时再从新文件末尾开始
+                result["next_cursor"] = encode_cursor(inode, end, size)
+                break
+            result["reset"] = True
+            result["reason"] = chunk["reason"]
+            want_tail = True
+        chunks += 1
+        inode, size = chunk["inode"], chunk["size"]
+        start, data = chunk["start"], chunk["data"]
+        result["scanned_bytes"] += len(data)
+
+        if want_tail:
+            # 首页：未写完的最后一行留给 tail_cursor 之后的增量读取
+            data = data[:data.rfind(b"\n") + 1]
+            result["tail_cursor"] = encode_cursor(inode, start + len(data), size)
+            want_tail = False
+        if start > 0:
+            # 窗口起点落在某一行中间，这一行的剩余部分留到下一段；单行超过窗口大小时按整段处理
+            newline = data.find(b"\n")
+            if newline >= 0:
+                data = data[newline + 1:]
+                start += newline + 1
+
+        records, orphans = parse_records(split_lines(data, start), source)
+        boundary = start
+        if orphans:
+            if records and start > 0:
+                # 第一条记录之前的后续行属于更早的记录，留到下一段一起解析
+                boundary = records[0]["offset"]
+            else:
+                records.insert(0, orphan_record(orphans, source))
+
+        for record in reversed(records):
+            if log_filter.matches(record):
+                result["records"].append(record)
+                if len(result["records"]) >= limit:
+                    boundary = record["offset"]
+                    break
+
+        end = boundary
+        if end <= 0:
+            break
+        if log_filter.since is not None and records and all(
+            record["ts"] is not None and record["ts"] < log_filter.since for record in records
+        ):
+            # 整段都早于起始时间，更早的内容不需要再扫描
+            break
+        if len(result["records"]) >= limit or result["scanned_bytes"] >= scan_bytes:
+            result["next_cursor"] = encode_cursor(inode, end, size)
+            break
+
+    result["success"] = True
+    return result
@@ -1,16 +1,38 @@
-from fastapi import FastAPI, HTTPException, Body, Depends
+from fastapi import FastAPI, HTTPException, Body, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import asyncio
+import base64
 import sys
 import os
 import json
 import re
+import shlex
 import subprocess
+import threading
+import time
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
-from ssh_manager import ssh_manager
-from database import get_db, engine, Base
+from ssh_manager import ssh_manager, server_connect_kwargs
+from database import get_db, engine, Base, SessionLocal
 from models import ServerConfig
+from service_status import STATUS_CHECK_COMMANDS, resolve_status_check, probe_services
+from status_poller import status_poller
+from log_tail import LogFollower, read_log_range, query_log_records, decode_cursor
+from log_parser import LOG_SOURCES, LogFilter, parse_records, orphan_record, split_lines
+from log_index import log_index
+from log_merge import MergedLogStream
+from access_stats import access_stats
+from start_script import start_script_cache, find_script_service, script_check_command
+from orchestrator import StartupRun, StartupStep, startup_orchestrator, select_nodes
+from service_registry import service_registry, render
+from jobs import job_queue, FINISHED_STATES
+from local_probe import (
+    LOCAL_READY_TIMEOUT, evaluate_check, local_snapshot, matching_pids, native_check,
+    pid_alive, probe_ready, process_tree, wait_stopped, wait_until,
+)
+from supervisor import local_supervisor
 
 # Add MCP path to sys.path
 # Assuming we run this from /home/sharelgx/MetaSeekOJdev/backend/
@@ -168,42 +190,28 @@ except ImportError as e:
                 if not server:
                     return {"success": False, "error": "服务器不存在"}
                 
-                # 连接SSH并检查状态
-                password = server.password if server.auth_type == "password" else None
-                private_key_path = server.private_key_path if server.auth_type == "key" else None
-                private_key_content = server.private_key_content if server.auth_type == "key" else None
-                
-                result = ssh_manager.connect(
-                    host=server.host,
-                    user=server.user,
-                    port=server.port or 22,
-                    password=password,
-                    private_key_path=private_key_path,
-                    private_key_content=private_key_content,
-                    timeout=10
-                )
+                # 从连接池取出SSH连接并检查状态
+                result = ssh_manager.get_connection(**server_connect_kwargs(server.to_dict()))
                 
                 if not result.get("success"):
                     return {"success": False, "error": f"SSH连接失败: {result.get('message')}"}
+                conn = result["connection"]
                 
                 # 执行状态检查命令
                 status_command = f"cd {server.project_path} && bash -c 'source /dev/stdin <<< \"$(cat <<EOF\n$(curl -s https://raw.githubusercontent.com/MetaSeekOJ/MetaSeekOJ/main/scripts/check_status.sh 2>/dev/null || echo \"echo \\\"Status check script not available\\\"\")\nEOF\n)\" 2>/dev/null || echo \"Status check failed\"'"
                 
                 # 简化版本：直接检查常见服务
-                check_commands = [
-                    "ps aux | grep -E '(python3.*manage.py|nginx|judge|heartbeat)' | grep -v grep || echo 'No services found'",
-                    "systemctl status nginx 2>&1 | head -3 || echo 'Nginx not found'",
-                    "curl -s http://localhost:8000/api/website/ 2>&1 | head -1 || echo 'API not responding'"
-                ]
+                check_commands = STATUS_CHECK_COMMANDS
                 
+                # 所有检查合并为一个脚本，在一个 channel 中一次执行完毕
+                batch_result = conn.execute_batch({
+                    str(index): f"cd {server.project_path} && {cmd}" for index, cmd in enumerate(check_commands)
+                })
                 all_output = []
-                for cmd in check_commands:
-                    exec_result = ssh_manager.execute_command(f"cd {server.project_path} && {cmd}")
+                for exec_result in batch_result.get("results", {}).values():
                     if exec_result.get("success"):
                         all_output.append(exec_result.get("stdout", ""))
                 
-                ssh_manager.close()
-                
                 return {
                     "success": True,
                     "stdout": "\n".join(all_output),
@@ -288,11 +296,30 @@ class RestartRequest(BaseModel):
     service: str
 
 class CommandRequest(BaseModel):
-    command: str
+    command: Optional[str] = None
+    # 按游标增量读取日志时使用（file 必须在允许列表中）
+    file: Optional[str] = None
+    cursor: Optional[str] = None
+    server_id: Optional[str] = None
+    # 按日志源查询结构化记录时使用（source 为 LOG_SOURCES 的键）
+    source: Optional[str] = None
+    level: Optional[str] = Field(default=None, description="级别过滤，多个用逗号分隔，如 ERROR,WARNING")
+    q: Optional[str] = Field(default=None, description="文本过滤（不区分大小写）")
+    since: Optional[str] = Field(default=None, description="起始时间（ISO 格式）")
+    until: Optional[str] = Field(default=None, description="结束时间（ISO 格式）")
+    limit: int = Field(default=100, ge=1, le=500)
+    # 上次返回的 tail_cursor：只返回之后新增的记录
+    after: Optional[str] = None
 
 class RestartProjectRequest(BaseModel):
     start_script: Optional[str] = None
 
+# 按依赖图并行启动的请求模型
+class StartupRequest(BaseModel):
+    start_script: Optional[str] = None
+    services: Optional[List[str]] = None  # 只启动这些服务（及其依赖），为空时启动全部
+    ready_timeout: Optional[float] = Field(default=None, gt=0, le=1800)
+
 class BrowsePathRequest(ServerConfigRequest):
     path: Optional[str] = Field(default="/", description="要浏览的路径")
 
@@ -310,14 +337,110 @@ class ServiceOperationRequest(BaseModel):
     operation: str  # "start", "stop", "restart", "status"
     script_path: Optional[str] = None
 
+# 批量服务状态检查请求模型
+class BulkServiceStatusRequest(BaseModel):
+    service_names: List[str] = Field(..., min_length=1, max_length=50)
+
+# 服务注册表条目的请求模型（命令中的 {project_path} 替换为项目路径）
+class ServiceDefinitionRequest(BaseModel):
+    name: str
+    match: List[List[str]] = Field(default_factory=list, description="关键词组，服务名称包含某一组的全部关键词即匹配")
+    aliases: List[str] = Field(default_factory=list)
+    start_command: Optional[str] = None
+    stop_command: Optional[str] = None
+    restart_command: Optional[str] = None
+    status_command: Optional[str] = None
+    readiness: Optional[Dict[str, Any]] = None
+    ports: List[int] = Field(default_factory=list)
+    log_file: Optional[str] = None
+    process_pattern: Optional[str] = None
+    docker_pattern: Optional[str] = None
+    port_sufficient: bool = Field(default=False, description="端口在监听即视为运行中")
+    scope: str = Field(default="all", pattern="^(all|remote)$")
+    sort_order: Optional[int] = None
+    is_active: bool = True
+
 @app.get("/")
 async def root():
     return {"message": "Ops Dashboard API is running"}
 
+@app.on_event("startup")
+async def start_status_poller():
+    """加载服务注册表，启动SSH空闲连接回收、后台任务队列、状态轮询和日志索引同步"""
+    db = SessionLocal()
+    try:
+        service_registry.load(db)
+    finally:
+        db.close()
+    await ssh_manager.start_eviction()
+    await job_queue.start()
+    await local_supervisor.start()
+    await status_poller.start()
+    await log_index.start()
+
+@app.on_event("shutdown")
+async def close_ssh_pool():
+    """应用退出时停止后台任务并关闭连接池中的所有SSH连接"""
+    await status_poller.stop()
+    await startup_orchestrator.stop()
+    await job_queue.stop()
+    await local_supervisor.stop()
+    await log_index.stop()
+    access_stats.shutdown()
+    await ssh_manager.stop_eviction()
+    ssh_manager.close_all()
+
+@app.get("/api/ssh/pool")
+async def get_ssh_pool_stats():
+    """查看SSH连接池状态"""
+    return ssh_manager.pool_stats()
+
 @app.get("/api/status")
-async def get_status(server_id: Optional[str] = None, db: Session = Depends(get_db)):
-    """获取服务器状态，可以指定 server_id 或使用当前选中的服务器"""
-    return mcp.check_status(server_id=server_id, db=db)
+async def get_status(server_id: Optional[str] = None, fresh: bool = False, db: Session = Depends(get_db)):
+    """
+    获取服务器状态，可以指定 server_id 或使用当前选中的服务器
+    默认返回后台轮询的最新快照（带 age_seconds / stale），fresh=1 时强制实时检查
+    """
+    target_server_id = server_id or getattr(mcp, "_current_server_id", None)
+    if not fresh and target_server_id:
+        snapshot = status_poller.get(target_server_id)
+        if snapshot and snapshot.get("status"):
+            return {
+                **snapshot["status"],
+                "server_id": target_server_id,
+                "cached": True,
+                "age_seconds": snapshot["age_seconds"],
+                "stale": snapshot["stale"]
+            }
+    
+    # check_status 内部是阻塞的SSH调用，放到SSH线程池执行，避免阻塞事件循环
+    result = await ssh_manager.run_blocking(mcp.check_status, server_id=server_id, db=db)
+    if isinstance(result, dict):
+        return {**result, "cached": False, "age_seconds": 0, "stale": False}
+    return result
+
+@app.get("/api/fleet/status")
+async def get_fleet_status(deadline: Optional[float] = None, workers: Optional[int] = None):
+    """
+    并发获取所有激活服务器的状态
+    最多同时检查 workers 台，整体不超过 deadline 秒；超时的服务器标记为 timed_out 并返回其上一次的快照
+    """
+    options = {}
+    if deadline is not None:
+        if deadline <= 0:
+            raise HTTPException(status_code=400, detail="deadline 必须大于 0")
+        options["deadline"] = min(deadline, 60)
+    if workers is not None:
+        if workers <= 0:
+            raise HTTPException(status_code=400, detail="workers 必须大于 0")
+        options["workers"] = min(workers, 64)
+    try:
+        return await status_poller.probe_fleet(**options)
+    except Exception as e:
+        import traceback
+        print(f"Error getting fleet status: {e}")
+        print(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"获取服务器状态失败: {str(e)}")
 
 @app.get("/api/servers")
 async def list_servers(db: Session = Depends(get_db)):
@@ -358,8 +481,8 @@ async def browse_path(request: BrowsePathRequest):
         private_key_path = request.private_key_path.strip() if request.private_key_path else None
         private_key_content = request.private_key_content.strip() if request.private_key_content else None
         
-        # 连接SSH
-        result = ssh_manager.connect(
+        # 从连接池取出SSH连接
+        result = await ssh_manager.aget_connection(
             host=request.host,
             user=request.user,
             port=request.port or 22,
@@ -370,37 +493,26 @@ async def browse_path(request: BrowsePathRequest):
         )
         
         if not result.get("success"):
-            # 连接失败，确保清理连接
-            try:
-                ssh_manager.close()
-            except:
-                pass
             raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+        conn = result["connection"]
         
         # 获取要浏览的路径
         browse_path = request.path if request.path else "/"
         if not browse_path:
             browse_path = "/"
         
-        try:
-            # 执行 ls 命令列出文件和目录
-            # -p 在目录后添加 /，-1 每行一个文件，-a 显示隐藏文件
-            command = f"ls -1pa '{browse_path}' 2>/dev/null || echo 'ERROR: Directory not found'"
-            exec_result = ssh_manager.execute_command(command)
-            
-            if not exec_result.get("success") or "ERROR" in exec_result.get("stdout", ""):
-                return {
-                    "success": False,
-                    "message": f"无法访问路径: {browse_path}",
-                    "path": browse_path,
-                    "items": []
-                }
-        finally:
-            # 确保连接被关闭
-            try:
-                ssh_manager.close()
-            except:
-                pass
+        # 执行 ls 命令列出文件和目录
+        # -p 在目录后添加 /，-1 每行一个文件，-a 显示隐藏文件
+        command = f"ls -1pa '{browse_path}' 2>/dev/null || echo 'ERROR: Directory not found'"
+        exec_result = await conn.aexecute_command(command)
+        
+        if not exec_result.get("success") or "ERROR" in exec_result.get("stdout", ""):
+            return {
+                "success": False,
+                "message": f"无法访问路径: {browse_path}",
+                "path": browse_path,
+                "items": []
+            }
         
         # 解析输出
         output = exec_result.get("stdout", "")
@@ -477,8 +589,8 @@ async def test_connection(config: ServerConfigRequest):
         private_key_path = config.private_key_path.strip() if config.private_key_path else None
         private_key_content = config.private_key_content.strip() if config.private_key_content else None
         
-        # 尝试连接
-        result = ssh_manager.connect(
+        # 尝试连接（成功的连接留在连接池中，保存配置后可直接复用）
+        result = await ssh_manager.aget_connection(
             host=config.host,
             user=config.user,
             port=config.port or 22,
@@ -488,36 +600,29 @@ async def test_connection(config: ServerConfigRequest):
             timeout=10
         )
         
-        try:
-            if result.get("success"):
-                # 测试连接是否真的可用
-                test_result = ssh_manager.test_connection()
-                
-                if test_result.get("success"):
-                    return {
-                        "success": True,
-                        "message": "连接测试成功",
-                        "output": test_result.get("output", ""),
-                        "server_info": test_result.get("output", "").split("\n") if test_result.get("output") else []
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "message": "连接建立但测试失败",
-                        "error": test_result.get("error", "Unknown error")
-                    }
+        if result.get("success"):
+            # 测试连接是否真的可用
+            test_result = await result["connection"].atest_connection()
+            
+            if test_result.get("success"):
+                return {
+                    "success": True,
+                    "message": "连接测试成功",
+                    "output": test_result.get("output", ""),
+                    "server_info": test_result.get("output", "").split("\n") if test_result.get("output") else []
+                }
             else:
                 return {
                     "success": False,
-                    "message": result.get("message", "连接失败"),
-                    "error": result.get("error", "Unknown error")
+                    "message": "连接建立但测试失败",
+                    "error": test_result.get("error", "Unknown error")
                 }
-        finally:
-            # 确保连接被关闭
-            try:
-                ssh_manager.close()
-            except:
-                pass
+        else:
+            return {
+                "success": False,
+                "message": result.get("message", "连接失败"),
+                "error": result.get("error", "Unknown error")
+            }
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -561,6 +666,7 @@ async def save_server(config: ServerConfigRequest, db: Session = Depends(get_db)
             config_dict.pop("password", None)
         
         result = mcp.save_server_config(config.server_id, config_dict, db=db)
+        start_script_cache.invalidate(config.server_id)
         
         if not result:
             raise HTTPException(status_code=500, detail="保存配置失败：未返回结果")
@@ -584,6 +690,7 @@ async def save_server(config: ServerConfigRequest, db: Session = Depends(get_db)
 async def delete_server(server_id: str, db: Session = Depends(get_db)):
     try:
         result = mcp.delete_server_config(server_id, db=db)
+        start_script_cache.invalidate(server_id)
         if isinstance(result, dict) and result.get("success") is False:
             raise HTTPException(status_code=400, detail=result.get("error") or "删除服务器配置失败")
         return result
@@ -596,19 +703,46 @@ async def delete_server(server_id: str, db: Session = Depends(get_db)):
         print(f"Traceback: {error_trace}")
         raise HTTPException(status_code=500, detail=f"删除服务器配置失败: {str(e)}")
 
+async def _no_progress(message: str, percent: Optional[int] = None, **data):
+    """同步执行（非后台任务）时忽略进度"""
+
+async def _run_or_submit(background: bool, kind: str, host: str, title: str, params: Dict[str, Any], work) -> Dict[str, Any]:
+    """
+    background 为真时把 work 提交为后台任务，立即返回任务ID；否则直接执行并返回 work 的结果
+    work(progress) 是执行操作的协程，progress(message, percent=None, **data) 报告进度
+    """
+    if not background:
+        return await work(_no_progress)
+    job = await job_queue.submit(kind, host, lambda job: work(job.progress), title=title, params=params)
+    return {"success": True, "job_id": job.id, "job": job.to_dict()}
+
+def _mcp_host() -> str:
+    """代码同步 / 构建的目标主机（MCP 当前选中的服务器）"""
+    return getattr(mcp, "_current_server_id", None) or "default"
+
 @app.post("/api/sync")
-async def sync_code(request: SyncRequest):
-    return mcp.sync_code(request.scope)
+async def sync_code(request: SyncRequest, background: bool = False):
+    async def work(progress):
+        await progress(f"同步代码: {request.scope}")
+        return await ssh_manager.run_blocking(mcp.sync_code, request.scope)
+
+    return await _run_or_submit(background, "sync", _mcp_host(), f"同步代码: {request.scope}", request.model_dump(), work)
 
 @app.post("/api/build")
-async def build_frontend(request: BuildRequest):
+async def build_frontend(request: BuildRequest, background: bool = False):
     if request.type == 'react':
-        return mcp.build_react_frontend(memory_limit=request.memory_limit, incremental=request.incremental)
+        build = lambda: mcp.build_react_frontend(memory_limit=request.memory_limit, incremental=request.incremental)
     elif request.type == 'vue':
-        return mcp.build_vue_admin_frontend()
+        build = mcp.build_vue_admin_frontend
     else:
         raise HTTPException(status_code=400, detail="Invalid build type")
 
+    async def work(progress):
+        await progress(f"构建前端: {request.type}")
+        return await ssh_manager.run_blocking(build)
+
+    return await _run_or_submit(background, "build", _mcp_host(), f"构建前端: {request.type}", request.model_dump(), work)
+
 @app.get("/api/profile")
 async def get_profile():
     # Dummy profile for dev
@@ -644,13 +778,13 @@ async def logout():
 
 @app.post("/api/restart")
 async def restart_service(request: RestartRequest):
-    return mcp.restart_services(request.service)
+    return await ssh_manager.run_blocking(mcp.restart_services, request.service)
 
 @app.post("/api/servers/{server_id}/restart-project")
-async def restart_project(server_id: str, request: Optional[RestartProjectRequest] = None, db: Session = Depends(get_db)):
+async def restart_project(server_id: str, request: Optional[RestartProjectRequest] = None, background: bool = False, db: Session = Depends(get_db)):
     """
     重启指定服务器的项目
-    执行项目的启动脚本
+    执行项目的启动脚本；background=1 时提交为后台任务，立即返回任务ID（见 /api/jobs/{job_id}）
     """
     try:
         # 获取服务器列表
@@ -668,61 +802,13 @@ async def restart_project(server_id: str, request: Optional[RestartProjectReques
             # 默认使用服务器配置中的启动脚本，或使用标准路径
             start_script = server_config.get("start_script") or "/home/sharelgx/MetaSeekOJdev/start_dev.sh"
         
-        # 构建完整命令（在后台运行，并重定向输出）
-        # 切换到项目目录并执行启动脚本
-        project_path = server_config.get("project_path", "")
-        log_file = f"/tmp/project_restart_{server_id}.log"
+        async def work(progress):
+            return await _restart_project(server_id, server_config, start_script, progress)
         
-        # 清空之前的日志文件，并立即开始写入
-        # 使用 nohup 确保进程在 SSH 断开后继续运行
-        # 使用 stdbuf -oL -eL 禁用行缓冲，确保输出实时写入
-        # 如果系统没有 stdbuf，则使用 script 命令或直接执行
-        command = f"""
-        cd {project_path} && \\
-        echo "[$(date '+%Y-%m-%d %H:%M:%S')] 开始执行启动脚本: {start_script}" > {log_file} && \\
-        (nohup bash -c "cd {project_path} && stdbuf -oL -eL bash {start_script} 2>&1 || bash {start_script} 2>&1" >> {log_file} 2>&1 &) && \\
-        sleep 0.5 && \\
-        echo "[$(date '+%Y-%m-%d %H:%M:%S')] 启动脚本已在后台执行" >> {log_file} && \\
-        tail -5 {log_file}
-        """
-        
-        # 连接SSH
-        password = server_config.get("password") if server_config.get("auth_type") == "password" else None
-        private_key_path = server_config.get("private_key_path") if server_config.get("auth_type") == "key" else None
-        private_key_content = server_config.get("private_key_content") if server_config.get("auth_type") == "key" else None
-        
-        result = ssh_manager.connect(
-            host=server_config.get("host"),
-            user=server_config.get("user"),
-            port=server_config.get("port", 22),
-            password=password,
-            private_key_path=private_key_path,
-            private_key_content=private_key_content,
-            timeout=10
+        return await _run_or_submit(
+            background, "restart_project", server_id, f"重启项目: {server_config.get('name')}",
+            {"start_script": start_script}, work
         )
-        
-        if not result.get("success"):
-            raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
-        
-        # 执行命令
-        exec_result = ssh_manager.execute_command(command)
-        ssh_manager.close()
-        
-        if exec_result.get("success"):
-            log_file = f"/tmp/project_restart_{server_id}.log"
-            return {
-                "success": True,
-                "message": f"项目重启命令已执行: {server_config.get('name')}",
-                "output": exec_result.get("stdout", ""),
-                "log_file": log_file
-            }
-        else:
-            return {
-                "success": False,
-                "message": f"项目重启失败: {exec_result.get('error')}",
-                "error": exec_result.get("error"),
-                "stderr": exec_result.get("stderr", "")
-            }
             
     except HTTPException:
         raise
@@ -733,11 +819,222 @@ async def restart_project(server_id: str, request: Optional[RestartProjectReques
         print(f"Traceback: {error_trace}")
         raise HTTPException(status_code=500, detail=f"重启项目失败: {str(e)}")
 
+async def _restart_project(server_id: str, server_config: Dict[str, Any], start_script: str, progress) -> Dict[str, Any]:
+    """在后台执行服务器的启动脚本，返回执行结果"""
+    # 构建完整命令（在后台运行，并重定向输出）
+    # 切换到项目目录并执行启动脚本
+    project_path = server_config.get("project_path", "")
+    log_file = f"/tmp/project_restart_{server_id}.log"
+    
+    # 清空之前的日志文件，并立即开始写入
+    # 使用 nohup 确保进程在 SSH 断开后继续运行
+    # 使用 stdbuf -oL -eL 禁用行缓冲，确保输出实时写入
+    # 如果系统没有 stdbuf，则使用 script 命令或直接执行
+    command = f"""
+    cd {project_path} && \\
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] 开始执行启动脚本: {start_script}" > {log_file} && \\
+    (nohup bash -c "cd {project_path} && stdbuf -oL -eL bash {start_script} 2>&1 || bash {start_script} 2>&1" >> {log_file} 2>&1 &) && \\
+    sleep 0.5 && \\
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] 启动脚本已在后台执行" >> {log_file} && \\
+    tail -5 {log_file}
+    """
+    
+    # 从连接池取出SSH连接
+    await progress("连接服务器", 10)
+    result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
+    
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+    conn = result["connection"]
+    
+    # 执行命令
+    await progress(f"执行启动脚本: {start_script}", 30, log_file=log_file)
+    exec_result = await conn.aexecute_command(command)
+    
+    if exec_result.get("success"):
+        return {
+            "success": True,
+            "message": f"项目重启命令已执行: {server_config.get('name')}",
+            "output": exec_result.get("stdout", ""),
+            "log_file": log_file
+        }
+    else:
+        return {
+            "success": False,
+            "message": f"项目重启失败: {exec_result.get('error')}",
+            "error": exec_result.get("error"),
+            "stderr": exec_result.get("stderr", "")
+        }
+
+@app.post("/api/servers/{server_id}/startup")
+async def orchestrated_startup(server_id: str, request: Optional[StartupRequest] = None, db: Session = Depends(get_db)):
+    """
+    按启动脚本解析出的依赖图并行启动服务
+    没有依赖关系的服务同时启动，有依赖的服务等被依赖的服务就绪后再启动；立即返回启动记录ID，
+    进度通过 /api/servers/{server_id}/startup/{run_id}（及 /stream）查看，各服务的输出追加到重启日志
+    """
+    servers = mcp.list_servers(db=db).get("servers", {})
+    if server_id not in servers:
+        raise HTTPException(status_code=404, detail=f"服务器 {server_id} 不存在")
+    server_config = servers[server_id]
+    start_script = (request and request.start_script) or server_config.get("start_script") or "/home/sharelgx/MetaSeekOJdev/start_dev.sh"
+    project_path = server_config.get("project_path", "") or "."
+    log_file = f"/tmp/project_restart_{server_id}.log"
+
+    active = startup_orchestrator.active(server_id)
+    if active:
+        raise HTTPException(status_code=409, detail=f"服务器正在启动中: {active.id}")
+
+    result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+    conn = result["connection"]
+
+    load_result = await ssh_manager.run_blocking(start_script_cache.load, conn, server_id, start_script)
+    if load_result["missing"]:
+        raise HTTPException(status_code=404, detail=f"启动脚本不存在: {start_script}")
+    if not load_result["success"]:
+        raise HTTPException(status_code=500, detail=f"读取启动脚本失败: {load_result['error']}")
+    graph = load_result["parsed"].get("graph")
+    if not graph or not graph["nodes"]:
+        raise HTTPException(status_code=400, detail="启动脚本中没有识别到可以单独启动的服务函数，请使用 restart-project")
+    try:
+        nodes = select_nodes(graph, request.services if request else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 启动脚本去掉顶层命令后写入远程临时文件，每个服务 source 之后单独调用对应的函数
+    library = start_script_cache.library(load_result["sha256"])
+    library_path = f"/tmp/opsdashboard_startup_{load_result['sha256'][:12]}.sh"
+    encoded = base64.b64encode(library.encode("utf-8")).decode("ascii")
+    prepare_command = (
+        f"echo {encoded} | base64 -d > {library_path} && "
+        f"echo \"[$(date '+%Y-%m-%d %H:%M:%S')] 按依赖图并行启动: {start_script}\" > {log_file}"
+    )
+    steps = [
+        StartupStep(
+            node["id"],
+            node["name"],
+            f"cd {shlex.quote(project_path)} && {{ . {library_path} && {node['id']}; }} >> {log_file} 2>&1 < /dev/null",
+            node["probe"],
+            node["depends_on"],
+        )
+        for node in nodes
+    ]
+    options = {"ready_timeout": request.ready_timeout} if request and request.ready_timeout else {}
+    run = startup_orchestrator.start(conn, StartupRun(server_id, steps, prepare_command=prepare_command, **options))
+    return {
+        "success": True,
+        "run_id": run.id,
+        "script_path": start_script,
+        "log_file": log_file,
+        "levels": graph["levels"],
+        "run": run.to_dict()
+    }
+
+def _startup_run(server_id: str, run_id: str) -> StartupRun:
+    run = startup_orchestrator.get(run_id)
+    if run is None or run.server_id != server_id:
+        raise HTTPException(status_code=404, detail=f"启动记录 {run_id} 不存在")
+    return run
+
+@app.get("/api/servers/{server_id}/startup/{run_id}")
+async def get_startup_run(server_id: str, run_id: str):
+    """并行启动的进度：每个服务的状态、启动和就绪耗时，以及总耗时、串行耗时和关键路径"""
+    return _startup_run(server_id, run_id).to_dict()
+
+@app.get("/api/servers/{server_id}/startup/{run_id}/stream")
+async def stream_startup_run(server_id: str, run_id: str, request: Request, after: int = 0):
+    """以 Server-Sent Events 推送并行启动的进度（step / run 事件），after 为已收到的事件数"""
+    run = _startup_run(server_id, run_id)
+
+    async def event_stream():
+        yield _sse_event("open", {"run_id": run.id, "steps": list(run.steps)})
+        async for item in run.follow(after, heartbeat=LOG_STREAM_HEARTBEAT):
+            if item is None:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            index, event = item
+            yield _sse_event(event["type"], event, str(index))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/jobs")
+async def list_jobs(host: Optional[str] = None, state: Optional[str] = None, limit: int = 50):
+    """最近的后台任务（包括已持久化的历史任务），以及任务队列的状态"""
+    limit = max(1, min(limit, 200))
+    jobs = [job.to_dict() for job in job_queue.list(host=host, state=state)][:limit]
+    if len(jobs) < limit:
+        seen = {job["id"] for job in jobs}
+        history = await ssh_manager.run_blocking(job_queue.recent, host=host, state=state, limit=limit)
+        jobs += [job for job in history if job["id"] not in seen][:limit - len(jobs)]
+    return {"success": True, "jobs": jobs, "queue": job_queue.stats()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """后台任务的状态、进度、结果和进度事件"""
+    job = job_queue.get(job_id)
+    if job is not None:
+        return {**job.to_dict(), "events": job.events}
+    record = await ssh_manager.run_blocking(job_queue.history, job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    return record
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """取消排队中或执行中的任务（已经在远程执行的命令不会被中断）"""
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在或已不在内存中")
+    return {"success": True, "job": job.to_dict()}
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job(job_id: str, request: Request, after: int = 0):
+    """以 Server-Sent Events 推送任务的进度（state / progress 事件），after 为已收到的事件数"""
+    job = job_queue.get(job_id)
+    if job is None:
+        record = await ssh_manager.run_blocking(job_queue.history, job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+
+    async def event_stream():
+        if job is None:
+            # 已结束并且只在数据库中的任务：一次性推送保存的事件
+            yield _sse_event("open", {"job_id": job_id, "state": record["state"]})
+            for index, event in enumerate(record["events"][after:], start=after + 1):
+                yield _sse_event(event["type"], event, str(index))
+            yield _sse_event("end", {k: v for k, v in record.items() if k != "events"})
+            return
+        yield _sse_event("open", {"job_id": job.id, "state": job.state})
+        async for item in job.follow(after, heartbeat=LOG_STREAM_HEARTBEAT):
+            if item is None:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            index, event = item
+            yield _sse_event(event["type"], event, str(index))
+        if job.state in FINISHED_STATES:
+            yield _sse_event("end", job.to_dict())
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/servers/{server_id}/restart-log")
-async def get_restart_log(server_id: str, lines: int = 100, db: Session = Depends(get_db)):
+async def get_restart_log(server_id: str, lines: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)):
     """
     获取指定服务器的重启日志
-    返回最近N行的日志内容
+    返回最近N行的日志内容；传入 cursor 时只返回该游标之后新增的内容和新的游标（首次请求传空字符串）
     """
     try:
         # 获取服务器列表
@@ -750,29 +1047,25 @@ async def get_restart_log(server_id: str, lines: int = 100, db: Session = Depend
         server_config = servers[server_id]
         log_file = f"/tmp/project_restart_{server_id}.log"
         
-        # 连接SSH
-        password = server_config.get("password") if server_config.get("auth_type") == "password" else None
-        private_key_path = server_config.get("private_key_path") if server_config.get("auth_type") == "key" else None
-        private_key_content = server_config.get("private_key_content") if server_config.get("auth_type") == "key" else None
-        
-        result = ssh_manager.connect(
-            host=server_config.get("host"),
-            user=server_config.get("user"),
-            port=server_config.get("port", 22),
-            password=password,
-            private_key_path=private_key_path,
-            private_key_content=private_key_content,
-            timeout=10
-        )
+        # 从连接池取出SSH连接
+        result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
         
         if not result.get("success"):
             raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+        conn = result["connection"]
+        
+        if cursor is not None:
+            # 增量读取：只传输游标之后新增的字节
+            try:
+                range_result = await ssh_manager.run_blocking(read_log_range, conn, log_file, cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return _log_range_response(range_result, log_file=log_file)
         
         # 读取日志文件（如果文件不存在，返回提示信息）
         # 使用更友好的错误处理
         command = f"if [ -f {log_file} ]; then tail -n {lines} {log_file}; else echo '[日志文件尚未创建，请稍候...]'; fi"
-        exec_result = ssh_manager.execute_command(command)
-        ssh_manager.close()
+        exec_result = await conn.aexecute_command(command, compress=True)
         
         if exec_result.get("success"):
             return {
@@ -797,36 +1090,354 @@ async def get_restart_log(server_id: str, lines: int = 100, db: Session = Depend
         print(f"Traceback: {error_trace}")
         raise HTTPException(status_code=500, detail=f"读取重启日志失败: {str(e)}")
 
+# SSE 心跳间隔（秒），避免代理因长时间无数据断开连接
+LOG_STREAM_HEARTBEAT = 15
+
+def _sse_event(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.get("/api/servers/{server_id}/restart-log/stream")
+async def stream_restart_log(server_id: str, request: Request, offset: Optional[int] = None, inode: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    以 Server-Sent Events 推送重启日志的新增内容
+    在一个SSH channel 上从字节偏移开始 tail -F，只推送新追加的内容；文件被截断或重新创建时推送 reset 事件
+    断线重连时浏览器会带上 Last-Event-ID（inode:offset），从断开处继续
+    """
+    servers_result = mcp.list_servers(db=db)
+    servers = servers_result.get("servers", {})
+    if server_id not in servers:
+        raise HTTPException(status_code=404, detail=f"服务器 {server_id} 不存在")
+
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and offset is None:
+        try:
+            inode_part, offset_part = last_event_id.split(":", 1)
+            inode = int(inode_part) if inode_part else None
+            offset = int(offset_part)
+        except ValueError:
+            pass
+
+    server_config = servers[server_id]
+    log_file = f"/tmp/project_restart_{server_id}.log"
+    result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+    follower = LogFollower(result["connection"], log_file, offset=offset, inode=inode)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def pump():
+        # tail -F 会一直运行，使用单独的线程读取，避免长期占用SSH线程池
+        try:
+            for event in follower.events():
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except Exception as e:
+            print(f"Error following restart log: {e}")
+            loop.call_soon_threadsafe(queue.put_nowait, {"type": "error", "error": str(e)})
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    async def event_stream():
+        threading.Thread(target=pump, name=f"restart-log-{server_id}", daemon=True).start()
+        yield _sse_event("open", {"log_file": log_file})
+        held = None
+        ended = False
+        try:
+            while not ended:
+                if held is not None:
+                    event, held = held, None
+                else:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout=LOG_STREAM_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            break
+                        yield ": ping\n\n"
+                        continue
+                if event is None:
+                    break
+                # 合并已经到达的连续数据，减少推送次数
+                while event["type"] == "data" and not queue.empty():
+                    following = queue.get_nowait()
+                    if following is None:
+                        ended = True
+                        break
+                    if following["type"] != "data":
+                        held = following
+                        break
+                    event = {**following, "data": event["data"] + following["data"]}
+                event_id = f"{event.get('inode') or ''}:{event['offset']}" if "offset" in event else None
+                yield _sse_event(event["type"], event, event_id)
+        finally:
+            follower.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 合并跟踪时最多同时跟踪的服务器数量
+LOG_MERGE_MAX_SERVERS = 20
+
+@app.get("/api/logs/merged-stream")
+async def stream_merged_logs(request: Request, source: str, server_ids: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    以 Server-Sent Events 推送多台服务器同一日志源按时间合并后的新增记录
+    server_ids 为逗号分隔的服务器ID，为空时跟踪所有激活的服务器；定期推送 lag 事件报告每台服务器的延迟
+    """
+    if source not in LOG_SOURCES:
+        raise HTTPException(status_code=400, detail=f"未知的日志源: {source}")
+    servers = mcp.list_servers(db=db).get("servers", {})
+    if server_ids:
+        selected = [server_id.strip() for server_id in server_ids.split(",") if server_id.strip()]
+        unknown = [server_id for server_id in selected if server_id not in servers]
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"服务器 {', '.join(unknown)} 不存在")
+    else:
+        selected = list(servers)
+    if not selected:
+        raise HTTPException(status_code=400, detail="没有可跟踪的服务器")
+    if len(selected) > LOG_MERGE_MAX_SERVERS:
+        raise HTTPException(status_code=400, detail=f"最多同时跟踪 {LOG_MERGE_MAX_SERVERS} 台服务器")
+
+    # 并发建立连接，连接失败的服务器在 host 事件中报告，不影响其他服务器
+    results = await asyncio.gather(
+        *(ssh_manager.aget_connection(**server_connect_kwargs(servers[server_id])) for server_id in selected),
+        return_exceptions=True,
+    )
+    connections = {}
+    errors = {}
+    for server_id, result in zip(selected, results):
+        if isinstance(result, Exception):
+            errors[server_id] = str(result)
+        elif not result.get("success"):
+            errors[server_id] = result.get("message") or "SSH连接失败"
+        else:
+            connections[server_id] = result["connection"]
+    merged = MergedLogStream(source, connections, errors)
+
+    async def event_stream():
+        yield _sse_event("open", {"source": source, "log_file": LOG_SOURCES[source]["path"], "servers": selected})
+        events = merged.events()
+        try:
+            # 合并流至少每 LOG_MERGE_LAG_INTERVAL 秒产生一次 lag 事件，兼作心跳
+            async for event in events:
+                yield _sse_event(event["type"], event)
+                if await request.is_disconnected():
+                    break
+        finally:
+            merged.close()
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/fix/scratch")
 async def fix_scratch():
-    return mcp.fix_scratch_editor()
+    return await ssh_manager.run_blocking(mcp.fix_scratch_editor)
+
+def _log_range_response(range_result: Dict[str, Any], **extra) -> Dict[str, Any]:
+    """把 read_log_range 的结果转换为日志接口的返回格式"""
+    if not range_result.get("success"):
+        return {"success": False, "error": range_result.get("error") or "读取日志失败", "log_content": "", **extra}
+    return {
+        "success": True,
+        "log_content": range_result["content"] if not range_result["missing"] else "[日志文件尚未创建，请稍候...]",
+        "cursor": range_result["cursor"],
+        "reset": range_result["reset"],
+        "reason": range_result["reason"],
+        "missing": range_result["missing"],
+        "has_more": range_result["has_more"],
+        **extra
+    }
+
+# 允许读取的日志文件
+LOG_ALLOWED_FILES = {source["path"]: key for key, source in LOG_SOURCES.items()}
+
+# 兼容旧接口的命令格式：tail -n N <文件>
+_TAIL_COMMAND = re.compile(r"^tail\s+(?:-n\s*(\d+)\s+)?(\S+)\s*$")
+
+async def _log_server_connection(server_id: Optional[str], db: Session):
+    """取出日志所在服务器的连接，未指定服务器时使用当前服务器"""
+    server_id = server_id or getattr(mcp, "_current_server_id", None)
+    servers = mcp.list_servers(db=db).get("servers", {})
+    if not server_id or server_id not in servers:
+        raise HTTPException(status_code=404, detail=f"服务器 {server_id} 不存在")
+    result = await ssh_manager.aget_connection(**server_connect_kwargs(servers[server_id]))
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+    return server_id, result["connection"]
+
+def _query_new_records(conn, source: str, path: str, log_filter: LogFilter, after: str, limit: int) -> Dict[str, Any]:
+    """读取 tail_cursor 之后新增的内容并解析为记录（从新到旧）"""
+    range_result = read_log_range(conn, path, after)
+    if not range_result["success"] or range_result["missing"]:
+        return {**range_result, "records": [], "tail_cursor": range_result["cursor"]}
+    # 上次的游标位置就是行首（文件被截断或替换时从头读取），content 只包含完整的行
+    start = 0 if range_result["reset"] else decode_cursor(after)[1]
+    records, orphans = parse_records(split_lines(range_result["content"].encode("utf-8"), start), source)
+    if orphans:
+        records.insert(0, orphan_record(orphans, source))
+    matched = [record for record in reversed(records) if log_filter.matches(record)]
+    return {
+        "success": True,
+        "records": matched[:limit],
+        "tail_cursor": range_result["cursor"],
+        "reset": range_result["reset"],
+        "reason": range_result["reason"],
+        "missing": False,
+        "has_more": range_result["has_more"],
+        "error": None,
+    }
+
+@app.get("/api/logs/sources")
+async def list_log_sources():
+    """允许查看的日志源"""
+    return {
+        "success": True,
+        "sources": [
+            {"id": key, "label": source["label"], "path": source["path"], "format": source["format"]}
+            for key, source in LOG_SOURCES.items()
+        ],
+    }
+
+@app.get("/api/logs/search")
+async def search_logs(
+    q: Optional[str] = None,
+    server_id: Optional[str] = None,
+    source: Optional[str] = None,
+    level: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+):
+    """
+    在本地日志索引中搜索（后台定期从各服务器同步，见 log_index.py）
+    结果从新到旧，next_cursor 用于获取下一页
+    """
+    if source is not None and source not in LOG_SOURCES:
+        raise HTTPException(status_code=400, detail=f"未知的日志源: {source}")
+    if limit <= 0 or limit > 1000:
+        raise HTTPException(status_code=400, detail="limit 必须在 1 到 1000 之间")
+    try:
+        log_filter = LogFilter.from_params(level, None, since, until)
+        result = await ssh_manager.run_blocking(
+            log_index.search,
+            q=q,
+            server_id=server_id,
+            source=source,
+            levels=sorted(log_filter.levels) if log_filter.levels else None,
+            since=log_filter.since,
+            until=log_filter.until,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result
+
+@app.get("/api/logs/index")
+async def get_log_index_status():
+    """日志索引的同步状态和分区"""
+    return await ssh_manager.run_blocking(log_index.status)
+
+@app.post("/api/logs/index/sync")
+async def sync_log_index(server_id: Optional[str] = None, db: Session = Depends(get_db)):
+    """立即同步日志索引（未指定服务器时同步所有激活的服务器）"""
+    servers = mcp.list_servers(db=db).get("servers", {})
+    if server_id is not None:
+        if server_id not in servers:
+            raise HTTPException(status_code=404, detail=f"服务器 {server_id} 不存在")
+        targets = [servers[server_id]]
+    else:
+        targets = list(servers.values())
+    results = await asyncio.gather(*(log_index.sync_server(config) for config in targets))
+    await ssh_manager.run_blocking(log_index.apply_retention)
+    return {
+        "success": all(result.get("success") for result in results),
+        "servers": {result["server_id"]: result for result in results},
+    }
 
 @app.post("/api/logs")
-async def fetch_logs(request: CommandRequest):
-    # Security note: In prod, validate the command or file path strictly.
-    # Here we assume internal tool usage.
-    # But strictly speaking we should only allow tailing specific files.
-    allowed_files = [
-        "/tmp/oj_error.log", 
-        "/tmp/oj_access.log",
-        "/var/log/nginx/error.log",
-        "/var/log/nginx/access.log",
-        "/tmp/scratch_editor.log",
-        "/home/ubuntu/MetaSeekOJ/logs/scratch-runner.log"
-    ]
-    
-    # Simple check if the command is a tail command on allowed files
-    # This is a weak check, but better than nothing for now.
-    is_allowed = False
-    for f in allowed_files:
-        if f in request.command and request.command.startswith("tail"):
-            is_allowed = True
-            break
-            
-    if not is_allowed:
+async def fetch_logs(request: CommandRequest, db: Session = Depends(get_db)):
+    """
+    读取允许的日志文件
+    - source：解析为结构化记录，按级别/文本/时间过滤，从新到旧分页（cursor 继续向前翻页，after 获取新增记录）
+    - file：按游标增量读取原始内容
+    - command：兼容旧接口，只接受 tail -n N <允许的文件>
+    """
+    if request.source is not None:
+        if request.source not in LOG_SOURCES:
+            raise HTTPException(status_code=400, detail=f"未知的日志源: {request.source}")
+        path = LOG_SOURCES[request.source]["path"]
+        try:
+            log_filter = LogFilter.from_params(request.level, request.q, request.since, request.until)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        server_id, conn = await _log_server_connection(request.server_id, db)
+        try:
+            if request.after:
+                query_result = await ssh_manager.run_blocking(
+                    _query_new_records, conn, request.source, path, log_filter, request.after, request.limit
+                )
+            else:
+                query_result = await ssh_manager.run_blocking(
+                    query_log_records, conn, request.source, path, log_filter, request.cursor, request.limit
+                )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not query_result.get("success"):
+            return {"success": False, "error": query_result.get("error") or "读取日志失败", "records": [],
+                    "source": request.source, "server_id": server_id}
+        return {
+            "success": True,
+            "source": request.source,
+            "server_id": server_id,
+            "log_file": path,
+            "records": query_result["records"],
+            "next_cursor": query_result.get("next_cursor"),
+            "tail_cursor": query_result.get("tail_cursor"),
+            "has_more": query_result.get("has_more", False),
+            "reset": query_result["reset"],
+            "reason": query_result["reason"],
+            "missing": query_result["missing"],
+        }
+
+    if request.file is not None:
+        # 按游标增量读取允许的日志文件（首次请求 cursor 为空）
+        if request.file not in LOG_ALLOWED_FILES:
+            return {"success": False, "error": "Command not allowed or file not permitted"}
+        server_id, conn = await _log_server_connection(request.server_id, db)
+        try:
+            range_result = await ssh_manager.run_blocking(read_log_range, conn, request.file, request.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return _log_range_response(range_result, log_file=request.file, server_id=server_id)
+
+    # 旧接口：只接受对允许文件的 tail 命令，不执行任意命令
+    match = _TAIL_COMMAND.match((request.command or "").strip())
+    if not match or match.group(2) not in LOG_ALLOWED_FILES:
         return {"success": False, "error": "Command not allowed or file not permitted"}
-        
-    return mcp.ssh_exec(request.command)
+    lines = min(int(match.group(1) or 10), 5000)
+    server_id, conn = await _log_server_connection(request.server_id, db)
+    exec_result = await conn.aexecute_command(f"tail -n {lines} -- {shlex.quote(match.group(2))}", compress=True)
+    return {
+        "success": exec_result.get("success", False),
+        "output": exec_result.get("stdout", ""),
+        "error": exec_result.get("error") or exec_result.get("stderr") or None,
+        "server_id": server_id,
+    }
 
 @app.get("/api/health/postgresql")
 async def health_check_postgresql():
@@ -840,107 +1451,24 @@ async def health_check_postgresql():
     except Exception as e:
         return {"status": "error", "service": "postgresql", "message": str(e)}
 
-# 解析启动脚本，提取服务和依赖
-def parse_start_script(script_content: str) -> Dict[str, Any]:
-    """
-    解析启动脚本，提取服务和依赖信息
-    返回格式：
-    {
-        "services": [
-            {"name": "PostgreSQL", "type": "dependency", "start_command": "...", "stop_command": "...", "check_command": "..."},
-            {"name": "Backend", "type": "service", "start_command": "...", "stop_command": "...", "check_command": "..."}
-        ],
-        "dependencies": [...]
-    }
-    """
-    services = []
-    dependencies = []
-    
-    # 解析函数定义
-    function_pattern = r'^(\w+)\(\)\s*\{'
-    functions = {}
-    current_function = None
-    current_content = []
-    
-    lines = script_content.split('\n')
-    for i, line in enumerate(lines):
-        func_match = re.match(function_pattern, line.strip())
-        if func_match:
-            if current_function:
-                functions[current_function] = '\n'.join(current_content)
-            current_function = func_match.group(1)
-            current_content = []
-        elif current_function:
-            current_content.append(line)
-    
-    if current_function:
-        functions[current_function] = '\n'.join(current_content)
-    
-    # 识别服务和依赖
-    service_keywords = {
-        'postgresql': {'name': 'PostgreSQL', 'type': 'dependency'},
-        'backend': {'name': 'Backend', 'type': 'service'},
-        'frontend': {'name': 'Frontend', 'type': 'service'},
-        'nginx': {'name': 'Nginx', 'type': 'service'},
-        'judge': {'name': 'Judge Server', 'type': 'service'},
-        'heartbeat': {'name': 'Heartbeat Monitor', 'type': 'service'},
-        'scratch': {'name': 'Scratch Runner', 'type': 'service'},
-    }
-    
-    for func_name, func_content in functions.items():
-        func_lower = func_name.lower()
-        for keyword, info in service_keywords.items():
-            if keyword in func_lower:
-                # 提取启动命令
-                start_patterns = [
-                    r'(nohup\s+[^\n&]+)',
-                    r'(python3\s+[^\n&]+)',
-                    r'(npm\s+run\s+[^\n&]+)',
-                    r'(service\s+\w+\s+start)',
-                    r'(sudo\s+service\s+\w+\s+start)',
-                ]
-                
-                start_command = None
-                for pattern in start_patterns:
-                    match = re.search(pattern, func_content, re.MULTILINE)
-                    if match:
-                        start_command = match.group(1).strip()
-                        break
-                
-                # 提取检查命令
-                check_patterns = [
-                    r'(pg_isready[^\n]+)',
-                    r'(curl\s+[^\n]+)',
-                    r'(ps\s+aux\s+\|\s+grep[^\n]+)',
-                    r'(check_port\s+\d+)',
-                ]
-                
-                check_command = None
-                for pattern in check_patterns:
-                    match = re.search(pattern, func_content, re.MULTILINE)
-                    if match:
-                        check_command = match.group(1).strip()
-                        break
-                
-                service_info = {
-                    "name": info['name'],
-                    "type": info['type'],
-                    "function_name": func_name,
-                    "start_command": start_command,
-                    "check_command": check_command,
-                }
-                
-                if info['type'] == 'dependency':
-                    dependencies.append(service_info)
-                else:
-                    services.append(service_info)
-                break
-    
-    return {
-        "services": services,
-        "dependencies": dependencies,
-        "functions": list(functions.keys())
-    }
+def _script_check_overrides(server_id: str, script_path: Optional[str], service_names: List[str]) -> Dict[str, str]:
+    """从已缓存的启动脚本解析结果中取出服务的检查命令（服务名称 -> 检查命令）"""
+    parsed = start_script_cache.peek(server_id, script_path)
+    overrides = {}
+    for service_name in service_names:
+        service = find_script_service(parsed, service_name)
+        command = script_check_command(service) if service else None
+        if command:
+            overrides[service_name] = command
+    return overrides
+
+async def _script_start_command(conn, server_id: str, script_path: Optional[str], service_name: str) -> Optional[str]:
+    """从启动脚本解析结果中查找服务的启动命令，脚本未变化时复用缓存"""
+    if not script_path:
+        return None
+    load_result = await ssh_manager.run_blocking(start_script_cache.load, conn, server_id, script_path)
+    service = find_script_service(load_result["parsed"], service_name)
+    return service["start_command"] if service else None
 
 @app.post("/api/servers/{server_id}/parse-script")
 async def parse_script(server_id: str, request: Optional[ParseScriptRequest] = None, db: Session = Depends(get_db)):
@@ -967,41 +1495,27 @@ async def parse_script(server_id: str, request: Optional[ParseScriptRequest] = N
         
         project_path = server_config.get("project_path", "")
         
-        # 连接SSH并读取脚本内容
-        password = server_config.get("password") if server_config.get("auth_type") == "password" else None
-        private_key_path = server_config.get("private_key_path") if server_config.get("auth_type") == "key" else None
-        private_key_content = server_config.get("private_key_content") if server_config.get("auth_type") == "key" else None
-        
-        result = ssh_manager.connect(
-            host=server_config.get("host"),
-            user=server_config.get("user"),
-            port=server_config.get("port", 22),
-            password=password,
-            private_key_path=private_key_path,
-            private_key_content=private_key_content,
-            timeout=10
-        )
+        # 从连接池取出SSH连接并读取脚本内容
+        result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
         
         if not result.get("success"):
             raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+        conn = result["connection"]
         
-        # 读取脚本内容
-        read_command = f"cat '{script_path}' 2>/dev/null || echo 'SCRIPT_NOT_FOUND'"
-        exec_result = ssh_manager.execute_command(read_command)
-        ssh_manager.close()
+        # 读取并解析脚本（脚本未变化时只做一次 stat，复用缓存的解析结果）
+        load_result = await ssh_manager.run_blocking(start_script_cache.load, conn, server_id, script_path)
         
-        if not exec_result.get("success") or "SCRIPT_NOT_FOUND" in exec_result.get("stdout", ""):
+        if load_result["missing"]:
             raise HTTPException(status_code=404, detail=f"启动脚本不存在: {script_path}")
-        
-        script_content = exec_result.get("stdout", "")
-        
-        # 解析脚本
-        parsed = parse_start_script(script_content)
+        if not load_result["success"]:
+            raise HTTPException(status_code=500, detail=f"读取启动脚本失败: {load_result['error']}")
         
         return {
             "success": True,
             "script_path": script_path,
-            "parsed": parsed
+            "parsed": load_result["parsed"],
+            "sha256": load_result["sha256"],
+            "cached": load_result["cached"]
         }
         
     except HTTPException:
@@ -1013,10 +1527,33 @@ async def parse_script(server_id: str, request: Optional[ParseScriptRequest] = N
         print(f"Traceback: {error_trace}")
         raise HTTPException(status_code=500, detail=f"解析启动脚本失败: {str(e)}")
 
+@app.get("/api/services/registry")
+async def list_service_registry():
+    """服务注册表：当前生效的服务定义（按匹配顺序）"""
+    return {"success": True, "services": service_registry.list()}
+
+@app.put("/api/services/registry/{service_key}")
+async def save_service_definition(service_key: str, request: ServiceDefinitionRequest, db: Session = Depends(get_db)):
+    """新增或修改服务定义，保存后立即生效"""
+    try:
+        service = await ssh_manager.run_blocking(service_registry.save, db, service_key, request.model_dump())
+        return {"success": True, "service": service}
+    except Exception as e:
+        print(f"Error saving service definition: {e}")
+        raise HTTPException(status_code=500, detail=f"保存服务定义失败: {str(e)}")
+
+@app.delete("/api/services/registry/{service_key}")
+async def delete_service_definition(service_key: str, db: Session = Depends(get_db)):
+    """删除服务定义"""
+    if not await ssh_manager.run_blocking(service_registry.delete, db, service_key):
+        raise HTTPException(status_code=404, detail=f"服务定义 {service_key} 不存在")
+    return {"success": True}
+
 @app.post("/api/servers/{server_id}/service-operation")
-async def service_operation_endpoint(server_id: str, request: ServiceOperationRequest, db: Session = Depends(get_db)):
+async def service_operation_endpoint(server_id: str, request: ServiceOperationRequest, fresh: bool = False, db: Session = Depends(get_db)):
     """
     对指定服务器的服务执行操作（启动、停止、重启、状态检查）
+    状态检查默认返回后台轮询的快照，fresh=1 时强制实时检查
     """
     try:
         servers_result = mcp.list_servers(db=db)
@@ -1025,199 +1562,79 @@ async def service_operation_endpoint(server_id: str, request: ServiceOperationRe
         if server_id not in servers:
             raise HTTPException(status_code=404, detail=f"服务器 {server_id} 不存在")
         
+        service_key, _ = resolve_status_check(request.service_name)
+        if request.operation.lower() == "status" and not fresh and service_key:
+            snapshot = status_poller.get(server_id)
+            cached = snapshot["services"].get(service_key) if snapshot else None
+            if cached:
+                return {
+                    "success": cached["success"],
+                    "operation": "status",
+                    "service_name": request.service_name,
+                    "status": cached["status"],
+                    "output": cached["output"],
+                    "error": None,
+                    "pids": cached.get("pids", []),
+                    "ports": cached.get("ports", []),
+                    "containers": cached.get("containers", []),
+                    "cached": True,
+                    "age_seconds": snapshot["age_seconds"],
+                    "stale": snapshot["stale"]
+                }
+        
         server_config = servers[server_id]
         project_path = server_config.get("project_path", "")
+        script_path = request.script_path or server_config.get("start_script")
         
-        # 连接SSH
-        password = server_config.get("password") if server_config.get("auth_type") == "password" else None
-        private_key_path = server_config.get("private_key_path") if server_config.get("auth_type") == "key" else None
-        private_key_content = server_config.get("private_key_content") if server_config.get("auth_type") == "key" else None
-        
-        result = ssh_manager.connect(
-            host=server_config.get("host"),
-            user=server_config.get("user"),
-            port=server_config.get("port", 22),
-            password=password,
-            private_key_path=private_key_path,
-            private_key_content=private_key_content,
-            timeout=10
-        )
+        # 从连接池取出SSH连接
+        result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
         
         if not result.get("success"):
             raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+        conn = result["connection"]
         
         # 根据操作类型执行相应命令
         operation = request.operation.lower()
         service_name = request.service_name
         
-        # 构建命令（根据服务名称和操作类型）
-        command = None
-        
         if operation == "status":
-            # 健康检查 - 根据服务名称匹配检查命令
-            service_lower = service_name.lower()
-            if "postgresql" in service_lower or "postgres" in service_lower:
-                command = "pg_isready -h localhost -p 5432"
-            elif "backend" in service_lower or "django" in service_lower:
-                # 只匹配Django Backend (8086端口)，排除Opsdashboard的main.py
-                command = "ps aux | grep -E 'python.*manage.py runserver.*8086' | grep -v grep || echo 'NOT_RUNNING'"
-            elif "nginx" in service_lower:
-                command = "systemctl status nginx 2>&1 | head -3 || service nginx status 2>&1 | head -3"
-            elif "dramatiq" in service_lower or ("worker" in service_lower and "dramatiq" in service_lower):
-                command = "ps aux | grep -E 'start_dramatiq_worker\\.py|manage\\.py rundramatiq|dramatiq.*judge\\.tasks' | grep -v grep || echo 'NOT_RUNNING'"
-            elif "heartbeat" in service_lower:
-                command = "ps aux | grep -E 'heartbeat_metaseek_judge\\.py' | grep -v grep || echo 'NOT_RUNNING'"
-            elif "scratch.*editor" in service_lower or ("scratch" in service_lower and "editor" in service_lower):
-                command = "ps aux | grep -E 'scratch.*8601|webpack.*8601|start-editor\\.sh' | grep -v grep || echo 'NOT_RUNNING'"
-            elif "scratch.*runner" in service_lower or ("scratch" in service_lower and "runner" in service_lower):
-                # 优先使用端口检查（更可靠），然后检查进程（必须匹配3002端口或scratch-runner）
-                # 使用明确的输出格式，确保NOT_RUNNING能正确输出
-                # 注意：需要检查进程输出是否为空，不能仅依赖退出码
-                command = "if lsof -i:3002 >/dev/null 2>&1; then echo 'RUNNING'; elif [ -n \"$(ps aux | grep -E 'node.*server\\.js.*3002|scratch-runner.*3002|PORT=3002' | grep -v grep | grep -v cursor | head -1)\" ]; then echo 'RUNNING'; else echo 'NOT_RUNNING'; fi"
-            elif "judge" in service_lower and "server" in service_lower:
-                command = "docker ps | grep -E 'judge|metaseek-judge' || echo 'NOT_RUNNING'"
-            elif "vue" in service_lower and "frontend" in service_lower:
-                command = "ps aux | grep -E 'vue|webpack.*8081' | grep -v grep || echo 'NOT_RUNNING'"
-            elif "react" in service_lower or ("classroom" in service_lower and "8080" in service_lower):
-                command = "ps aux | grep -E 'vite.*8080|npm run dev.*--port 8080' | grep -v grep || echo 'NOT_RUNNING'"
-            elif "frontend" in service_lower or "vite" in service_lower:
-                command = "ps aux | grep -E 'vite|npm.*dev' | grep -v grep || echo 'NOT_RUNNING'"
-            else:
-                # 通用检查：使用服务名称的关键词
-                keywords = []
-                if "dramatiq" in service_lower or "worker" in service_lower:
-                    keywords.append("start_dramatiq_worker")
-                if "heartbeat" in service_lower:
-                    keywords.append("heartbeat_metaseek_judge")
-                if "scratch" in service_lower:
-                    if "editor" in service_lower:
-                        keywords.append("scratch.*8601|start-editor")
-                    elif "runner" in service_lower:
-                        keywords.append("scratch-runner|node.*server\\.js.*3002")
-                    else:
-                        keywords.append("scratch")
-                if keywords:
-                    pattern = "|".join(keywords)
-                    command = f"ps aux | grep -E '{pattern}' | grep -v grep || echo 'NOT_RUNNING'"
-                else:
-                    command = f"ps aux | grep -i '{service_name}' | grep -v grep || echo 'NOT_RUNNING'"
-        
-        elif operation == "start":
-            # 启动服务
-            service_lower = service_name.lower()
-            if "postgresql" in service_lower or "postgres" in service_lower:
-                # 使用sudo -S从标准输入读取密码（非交互式）
-                command = "echo '123456' | sudo -S service postgresql start 2>/dev/null || (echo '123456' | sudo -S -u postgres /usr/lib/postgresql/12/bin/pg_ctl -D /var/lib/postgresql/12/main start 2>/dev/null || sudo service postgresql start || sudo -u postgres /usr/lib/postgresql/12/bin/pg_ctl -D /var/lib/postgresql/12/main start)"
-            elif "backend" in service_lower or "django" in service_lower:
-                # Django Backend (端口8086)
-                command = f"cd {project_path}/OnlineJudge && nohup python manage.py runserver 0.0.0.0:8086 >> /tmp/django.log 2>&1 &"
-            elif "dramatiq" in service_lower or ("worker" in service_lower and "dramatiq" in service_lower):
-                # Dramatiq Worker
-                command = f"cd {project_path}/OnlineJudge && nohup python start_dramatiq_worker.py >> /tmp/dramatiq.log 2>&1 &"
-            elif "heartbeat" in service_lower:
-                # Heartbeat Monitor
-                command = f"cd {project_path}/OnlineJudge && TOKEN=$(python -c \"import os,django;os.environ.setdefault('DJANGO_SETTINGS_MODULE','oj.settings');django.setup();from options.options import SysOptions;print(SysOptions.judge_server_token)\") && nohup python heartbeat_metaseek_judge.py >> /tmp/heartbeat.log 2>&1 &"
-            elif "vue" in service_lower and "frontend" in service_lower:
-                # Vue Frontend (端口8081)
-                command = f"cd {project_path}/OnlineJudgeFE-Vue && VUE_PORT=8081 nohup npm run dev >> /tmp/vue.log 2>&1 &"
-            elif "react" in service_lower or ("classroom" in service_lower and "8080" in service_lower):
-                # React Classroom (端口8080)
-                command = f"cd {project_path}/OnlineJudgeFE-React && nohup npm run dev -- --host 0.0.0.0 --port 8080 >> /tmp/react_classroom.log 2>&1 &"
-            elif "scratch" in service_lower and "editor" in service_lower:
-                # Scratch Editor (端口8601)
-                command = f"cd {project_path}/scratch-editor && PORT=8601 nohup ./start-editor.sh >> /tmp/scratch_editor.log 2>&1 &"
-            elif "scratch" in service_lower and "runner" in service_lower:
-                # Scratch Runner (端口3002)
-                command = f"cd {project_path}/scratch-runner && PORT=3002 nohup node server.js >> logs/scratch-runner.log 2>&1 &"
-            elif "judge" in service_lower and "server" in service_lower:
-                # Judge Server (Docker)
-                command = "docker start metaseek-judge-dev 2>/dev/null || (docker run -d --name metaseek-judge-dev -p 12360:12360 metaseek-judge:dev 2>&1 || echo 'DOCKER_NOT_FOUND')"
-            elif "nginx" in service_lower:
-                # 使用sudo -S从标准输入读取密码（非交互式）
-                command = "echo '123456' | sudo -S service nginx start 2>/dev/null || sudo service nginx start"
-            elif "frontend" in service_lower or "vite" in service_lower:
-                command = f"cd {project_path}/frontend && nohup npm run dev > /tmp/frontend.log 2>&1 &"
-            else:
-                # 尝试从启动脚本中查找对应的启动函数
-                command = f"cd {project_path} && bash -c 'source start.sh && {service_lower}_start()' 2>&1 || echo 'SERVICE_NOT_FOUND'"
+            # 健康检查 - 从进程表快照判断服务状态
+            # 未知服务优先使用启动脚本中解析出的检查命令（只用已缓存的解析结果，不额外读取脚本），否则按名称匹配
+            check_overrides = _script_check_overrides(server_id, script_path, [service_name])
+            probe_result = await ssh_manager.run_blocking(
+                probe_services, conn, project_path, [service_name], check_overrides=check_overrides
+            )
+            service = probe_result["services"][service_name]
+            status_poller.update_services(server_id, probe_result["services"])
+            return {
+                "success": service["success"],
+                "operation": operation,
+                "service_name": service_name,
+                "status": service["status"],
+                "output": service["output"],
+                "error": service["error"],
+                "pids": service.get("pids", []),
+                "ports": service.get("ports", []),
+                "containers": service.get("containers", []),
+                "cached": False,
+                "age_seconds": 0,
+                "stale": False
+            }
         
-        elif operation == "stop":
-            # 停止服务
-            service_lower = service_name.lower()
-            if "postgresql" in service_lower or "postgres" in service_lower:
-                # 使用sudo -S从标准输入读取密码（非交互式）
-                command = "echo '123456' | sudo -S service postgresql stop 2>/dev/null || sudo service postgresql stop"
-            elif "backend" in service_lower or "django" in service_lower:
-                # Django Backend (端口8086)
-                command = "pkill -f 'python.*manage.py runserver.*8086'"
-            elif "dramatiq" in service_lower or ("worker" in service_lower and "dramatiq" in service_lower):
-                # Dramatiq Worker
-                command = "pkill -f 'start_dramatiq_worker\\.py|manage\\.py rundramatiq|dramatiq.*judge\\.tasks'"
-            elif "heartbeat" in service_lower:
-                # Heartbeat Monitor
-                command = "pkill -f 'heartbeat_metaseek_judge\\.py'"
-            elif "vue" in service_lower and "frontend" in service_lower:
-                # Vue Frontend (端口8081)
-                command = "pkill -f 'vue|webpack.*8081'"
-            elif "react" in service_lower or ("classroom" in service_lower and "8080" in service_lower):
-                # React Classroom (端口8080)
-                command = "pkill -f 'vite.*8080|npm run dev.*--port 8080'"
-            elif "scratch" in service_lower and "editor" in service_lower:
-                # Scratch Editor (端口8601)
-                command = "pkill -f 'scratch.*8601|webpack.*8601'"
-            elif "scratch" in service_lower and "runner" in service_lower:
-                # Scratch Runner (端口3002)
-                command = "pkill -f 'scratch-runner|node.*server\\.js.*3002'"
-            elif "judge" in service_lower and "server" in service_lower:
-                # Judge Server (Docker)
-                command = "docker stop metaseek-judge-dev 2>/dev/null || echo 'DOCKER_NOT_FOUND'"
-            elif "nginx" in service_lower:
-                # 使用sudo -S从标准输入读取密码（非交互式）
-                command = "echo '123456' | sudo -S service nginx stop 2>/dev/null || sudo service nginx stop"
-            elif "judge" in service_lower:
-                command = "pkill -f 'dramatiq|judge'"
-            elif "frontend" in service_lower or "vite" in service_lower:
-                command = "pkill -f 'vite|npm.*dev'"
-            else:
-                command = f"pkill -f -i '{service_name}'"
-        
-        elif operation == "restart":
-            # 重启服务（先停止再启动）
-            service_lower = service_name.lower()
-            if "postgresql" in service_lower or "postgres" in service_lower:
-                # 使用sudo -S从标准输入读取密码（非交互式）
-                command = "echo '123456' | sudo -S service postgresql restart 2>/dev/null || sudo service postgresql restart"
-            elif "backend" in service_lower or "django" in service_lower:
-                # Django Backend (端口8086)
-                command = f"pkill -f 'python.*manage.py runserver.*8086'; sleep 1; cd {project_path}/OnlineJudge && nohup python manage.py runserver 0.0.0.0:8086 >> /tmp/django.log 2>&1 &"
-            elif "dramatiq" in service_lower or ("worker" in service_lower and "dramatiq" in service_lower):
-                # Dramatiq Worker
-                command = f"pkill -f 'start_dramatiq_worker\\.py|manage\\.py rundramatiq|dramatiq.*judge\\.tasks'; sleep 1; cd {project_path}/OnlineJudge && nohup python start_dramatiq_worker.py >> /tmp/dramatiq.log 2>&1 &"
-            elif "heartbeat" in service_lower:
-                # Heartbeat Monitor
-                command = f"pkill -f 'heartbeat_metaseek_judge\\.py'; sleep 1; cd {project_path}/OnlineJudge && TOKEN=$(python -c \"import os,django;os.environ.setdefault('DJANGO_SETTINGS_MODULE','oj.settings');django.setup();from options.options import SysOptions;print(SysOptions.judge_server_token)\") && nohup python heartbeat_metaseek_judge.py >> /tmp/heartbeat.log 2>&1 &"
-            elif "vue" in service_lower and "frontend" in service_lower:
-                # Vue Frontend (端口8081)
-                command = f"pkill -f 'vue|webpack.*8081'; sleep 1; cd {project_path}/OnlineJudgeFE-Vue && VUE_PORT=8081 nohup npm run dev >> /tmp/vue.log 2>&1 &"
-            elif "react" in service_lower or ("classroom" in service_lower and "8080" in service_lower):
-                # React Classroom (端口8080)
-                command = f"pkill -f 'vite.*8080|npm run dev.*--port 8080'; sleep 1; cd {project_path}/OnlineJudgeFE-React && nohup npm run dev -- --host 0.0.0.0 --port 8080 >> /tmp/react_classroom.log 2>&1 &"
-            elif "scratch" in service_lower and "editor" in service_lower:
-                # Scratch Editor (端口8601)
-                command = f"pkill -f 'scratch.*8601|webpack.*8601'; sleep 1; cd {project_path}/scratch-editor && PORT=8601 nohup ./start-editor.sh >> /tmp/scratch_editor.log 2>&1 &"
-            elif "scratch" in service_lower and "runner" in service_lower:
-                # Scratch Runner (端口3002)
-                command = f"pkill -f 'scratch-runner|node.*server\\.js.*3002'; sleep 1; cd {project_path}/scratch-runner && PORT=3002 nohup node server.js >> logs/scratch-runner.log 2>&1 &"
-            elif "judge" in service_lower and "server" in service_lower:
-                # Judge Server (Docker)
-                command = "docker stop metaseek-judge-dev 2>/dev/null; sleep 1; docker start metaseek-judge-dev 2>/dev/null || (docker run -d --name metaseek-judge-dev -p 12360:12360 metaseek-judge:dev 2>&1 || echo 'DOCKER_NOT_FOUND')"
-            elif "nginx" in service_lower:
-                # 使用sudo -S从标准输入读取密码（非交互式）
-                command = "echo '123456' | sudo -S service nginx restart 2>/dev/null || sudo service nginx restart"
-            elif "judge" in service_lower:
-                command = f"pkill -f 'dramatiq|judge'; sleep 1; cd {project_path} && nohup python3 -m dramatiq judge 2>&1 &"
-            elif "frontend" in service_lower or "vite" in service_lower:
-                command = f"pkill -f 'vite|npm.*dev'; sleep 1; cd {project_path}/frontend && nohup npm run dev > /tmp/frontend.log 2>&1 &"
+        # 构建命令：按服务注册表匹配服务名称，未匹配的服务使用启动脚本中的命令或按名称处理
+        registered, command = service_registry.command(service_name, operation, project_path)
+        
+        if operation == "start" and not registered:
+            # 使用启动脚本中解析出的启动命令
+            command = await _script_start_command(conn, server_id, script_path, service_name)
+            if not command:
+                command = f"cd {project_path} && bash -c 'source start.sh && {service_name.lower()}_start()' 2>&1 || echo 'SERVICE_NOT_FOUND'"
+        elif operation == "stop" and not registered:
+            command = f"pkill -f -i '{service_name}'"
+        elif operation == "restart" and not registered:
+            start_command = await _script_start_command(conn, server_id, script_path, service_name)
+            if start_command:
+                command = f"pkill -f -i '{service_name}'; sleep 2; {start_command}"
             else:
                 command = f"pkill -f -i '{service_name}'; sleep 2; cd {project_path} && bash start.sh"
         
@@ -1227,117 +1644,19 @@ async def service_operation_endpoint(server_id: str, request: ServiceOperationRe
         # 执行命令
         # 清理环境变量，避免npmrc等配置干扰
         clean_command = f"cd {project_path} && unset NPM_CONFIG_PREFIX NPM_CONFIG_GLOBALCONFIG 2>/dev/null; {command}"
-        exec_result = ssh_manager.execute_command(clean_command)
-        ssh_manager.close()
+        exec_result = await conn.aexecute_command(clean_command)
         
         # 解析结果
         stdout = exec_result.get("stdout", "")
         stderr = exec_result.get("stderr", "")
         success = exec_result.get("success", False)
         
-        # 合并stdout和stderr进行检查（某些命令可能将输出写入stderr）
-        combined_output = (stdout + " " + stderr).strip()
-        
         # 判断服务状态
         status = "unknown"
-        if operation == "status":
-            # 检查命令输出
-            output_lower = combined_output.lower()
-            exit_status = exec_result.get("exit_status", -1)
-            
-            # 关键判断：如果明确包含NOT_RUNNING，说明服务未运行（检查stdout和stderr）
-            if "NOT_RUNNING" in stdout or "NOT_RUNNING" in stderr:
-                status = "stopped"
-            # 对于pg_isready等特殊命令
-            elif "postgresql" in service_name.lower() or "postgres" in service_name.lower():
-                if "accepting connections" in output_lower or exit_status == 0:
-                    status = "running"
-                else:
-                    status = "stopped"
-            # 对于systemctl status命令
-            elif "systemctl" in command or "service" in command:
-                if "running" in output_lower or "active" in output_lower:
-                    status = "running"
-                elif "stopped" in output_lower or "inactive" in output_lower:
-                    status = "stopped"
-                else:
-                    status = "stopped"
-            # 对于lsof端口检查命令（最可靠的方式）
-            elif "lsof -i:" in command or ("lsof" in command and "-i:" in command):
-                # 关键：优先检查NOT_RUNNING（检查stdout和stderr）
-                if "NOT_RUNNING" in stdout or "NOT_RUNNING" in stderr:
-                    status = "stopped"
-                # 检查是否有RUNNING标记（新的检查命令格式）
-                elif "RUNNING" in stdout or "RUNNING" in stderr:
-                    status = "running"
-                # lsof命令成功（exit_status == 0）说明端口在监听，服务在运行
-                elif exit_status == 0:
-                    # 进一步验证：确保不是空输出
-                    if stdout.strip():
-                        status = "running"
-                    else:
-                        status = "stopped"
-                else:
-                    # lsof失败，检查是否有进程检查的fallback
-                    if "ps aux" in command or "grep" in command:
-                        # 如果fallback检查有输出且不是NOT_RUNNING，进一步验证
-                        if (stdout.strip() or stderr.strip()) and "NOT_RUNNING" not in combined_output:
-                            # 验证输出是否包含相关关键词（避免误判）
-                            if any(keyword in combined_output for keyword in ["node", "server.js", "scratch", "3002"]):
-                                status = "running"
-                            else:
-                                status = "stopped"
-                        else:
-                            # 输出为空或包含NOT_RUNNING，认为未运行
-                            status = "stopped"
-                    else:
-                        status = "stopped"
-            # 对于ps aux | grep命令（最常见的检查方式）
-            elif "ps aux" in command or ("grep" in command and "ps" in command):
-                # 关键：如果明确包含NOT_RUNNING，说明服务未运行（检查stdout和stderr）
-                if "NOT_RUNNING" in stdout or "NOT_RUNNING" in stderr:
-                    status = "stopped"
-                # 如果命令执行成功（exit_status == 0）且有输出，说明找到了进程
-                elif exit_status == 0 and (stdout.strip() or stderr.strip()):
-                    # 使用combined_output进行检查
-                    # 检查输出是否包含进程信息关键词（更严格的验证）
-                    process_keywords = ["python", "node", "npm", "vite", "webpack", "docker", "postgres", "bash", "sh"]
-                    # 对于Django Backend，必须包含manage.py和8086
-                    if "backend" in service_lower or "django" in service_lower:
-                        if "manage.py" in combined_output and "8086" in combined_output:
-                            status = "running"
-                        else:
-                            status = "stopped"
-                    # 对于其他服务，检查关键词
-                    elif any(keyword in combined_output for keyword in process_keywords):
-                        status = "running"
-                    else:
-                        # 有输出但不包含关键词，认为未运行
-                        status = "stopped"
-                # 如果命令执行失败或输出为空，说明没找到进程
-                elif exit_status != 0 or not (stdout.strip() or stderr.strip()):
-                    status = "stopped"
-                else:
-                    # 其他情况，默认认为未运行（更保守）
-                    status = "stopped"
-            # 对于docker ps命令
-            elif "docker ps" in command:
-                if stdout.strip() and "CONTAINER" in stdout:
-                    status = "running"
-                else:
-                    status = "stopped"
-            # 默认判断：根据退出状态和输出
-            else:
-                if exit_status == 0:
-                    if "running" in output_lower or "active" in output_lower:
-                        status = "running"
-                    elif stdout.strip() and "NOT_RUNNING" not in stdout:
-                        status = "running"
-                    else:
-                        status = "stopped"
-                else:
-                    status = "stopped"
-        elif operation in ["start", "stop", "restart"]:
+        if operation in ["start", "stop", "restart"]:
+            # 服务状态已变化，快照中的旧状态作废
+            if service_key:
+                status_poller.invalidate_service(server_id, service_key)
             if success:
                 status = "running" if operation in ["start", "restart"] else "stopped"
             else:
@@ -1361,6 +1680,112 @@ async def service_operation_endpoint(server_id: str, request: ServiceOperationRe
         print(f"Traceback: {error_trace}")
         raise HTTPException(status_code=500, detail=f"执行服务操作失败: {str(e)}")
 
+@app.get("/api/servers/{server_id}/access-stats")
+async def get_access_stats(server_id: str, window: Optional[int] = None, top: int = 10, db: Session = Depends(get_db)):
+    """
+    nginx 访问日志统计：请求速率、状态码分布、访问最多/最慢的路径、request_time 分位数
+    每次请求只增量读取 access.log 新增的内容，window 为统计的分钟数
+    """
+    if window is not None and window <= 0:
+        raise HTTPException(status_code=400, detail="window 必须大于 0")
+    if top <= 0 or top > 100:
+        raise HTTPException(status_code=400, detail="top 必须在 1 到 100 之间")
+    servers = mcp.list_servers(db=db).get("servers", {})
+    if server_id not in servers:
+        raise HTTPException(status_code=404, detail=f"服务器 {server_id} 不存在")
+    return await access_stats.server_stats(servers[server_id], window, top)
+
+@app.get("/api/fleet/access-stats")
+async def get_fleet_access_stats(window: Optional[int] = None, top: int = 10, db: Session = Depends(get_db)):
+    """所有服务器合并后的 nginx 访问日志统计，以及每台服务器的概况"""
+    if window is not None and window <= 0:
+        raise HTTPException(status_code=400, detail="window 必须大于 0")
+    if top <= 0 or top > 100:
+        raise HTTPException(status_code=400, detail="top 必须在 1 到 100 之间")
+    servers = list(mcp.list_servers(db=db).get("servers", {}).values())
+    return await access_stats.fleet_stats(servers, window, top)
+
+@app.post("/api/servers/{server_id}/services/status")
+async def bulk_service_status(server_id: str, request: BulkServiceStatusRequest, fresh: bool = False, db: Session = Depends(get_db)):
+    """
+    批量检查指定服务器上多个服务的状态
+    所有服务在同一个SSH连接上通过一次批量执行完成检查；默认优先使用后台轮询的快照，fresh=1 时全部实时检查
+    """
+    try:
+        servers_result = mcp.list_servers(db=db)
+        servers = servers_result.get("servers", {})
+
+        if server_id not in servers:
+            raise HTTPException(status_code=404, detail=f"服务器 {server_id} 不存在")
+
+        statuses = {}
+        pending = []
+        snapshot = None if fresh else status_poller.get(server_id)
+        for service_name in dict.fromkeys(request.service_names):
+            service_key, _ = resolve_status_check(service_name)
+            cached = snapshot["services"].get(service_key) if snapshot and service_key else None
+            if cached:
+                statuses[service_name] = {
+                    "success": cached["success"],
+                    "service_name": service_name,
+                    "status": cached["status"],
+                    "output": cached["output"],
+                    "error": None,
+                    "pids": cached.get("pids", []),
+                    "ports": cached.get("ports", []),
+                    "containers": cached.get("containers", []),
+                    "cached": True,
+                    "age_seconds": snapshot["age_seconds"],
+                    "stale": snapshot["stale"]
+                }
+            else:
+                pending.append(service_name)
+
+        error = None
+        if pending:
+            server_config = servers[server_id]
+            result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
+            if not result.get("success"):
+                raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+            conn = result["connection"]
+
+            probe_result = await ssh_manager.run_blocking(
+                probe_services, conn, server_config.get("project_path", ""), pending,
+                check_overrides=_script_check_overrides(server_id, server_config.get("start_script"), pending)
+            )
+            error = probe_result.get("error")
+            status_poller.update_services(server_id, probe_result["services"])
+            for service_name, service in probe_result["services"].items():
+                statuses[service_name] = {
+                    "success": service["success"],
+                    "service_name": service_name,
+                    "status": service["status"],
+                    "output": service["output"],
+                    "error": service["error"],
+                    "pids": service.get("pids", []),
+                    "ports": service.get("ports", []),
+                    "containers": service.get("containers", []),
+                    "cached": False,
+                    "age_seconds": 0,
+                    "stale": False
+                }
+
+        return {
+            "success": error is None,
+            "server_id": server_id,
+            "services": statuses,
+            "error": error
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        error_trace = traceback.format_exc()
+        print(f"Error checking service status: {e}")
+        print(f"Traceback: {error_trace}")
+        raise HTTPException(status_code=500, detail=f"批量检查服务状态失败: {str(e)}")
+
 # 本地服务操作请求模型
 class LocalServiceStatusRequest(BaseModel):
     service_id: str
@@ -1371,6 +1796,9 @@ class LocalServiceOperationRequest(BaseModel):
     service_id: str
     operation: str  # "start", "stop", "restart"
     command: str
+    # 未在服务注册表中的服务：重启时等待该端口释放，并以端口监听作为就绪探测
+    port: Optional[int] = None
+    ready_timeout: Optional[float] = Field(default=None, gt=0, le=600)
 
 
 def _run_local_shell(cmd: str, timeout: int = 15, fire_and_forget: bool = False):
@@ -1423,36 +1851,42 @@ async def local_service_status(request: LocalServiceStatusRequest):
         check_command = request.check_command
         port = request.port
         
-        status = "stopped"
+        # 受守护的服务直接按记录的进程判断
+        service = service_registry.match(service_id, scope="local")
+        process = local_supervisor.get(service["service_key"]) if service else None
+        if process is not None and process.state != "stopped":
+            return {
+                "success": True,
+                "service_id": service_id,
+                "status": "running" if process.running else "stopped",
+                "supervised": True,
+                "supervisor": process.to_dict(usage=True)
+            }
         
-        # 如果有端口，先检查端口
-        if port:
-            try:
-                result = subprocess.run(
-                    ["ss", "-tlnp"], 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=5
-                )
-                if f":{port} " in result.stdout or f":{port} " in result.stderr:
-                    status = "running"
-                else:
-                    # 尝试使用netstat
-                    result = subprocess.run(
-                        ["netstat", "-tlnp"], 
-                        capture_output=True, 
-                        text=True, 
-                        timeout=5
-                    )
-                    if f":{port} " in result.stdout or f":{port} " in result.stderr:
-                        status = "running"
-            except:
-                pass
-        
-        # 执行检查命令（干净 shell，避免 nvm/.npmrc 干扰）
-        if check_command:
+        status = "stopped"
+        source = "snapshot"
+        pids = []
+        
+        # 端口和进程从共用的 /proc 快照中判断（有效期内所有服务共用一次采集），不再 fork ss / netstat；
+        # 重新采集需要读取所有进程的命令行，在单独的线程中执行（不占用 SSH 连接池的线程）
+        snapshot = await asyncio.to_thread(local_snapshot)
+        if port and port in snapshot.ports:
+            status = "running"
+        
+        # 常见的 ps aux | grep / lsof 检查命令直接在快照上判断，端口已在监听时不再检查
+        native = None
+        if status != "running" and check_command:
+            native = native_check(check_command)
+            if native:
+                result = evaluate_check(native, snapshot)
+                status = "running" if result["running"] else "stopped"
+                pids = result["pids"]
+        
+        # 无法识别的检查命令才执行（干净 shell，避免 nvm/.npmrc 干扰）
+        if status != "running" and check_command and not native:
+            source = "command"
             try:
-                result = _run_local_shell(check_command, timeout=5)
+                result = await ssh_manager.run_blocking(_run_local_shell, check_command, timeout=5)
                 output = (result.stdout or "") + (result.stderr or "")
                 if "NOT_RUNNING" in output or result.returncode != 0:
                     if status != "running":  # 如果端口检查也没通过
@@ -1474,7 +1908,9 @@ async def local_service_status(request: LocalServiceStatusRequest):
         return {
             "success": True,
             "service_id": service_id,
-            "status": status
+            "status": status,
+            "source": source,
+            "pids": pids
         }
         
     except Exception as e:
@@ -1489,97 +1925,101 @@ async def local_service_status(request: LocalServiceStatusRequest):
         }
 
 @app.post("/api/services/local/operation")
-async def local_service_operation(request: LocalServiceOperationRequest):
+async def local_service_operation(request: LocalServiceOperationRequest, background: bool = False):
     """
     执行本地服务操作（启动、停止、重启）
     注意：此API只用于本地8080项目，不影响远程服务器
+    background=1 时提交为后台任务，立即返回任务ID（见 /api/jobs/{job_id}）
+    """
+    # 本地8080项目根目录（固定路径，不影响远程服务器）
+    local_project_root = "/home/sharelgx/MetaSeekOJdev"
+    if not os.path.exists(local_project_root):
+        return {
+            "success": False,
+            "error": f"本地项目路径不存在: {local_project_root}"
+        }
+    if request.operation not in ("start", "stop", "restart"):
+        return {
+            "success": False,
+            "error": f"不支持的操作: {request.operation}"
+        }
+
+    async def work(progress):
+        return await _local_service_operation(request, local_project_root, progress)
+
+    return await _run_or_submit(
+        background, f"local_{request.operation}", "local", f"本地服务 {request.operation}: {request.service_id}",
+        {"service_id": request.service_id, "operation": request.operation}, work
+    )
+
+async def _local_service_operation(request: LocalServiceOperationRequest, local_project_root: str, progress) -> Dict[str, Any]:
+    """
+    执行本地服务操作，本地命令在线程池中执行，不阻塞事件循环
+    注册表中在后台运行的服务由 local_supervisor 启动和守护，停止/重启直接作用于记录的进程组
     """
     try:
         service_id = request.service_id
         operation = request.operation
         command = request.command
         
-        # 本地8080项目根目录（固定路径，不影响远程服务器）
-        local_project_root = "/home/sharelgx/MetaSeekOJdev"
-        if not os.path.exists(local_project_root):
-            return {
-                "success": False,
-                "error": f"本地项目路径不存在: {local_project_root}"
-            }
+        # 根据service_id自动构建命令（与远程服务操作共用服务注册表，但使用本地路径）
+        service = service_registry.match(service_id, scope="local")
+        service_key = service["service_key"] if service else None
         
-        service_lower = service_id.lower()
+        def registry_command(operation: str) -> Optional[str]:
+            return service_registry.command(service_id, operation, local_project_root, scope="local")[1]
         
-        # 根据service_id自动构建命令（类似远程服务操作，但使用本地路径）
-        if operation == "start":
-            # 启动服务：在后台运行
-            if "postgresql" in service_lower or "postgres" in service_lower:
-                # PostgreSQL需要sudo
-                full_command = f"echo '123456' | sudo -S service postgresql start 2>/dev/null || (echo '123456' | sudo -S -u postgres /usr/lib/postgresql/12/bin/pg_ctl -D /var/lib/postgresql/12/main start 2>/dev/null || sudo service postgresql start || sudo -u postgres /usr/lib/postgresql/12/bin/pg_ctl -D /var/lib/postgresql/12/main start)"
-            elif "backend" in service_lower or "django" in service_lower:
-                full_command = f"cd {local_project_root}/OnlineJudge && nohup python manage.py runserver 0.0.0.0:8086 >> /tmp/django.log 2>&1 & disown"
-            elif "dramatiq" in service_lower or ("worker" in service_lower and "dramatiq" in service_lower):
-                full_command = f"cd {local_project_root}/OnlineJudge && nohup python start_dramatiq_worker.py >> /tmp/dramatiq.log 2>&1 & disown"
-            elif "heartbeat" in service_lower:
-                full_command = f"cd {local_project_root}/OnlineJudge && TOKEN=$(python -c \"import os,django;os.environ.setdefault('DJANGO_SETTINGS_MODULE','oj.settings');django.setup();from options.options import SysOptions;print(SysOptions.judge_server_token)\") && nohup python heartbeat_metaseek_judge.py >> /tmp/heartbeat.log 2>&1 & disown"
-            elif "vue" in service_lower and "frontend" in service_lower:
-                full_command = f"cd {local_project_root}/OnlineJudgeFE-Vue && VUE_PORT=8081 nohup npm run dev >> /tmp/vue.log 2>&1 & disown"
-            elif "react" in service_lower or ("classroom" in service_lower and "8080" in service_lower):
-                full_command = f"cd {local_project_root}/OnlineJudgeFE-React && nohup npm run dev -- --host 0.0.0.0 --port 8080 >> /tmp/react_classroom.log 2>&1 & disown"
-            elif "scratch" in service_lower and "editor" in service_lower:
-                full_command = f"cd {local_project_root}/scratch-editor && PORT=8601 nohup ./start-editor.sh >> /tmp/scratch_editor.log 2>&1 & disown"
-            elif "scratch" in service_lower and "runner" in service_lower:
-                full_command = f"cd {local_project_root}/scratch-runner && PORT=3002 nohup node server.js >> logs/scratch-runner.log 2>&1 & disown"
-            elif "judge" in service_lower and "server" in service_lower:
-                # Judge Server (Docker)
-                full_command = "docker start metaseek-judge-dev 2>/dev/null || (docker run -d --name metaseek-judge-dev -p 12360:12360 metaseek-judge:dev 2>&1 || echo 'DOCKER_NOT_FOUND')"
-            else:
-                # 使用传入的命令（兼容旧版本）
-                full_command = command
-            
-            if "nohup" in full_command or "& disown" in full_command:
-                _run_local_shell(full_command, timeout=15, fire_and_forget=True)
-                return {"success": True, "message": f"{service_id} 启动命令已执行"}
-            result = _run_local_shell(full_command, timeout=15)
+        async def run_shell(cmd: str, **kwargs):
+            return await ssh_manager.run_blocking(_run_local_shell, cmd, **kwargs)
+        
+        async def run_probe(probe: str) -> bool:
+            return (await run_shell(probe, timeout=10)).returncode == 0
+        
+        def supervised():
+            process = local_supervisor.get(service_key) if service_key else None
+            return process if process is not None and process.state in ("running", "backoff", "stopping") else None
+        
+        async def start_service(start_cmd: str, registered: bool):
+            """启动服务，返回 (错误信息, 附加信息)"""
+            if registered and start_cmd.rstrip().endswith("&"):
+                # 在后台运行的服务交给守护进程启动，保留进程句柄
+                process = local_supervisor.spawn(
+                    service_key, start_cmd, cwd=local_project_root,
+                    log_file=render(service["log_file"], local_project_root)
+                )
+                return None, {"supervised": True, "pid": process.pid}
+            if start_cmd.rstrip().endswith("&"):
+                # 追加 disown，避免随 shell 退出
+                start_cmd = f"{start_cmd.rstrip()} disown"
+            if "nohup" in start_cmd or "& disown" in start_cmd:
+                await run_shell(start_cmd, timeout=15, fire_and_forget=True)
+                return None, {"supervised": False}
+            result = await run_shell(start_cmd, timeout=15)
             if result.returncode == 0:
-                return {"success": True, "message": f"{service_id} 启动命令已执行"}
-            err = _clean_error_message(
-                (result.stderr or result.stdout or "").strip(), "未知错误"
-            )
-            return {"success": False, "error": f"启动失败: {err}"}
+                return None, {"supervised": False}
+            return _clean_error_message((result.stderr or result.stdout or "").strip(), "未知错误"), {}
+        
+        if operation == "start":
+            # 启动服务：在后台运行；未注册的服务使用传入的命令（兼容旧版本）
+            registered = registry_command("start")
+            await progress(f"启动 {service_id}", 50)
+            error, extra = await start_service(registered or command, bool(registered))
+            if error:
+                return {"success": False, "error": f"启动失败: {error}"}
+            return {"success": True, "message": f"{service_id} 启动命令已执行", **extra}
         
         elif operation == "stop":
-            # 停止服务：直接执行停止命令
-            if "postgresql" in service_lower or "postgres" in service_lower:
-                full_command = "echo '123456' | sudo -S service postgresql stop 2>/dev/null || sudo service postgresql stop"
-            elif "backend" in service_lower or "django" in service_lower:
-                # Django Backend (端口8086)
-                full_command = "pkill -f 'python.*manage.py runserver.*8086'"
-            elif "dramatiq" in service_lower or ("worker" in service_lower and "dramatiq" in service_lower):
-                # Dramatiq Worker
-                full_command = "pkill -f 'start_dramatiq_worker\\.py|manage\\.py rundramatiq|dramatiq.*judge\\.tasks'"
-            elif "heartbeat" in service_lower:
-                # Heartbeat Monitor
-                full_command = "pkill -f 'heartbeat_metaseek_judge\\.py'"
-            elif "vue" in service_lower and "frontend" in service_lower:
-                # Vue Frontend (端口8081)
-                full_command = "pkill -f 'vue|webpack.*8081'"
-            elif "react" in service_lower or ("classroom" in service_lower and "8080" in service_lower):
-                # React Classroom (端口8080) - 本地服务
-                full_command = "pkill -f 'vite.*8080|npm run dev.*--port 8080'"
-            elif "scratch" in service_lower and "editor" in service_lower:
-                # Scratch Editor (端口8601)
-                full_command = "pkill -f 'scratch.*8601|webpack.*8601'"
-            elif "scratch" in service_lower and "runner" in service_lower:
-                # Scratch Runner (端口3002)
-                full_command = "pkill -f 'scratch-runner|node.*server\\.js.*3002'"
-            elif "judge" in service_lower and "server" in service_lower:
-                # Judge Server (Docker)
-                full_command = "docker stop metaseek-judge-dev 2>/dev/null || echo 'DOCKER_NOT_FOUND'"
-            else:
-                # 使用传入的命令（兼容旧版本）
-                full_command = command
+            await progress(f"停止 {service_id}", 50)
+            if supervised():
+                # 受守护的服务：直接停止记录的进程组
+                result = await local_supervisor.terminate(service_key)
+                if result["stopped"]:
+                    return {"success": True, "message": f"{service_id} 已停止", "supervised": True, **result}
+                return {"success": False, "error": f"{service_id} 停止失败（进程组 {result['pid']} 仍在运行）"}
             
-            result = _run_local_shell(full_command, timeout=10)
+            # 停止服务：直接执行停止命令
+            full_command = registry_command("stop") or command
+            result = await run_shell(full_command, timeout=10)
             is_pkill = "pkill" in full_command
             if result.returncode == 0 or (is_pkill and result.returncode == 1):
                 return {"success": True, "message": f"{service_id} 已停止"}
@@ -1590,75 +2030,89 @@ async def local_service_operation(request: LocalServiceOperationRequest):
             )
             return {"success": False, "error": err}
         
-        elif operation == "restart":
-            # 重启服务：先停止再启动
-            import time
+        else:
+            # 重启服务：停止后等待旧进程退出、端口释放，再启动并等待就绪探测通过
+            readiness = service["readiness"] if service else None
+            ports = list(service["ports"]) if service else []
+            if request.port:
+                ports = ports or [request.port]
+                readiness = readiness or {"type": "port", "port": request.port}
+            timings = {"stop_seconds": None, "start_seconds": None, "ready_seconds": None, "total_seconds": None}
+            started = time.monotonic()
             
-            # 停止命令
-            if "postgresql" in service_lower or "postgres" in service_lower:
-                stop_cmd = "echo '123456' | sudo -S service postgresql stop 2>/dev/null || sudo service postgresql stop"
-            elif "backend" in service_lower or "django" in service_lower:
-                stop_cmd = "pkill -f 'python.*manage.py runserver.*8086'"
-            elif "dramatiq" in service_lower or ("worker" in service_lower and "dramatiq" in service_lower):
-                stop_cmd = "pkill -f 'start_dramatiq_worker\\.py|manage\\.py rundramatiq|dramatiq.*judge\\.tasks'"
-            elif "heartbeat" in service_lower:
-                stop_cmd = "pkill -f 'heartbeat_metaseek_judge\\.py'"
-            elif "vue" in service_lower and "frontend" in service_lower:
-                stop_cmd = "pkill -f 'vue|webpack.*8081'"
-            elif "react" in service_lower or ("classroom" in service_lower and "8080" in service_lower):
-                stop_cmd = "pkill -f 'vite.*8080|npm run dev.*--port 8080'"
-            elif "scratch" in service_lower and "editor" in service_lower:
-                stop_cmd = "pkill -f 'scratch.*8601|webpack.*8601'"
-            elif "scratch" in service_lower and "runner" in service_lower:
-                stop_cmd = "pkill -f 'scratch-runner|node.*server\\.js.*3002'"
-            elif "judge" in service_lower and "server" in service_lower:
-                stop_cmd = "docker stop metaseek-judge-dev 2>/dev/null || echo 'DOCKER_NOT_FOUND'"
+            # 进程树和命令行匹配需要遍历 /proc，在单独的线程中执行（不占用 SSH 连接池的线程）
+            current = supervised()
+            if current is not None and current.running:
+                old_pids = await asyncio.to_thread(process_tree, current.pid)
             else:
-                # 使用传入的命令（兼容旧版本）
-                stop_cmd = command.split(';')[0] if ';' in command else command
+                pattern = service["process_pattern"] if service else None
+                old_pids = await asyncio.to_thread(matching_pids, pattern) if pattern else []
             
-            _run_local_shell(stop_cmd, timeout=10)
-            time.sleep(1)
+            def report(success: bool, message: str, **extra):
+                timings["total_seconds"] = round(time.monotonic() - started, 3)
+                return {
+                    "success": success,
+                    ("message" if success else "error"): message,
+                    "timings": timings,
+                    "stopped_pids": old_pids,
+                    **extra
+                }
             
-            # 启动命令
-            if "postgresql" in service_lower or "postgres" in service_lower:
-                start_cmd = "echo '123456' | sudo -S service postgresql start 2>/dev/null || (echo '123456' | sudo -S -u postgres /usr/lib/postgresql/12/bin/pg_ctl -D /var/lib/postgresql/12/main start 2>/dev/null || sudo service postgresql start || sudo -u postgres /usr/lib/postgresql/12/bin/pg_ctl -D /var/lib/postgresql/12/main start)"
-            elif "backend" in service_lower or "django" in service_lower:
-                start_cmd = f"cd {local_project_root}/OnlineJudge && nohup python manage.py runserver 0.0.0.0:8086 >> /tmp/django.log 2>&1 & disown"
-            elif "dramatiq" in service_lower or ("worker" in service_lower and "dramatiq" in service_lower):
-                start_cmd = f"cd {local_project_root}/OnlineJudge && nohup python start_dramatiq_worker.py >> /tmp/dramatiq.log 2>&1 & disown"
-            elif "heartbeat" in service_lower:
-                start_cmd = f"cd {local_project_root}/OnlineJudge && TOKEN=$(python -c \"import os,django;os.environ.setdefault('DJANGO_SETTINGS_MODULE','oj.settings');django.setup();from options.options import SysOptions;print(SysOptions.judge_server_token)\") && nohup python heartbeat_metaseek_judge.py >> /tmp/heartbeat.log 2>&1 & disown"
-            elif "vue" in service_lower and "frontend" in service_lower:
-                start_cmd = f"cd {local_project_root}/OnlineJudgeFE-Vue && VUE_PORT=8081 nohup npm run dev >> /tmp/vue.log 2>&1 & disown"
-            elif "react" in service_lower or ("classroom" in service_lower and "8080" in service_lower):
-                start_cmd = f"cd {local_project_root}/OnlineJudgeFE-React && nohup npm run dev -- --host 0.0.0.0 --port 8080 >> /tmp/react_classroom.log 2>&1 & disown"
-            elif "scratch" in service_lower and "editor" in service_lower:
-                start_cmd = f"cd {local_project_root}/scratch-editor && PORT=8601 nohup ./start-editor.sh >> /tmp/scratch_editor.log 2>&1 & disown"
-            elif "scratch" in service_lower and "runner" in service_lower:
-                start_cmd = f"cd {local_project_root}/scratch-runner && PORT=3002 nohup node server.js >> logs/scratch-runner.log 2>&1 & disown"
-            elif "judge" in service_lower and "server" in service_lower:
-                start_cmd = "docker stop metaseek-judge-dev 2>/dev/null; sleep 1; docker start metaseek-judge-dev 2>/dev/null || (docker run -d --name metaseek-judge-dev -p 12360:12360 metaseek-judge:dev 2>&1 || echo 'DOCKER_NOT_FOUND')"
+            await progress(f"停止 {service_id}", 10, pids=old_pids)
+            if current is not None:
+                # 受守护的服务：停止记录的进程组，再等待端口释放
+                stop_result = await local_supervisor.terminate(service_key)
+                wait_result = await wait_stopped([], ports)
+                stopped = stop_result["stopped"] and wait_result["stopped"]
+                forced = old_pids if stop_result["forced"] else []
+                survivor = None if stop_result["stopped"] else f"进程组 {stop_result['pid']} 仍在运行"
             else:
-                # 使用传入的命令（兼容旧版本）
-                start_cmd = command.split(';')[1].strip() if ';' in command else command
+                # 停止命令（未注册的服务使用传入的命令，兼容旧版本），再等待旧进程退出、端口释放
+                stop_cmd = registry_command("stop") or (command.split(';')[0] if ';' in command else command)
+                await run_shell(stop_cmd, timeout=10)
+                wait_result = await wait_stopped(old_pids, ports)
+                stopped = wait_result["stopped"]
+                forced = wait_result["forced"]
+                survivor = None
+            timings["stop_seconds"] = round(time.monotonic() - started, 3)
+            if not stopped:
+                if survivor is None and wait_result["remaining_ports"]:
+                    survivor = f"端口 {wait_result['remaining_ports']} 仍在监听"
+                elif survivor is None:
+                    alive = [pid for pid in old_pids if pid_alive(pid)]
+                    survivor = f"进程 {alive} 仍在运行"
+                return report(False, f"重启失败: {service_id} 未能停止（{survivor}）", forced_pids=forced)
             
-            if "nohup" in start_cmd or "& disown" in start_cmd:
-                _run_local_shell(start_cmd, timeout=15, fire_and_forget=True)
-                return {"success": True, "message": f"{service_id} 重启成功"}
-            start_result = _run_local_shell(start_cmd, timeout=15)
-            if start_result.returncode == 0:
-                return {"success": True, "message": f"{service_id} 重启成功"}
-            err = _clean_error_message(
-                (start_result.stderr or start_result.stdout or "").strip(), "未知错误"
-            )
-            return {"success": False, "error": f"重启失败: {err}"}
-        
-        else:
-            return {
-                "success": False,
-                "error": f"不支持的操作: {operation}"
-            }
+            # 启动命令
+            registered = registry_command("start")
+            start_cmd = registered or (command.split(';')[1].strip() if ';' in command else command)
+            await progress(f"启动 {service_id}", 40, stop_seconds=timings["stop_seconds"])
+            start_at = time.monotonic()
+            error, extra = await start_service(start_cmd, bool(registered))
+            if error:
+                return report(False, f"重启失败: {error}", forced_pids=forced)
+            timings["start_seconds"] = round(time.monotonic() - start_at, 3)
+            
+            if not readiness:
+                return report(True, f"{service_id} 已重启（未配置就绪探测）", ready=None, forced_pids=forced, **extra)
+            await progress(f"等待 {service_id} 就绪", 60, readiness=readiness)
+            ready_at = time.monotonic()
+            ready_timeout = request.ready_timeout or LOCAL_READY_TIMEOUT
+            process = local_supervisor.get(service_key) if extra.get("supervised") else None
+            
+            async def ready_or_exited() -> bool:
+                # 受守护的进程已经退出时不再等待
+                if process is not None and not process.running:
+                    return True
+                return await probe_ready(readiness, run_probe)
+            
+            ready = await wait_until(ready_or_exited, ready_timeout)
+            timings["ready_seconds"] = round(time.monotonic() - ready_at, 3)
+            if process is not None and not process.running:
+                return report(False, f"重启失败: {service_id} 启动后退出（退出码 {process.popen.returncode}），见 {process.log_file}", ready=False, forced_pids=forced, **extra)
+            if not ready:
+                return report(False, f"重启失败: {service_id} {int(ready_timeout)} 秒内未就绪", ready=False, forced_pids=forced, **extra)
+            return report(True, f"{service_id} 重启成功", ready=True, forced_pids=forced, **extra)
             
     except Exception as e:
         import traceback
@@ -1670,6 +2124,11 @@ async def local_service_operation(request: LocalServiceOperationRequest):
             "error": str(e)
         }
 
+@app.get("/api/services/local/supervisor")
+async def local_supervisor_status():
+    """受守护的本地服务：PID、进程组、启动时间、重启次数、日志文件和资源占用（来自 /proc）"""
+    return {"success": True, "services": local_supervisor.list()}
+
 # 服务连通性测试请求模型
 class ServiceConnectivityTestRequest(BaseModel):
     server_id: str
@@ -1693,23 +2152,12 @@ async def test_service_connectivity(request: ServiceConnectivityTestRequest, db:
         server_config = servers[request.server_id]
         project_path = server_config.get("project_path", "")
         
-        # 连接SSH
-        password = server_config.get("password") if server_config.get("auth_type") == "password" else None
-        private_key_path = server_config.get("private_key_path") if server_config.get("auth_type") == "key" else None
-        private_key_content = server_config.get("private_key_content") if server_config.get("auth_type") == "key" else None
-        
-        result = ssh_manager.connect(
-            host=server_config.get("host"),
-            user=server_config.get("user"),
-            port=server_config.get("port", 22),
-            password=password,
-            private_key_path=private_key_path,
-            private_key_content=private_key_content,
-            timeout=10
-        )
+        # 从连接池取出SSH连接
+        result = await ssh_manager.aget_connection(**server_connect_kwargs(server_config))
         
         if not result.get("success"):
             raise HTTPException(status_code=500, detail=f"SSH连接失败: {result.get('message')}")
+        conn = result["connection"]
         
         test_results = {
             "port_check": None,
@@ -1718,11 +2166,21 @@ async def test_service_connectivity(request: ServiceConnectivityTestRequest, db:
         }
         errors = []
         
+        # 各项检查命令在同一连接的不同 channel 上并发执行
+        check_commands = {}
+        if request.port:
+            check_commands["port_check"] = f"ss -tlnp 2>/dev/null | grep -q ':{request.port} ' || netstat -tlnp 2>/dev/null | grep -q ':{request.port} ' || lsof -ti:{request.port} >/dev/null 2>&1"
+        if request.check_command:
+            check_commands["process_check"] = f"cd {project_path} && {request.check_command}"
+        if request.health_check_url:
+            # 通过SSH在远程服务器上执行curl
+            check_commands["http_check"] = f"curl -s -o /dev/null -w '%{{http_code}}' '{request.health_check_url}' 2>&1 || echo '000'"
+        exec_results = dict(zip(check_commands, await conn.aexecute_many(list(check_commands.values()))))
+        
         # 1. 端口检查
         if request.port:
             try:
-                port_check_cmd = f"ss -tlnp 2>/dev/null | grep -q ':{request.port} ' || netstat -tlnp 2>/dev/null | grep -q ':{request.port} ' || lsof -ti:{request.port} >/dev/null 2>&1"
-                exec_result = ssh_manager.execute_command(port_check_cmd)
+                exec_result = exec_results["port_check"]
                 if exec_result.get("success") or exec_result.get("exit_status") == 0:
                     test_results["port_check"] = "✅ 端口已监听"
                 else:
@@ -1735,8 +2193,8 @@ async def test_service_connectivity(request: ServiceConnectivityTestRequest, db:
         # 2. 进程检查
         if request.check_command:
             try:
-                exec_result = ssh_manager.execute_command(f"cd {project_path} && {request.check_command}")
-                output = exec_result.get("stdout", "") + exec_result.get("stderr", "")
+                exec_result = exec_results["process_check"]
+                output = (exec_result.get("stdout") or "") + (exec_result.get("stderr") or "")
                 if "NOT_RUNNING" in output or exec_result.get("exit_status") != 0:
                     test_results["process_check"] = "❌ 进程未运行"
                     errors.append("进程检查失败")
@@ -1749,10 +2207,8 @@ async def test_service_connectivity(request: ServiceConnectivityTestRequest, db:
         # 3. HTTP健康检查
         if request.health_check_url:
             try:
-                # 通过SSH在远程服务器上执行curl
-                health_check_cmd = f"curl -s -o /dev/null -w '%{{http_code}}' '{request.health_check_url}' 2>&1 || echo '000'"
-                exec_result = ssh_manager.execute_command(health_check_cmd)
-                http_code = exec_result.get("stdout", "").strip()
+                exec_result = exec_results["http_check"]
+                http_code = (exec_result.get("stdout") or "").strip()
                 
                 if http_code and http_code.isdigit():
                     code = int(http_code)
@@ -1770,8 +2226,6 @@ async def test_service_connectivity(request: ServiceConnectivityTestRequest, db:
                 test_results["http_check"] = f"⚠️ HTTP检查失败: {str(e)}"
                 errors.append(f"HTTP检查异常: {str(e)}")
         
-        ssh_manager.close()
-        
         success = len(errors) == 0
         return {
             "success": success,
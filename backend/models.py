@@ -1,7 +1,7 @@
 """
 数据库模型定义
 """
-from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean
+from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean, JSON
 from sqlalchemy.sql import func
 from database import Base
 
@@ -51,3 +51,97 @@ class ServerConfig(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+class ServiceDefinition(Base):
+    """服务注册表：每个服务的匹配规则、启停/状态/就绪命令、端口和日志文件（见 service_registry.py）"""
+    __tablename__ = "service_definitions"
+
+    service_key = Column(String(100), primary_key=True, index=True, comment="服务标识")
+    name = Column(String(200), nullable=False, comment="显示名称")
+    # 匹配规则：关键词组列表，服务名称（小写）包含某一组的全部关键词即匹配，如 [["vue", "frontend"]]
+    match = Column(JSON, nullable=False, default=list, comment="名称匹配规则")
+    aliases = Column(JSON, nullable=False, default=list, comment="精确匹配的别名")
+    # 命令中的 {project_path} 替换为项目路径
+    start_command = Column(Text, nullable=True, comment="启动命令")
+    stop_command = Column(Text, nullable=True, comment="停止命令")
+    restart_command = Column(Text, nullable=True, comment="重启命令（为空时先停止再启动）")
+    status_command = Column(Text, nullable=True, comment="状态检查命令")
+    readiness = Column(JSON, nullable=True, comment="就绪探测，如 {\"type\": \"port\", \"port\": 8086}")
+    ports = Column(JSON, nullable=False, default=list, comment="监听端口")
+    log_file = Column(String(500), nullable=True, comment="日志文件")
+    process_pattern = Column(Text, nullable=True, comment="进程命令行匹配正则")
+    docker_pattern = Column(Text, nullable=True, comment="容器名称/镜像匹配正则")
+    port_sufficient = Column(Boolean, default=False, nullable=False, comment="端口在监听即视为运行中")
+    # all: 远程和本地都可用；remote: 只用于远程服务器
+    scope = Column(String(20), default="all", nullable=False, comment="适用范围")
+    sort_order = Column(Integer, default=0, nullable=False, comment="匹配顺序")
+    is_active = Column(Boolean, default=True, nullable=False, comment="是否启用")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, comment="更新时间")
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "service_key": self.service_key,
+            "name": self.name,
+            "match": self.match or [],
+            "aliases": self.aliases or [],
+            "start_command": self.start_command,
+            "stop_command": self.stop_command,
+            "restart_command": self.restart_command,
+            "status_command": self.status_command,
+            "readiness": self.readiness,
+            "ports": self.ports or [],
+            "log_file": self.log_file,
+            "process_pattern": self.process_pattern,
+            "docker_pattern": self.docker_pattern,
+            "port_sufficient": self.port_sufficient,
+            "scope": self.scope,
+            "sort_order": self.sort_order,
+            "is_active": self.is_active,
+        }
+
+
+class JobRecord(Base):
+    """后台任务记录（见 jobs.py）：提交时写入，结束后更新状态、结果和进度事件"""
+    __tablename__ = "jobs"
+
+    job_id = Column(String(32), primary_key=True, index=True, comment="任务ID")
+    kind = Column(String(50), nullable=False, index=True, comment="任务类型，如 restart_project")
+    host = Column(String(100), nullable=False, index=True, comment="目标主机（服务器ID，本机为 local）")
+    title = Column(String(200), nullable=True, comment="任务说明")
+    params = Column(JSON, nullable=True, comment="任务参数")
+    # queued / running / succeeded / failed / cancelled
+    state = Column(String(20), nullable=False, index=True, comment="任务状态")
+    progress = Column(Integer, nullable=True, comment="进度百分比")
+    message = Column(Text, nullable=True, comment="最近一条进度信息")
+    result = Column(JSON, nullable=True, comment="任务结果")
+    error = Column(Text, nullable=True, comment="失败原因")
+    events = Column(JSON, nullable=True, comment="进度事件")
+    created_at = Column(DateTime(timezone=True), nullable=False, comment="提交时间")
+    started_at = Column(DateTime(timezone=True), nullable=True, comment="开始时间")
+    finished_at = Column(DateTime(timezone=True), nullable=True, comment="结束时间")
+
+    def to_dict(self):
+        """转换为字典（与 jobs.Job.to_dict 的格式一致）"""
+        def seconds(start, end):
+            return round((end - start).total_seconds(), 3) if start and end else None
+
+        return {
+            "id": self.job_id,
+            "kind": self.kind,
+            "host": self.host,
+            "title": self.title,
+            "params": self.params,
+            "state": self.state,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "queued_seconds": seconds(self.created_at, self.started_at),
+            "elapsed_seconds": seconds(self.started_at, self.finished_at),
+        }
@@ -0,0 +1,300 @@
+"""
+按依赖图并行启动服务
+依赖图来自启动脚本的解析结果（见 script_graph.py）：没有依赖关系的服务在连接池的多个 channel 上同时启动，
+有依赖的服务等到被依赖的服务通过就绪探测（端口监听、HTTP 2xx、pg_isready）之后再启动，
+整体耗时接近依赖图的关键路径，而不是所有服务启动时间之和
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
+
+from event_log import EventLog, trim_finished
+from readiness import probe_command
+
+
+# 单个服务启动命令的超时（秒）
+ORCHESTRATOR_START_TIMEOUT = float(os.getenv("ORCHESTRATOR_START_TIMEOUT", "120"))
+# 启动命令返回后等待就绪探测通过的超时（秒）
+ORCHESTRATOR_READY_TIMEOUT = float(os.getenv("ORCHESTRATOR_READY_TIMEOUT", "120"))
+# 就绪探测的初始间隔和最大间隔（秒），每次未通过后间隔乘以 1.5
+ORCHESTRATOR_PROBE_INTERVAL = float(os.getenv("ORCHESTRATOR_PROBE_INTERVAL", "0.5"))
+ORCHESTRATOR_PROBE_MAX_INTERVAL = 3.0
+# 保留的启动记录数
+ORCHESTRATOR_MAX_RUNS = 50
+# 每次启动保留的进度事件数
+ORCHESTRATOR_MAX_EVENTS = 1000
+
+
+def select_nodes(graph: Dict[str, Any], services: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    从依赖图中选出要启动的节点：services 为空时全部启动，否则只启动指定的服务及其依赖
+
+    Returns:
+        [{"id", "name", "probe", "depends_on"}]，按依赖图的分层顺序
+    """
+    nodes = {node["id"]: node for node in graph.get("nodes", [])}
+    depends_on: Dict[str, List[str]] = {node_id: [] for node_id in nodes}
+    for edge in graph.get("edges", []):
+        if edge["from"] in nodes and edge["to"] in nodes:
+            depends_on[edge["to"]].append(edge["from"])
+
+    if services:
+        wanted = {
+            node_id for node_id, node in nodes.items()
+            if node_id in services or node["name"] in services
+        }
+        unknown = [name for name in services if name not in nodes and not any(node["name"] == name for node in nodes.values())]
+        if unknown:
+            raise ValueError(f"启动脚本中没有服务: {', '.join(unknown)}")
+        pending = list(wanted)
+        while pending:
+            for dependency in depends_on[pending.pop()]:
+                if dependency not in wanted:
+                    wanted.add(dependency)
+                    pending.append(dependency)
+    else:
+        wanted = set(nodes)
+
+    ordered = [node_id for level in graph.get("levels", [list(nodes)]) for node_id in level if node_id in wanted]
+    return [
+        {
+            "id": node_id,
+            "name": nodes[node_id]["name"],
+            "probe": nodes[node_id].get("probe"),
+            "depends_on": [dependency for dependency in depends_on[node_id] if dependency in wanted],
+        }
+        for node_id in ordered
+    ]
+
+
+class StartupStep:
+    """一个服务的启动过程"""
+
+    def __init__(self, step_id: str, name: str, command: str, probe: Optional[Dict[str, Any]], depends_on: List[str]):
+        self.id = step_id
+        self.name = name
+        self.command = command
+        self.probe = probe
+        self.depends_on = depends_on
+        # pending / starting / waiting / ready / failed / skipped
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.output = ""
+        self.started_at: Optional[float] = None
+        self.launched_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.probes = 0
+
+    def to_dict(self, origin: Optional[float]) -> Dict[str, Any]:
+        def offset(value):
+            return round(value - origin, 3) if value is not None and origin is not None else None
+
+        def duration(start, end):
+            return round(end - start, 3) if start is not None and end is not None else None
+
+        return {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "depends_on": self.depends_on,
+            "probe": self.probe,
+            "error": self.error,
+            "output": self.output,
+            "probes": self.probes,
+            "started_at": offset(self.started_at),
+            "finished_at": offset(self.finished_at),
+            "start_seconds": duration(self.started_at, self.launched_at),
+            "ready_seconds": duration(self.launched_at, self.finished_at if self.state == "ready" else None),
+        }
+
+
+class StartupRun:
+    """一次按依赖图的并行启动"""
+
+    def __init__(
+        self,
+        server_id: str,
+        steps: List[StartupStep],
+        prepare_command: Optional[str] = None,
+        start_timeout: float = ORCHESTRATOR_START_TIMEOUT,
+        ready_timeout: float = ORCHESTRATOR_READY_TIMEOUT,
+    ):
+        self.id = uuid.uuid4().hex[:12]
+        self.server_id = server_id
+        self.steps: "OrderedDict[str, StartupStep]" = OrderedDict((step.id, step) for step in steps)
+        self.prepare_command = prepare_command
+        self.start_timeout = start_timeout
+        self.ready_timeout = ready_timeout
+        # pending / running / succeeded / failed
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.log = EventLog(ORCHESTRATOR_MAX_EVENTS)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("succeeded", "failed")
+
+    async def _emit(self, event: Dict[str, Any]):
+        await self.log.emit(event)
+
+    async def _set_step(self, step: StartupStep, state: str, error: Optional[str] = None):
+        step.state = state
+        if error:
+            step.error = error
+        await self._emit({"type": "step", **step.to_dict(self.started_at)})
+
+    async def run(self, conn):
+        """在一个池化连接上执行启动（多个服务并发使用连接的多个 channel）"""
+        self.state = "running"
+        self.started_at = time.monotonic()
+        await self._emit({"type": "run", "state": self.state})
+        if self.prepare_command:
+            result = await conn.aexecute_command(self.prepare_command, timeout=self.start_timeout)
+            if not result.get("success"):
+                self.error = f"准备启动脚本失败: {result.get('error')}"
+                for step in self.steps.values():
+                    await self._set_step(step, "skipped", self.error)
+                return await self._finish()
+
+        done = {step_id: asyncio.Event() for step_id in self.steps}
+        await asyncio.gather(*(self._run_step(conn, step, done) for step in self.steps.values()))
+        await self._finish()
+
+    async def _finish(self):
+        self.finished_at = time.monotonic()
+        failed = [step.id for step in self.steps.values() if step.state != "ready"]
+        self.state = "failed" if failed or self.error else "succeeded"
+        if failed and not self.error:
+            self.error = f"未就绪的服务: {', '.join(failed)}"
+        await self._emit({"type": "run", **self.summary()})
+
+    async def _run_step(self, conn, step: StartupStep, done: Dict[str, asyncio.Event]):
+        try:
+            for dependency in step.depends_on:
+                await done[dependency].wait()
+            blocked = [dependency for dependency in step.depends_on if self.steps[dependency].state != "ready"]
+            if blocked:
+                step.finished_at = time.monotonic()
+                await self._set_step(step, "skipped", f"依赖未就绪: {', '.join(blocked)}")
+                return
+
+            step.started_at = time.monotonic()
+            await self._set_step(step, "starting")
+            result = await conn.aexecute_command(step.command, timeout=self.start_timeout)
+            step.launched_at = time.monotonic()
+            step.output = (result.get("stdout") or "")[-2000:]
+            if not result.get("success"):
+                step.finished_at = step.launched_at
+                await self._set_step(step, "failed", result.get("error") or result.get("stderr") or "启动命令执行失败")
+                return
+
+            check = probe_command(step.probe)
+            if check:
+                await self._set_step(step, "waiting")
+                if not await self._wait_ready(conn, step, check):
+                    step.finished_at = time.monotonic()
+                    await self._set_step(step, "failed", f"{int(self.ready_timeout)} 秒内未就绪")
+                    return
+            step.finished_at = time.monotonic()
+            await self._set_step(step, "ready")
+        except Exception as e:
+            print(f"Error starting {step.id} on {self.server_id}: {e}")
+            step.finished_at = time.monotonic()
+            await self._set_step(step, "failed", str(e))
+        finally:
+            done[step.id].set()
+
+    async def _wait_ready(self, conn, step: StartupStep, check: str) -> bool:
+        deadline = time.monotonic() + self.ready_timeout
+        interval = ORCHESTRATOR_PROBE_INTERVAL
+        while True:
+            step.probes += 1
+            result = await conn.aexecute_command(check, timeout=10)
+            if result.get("exit_status") == 0:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, ORCHESTRATOR_PROBE_MAX_INTERVAL)
+
+    def critical_path(self) -> List[str]:
+        """实际耗时的关键路径：从最后就绪的服务开始，沿最晚就绪的依赖向前回溯"""
+        ready = [step for step in self.steps.values() if step.finished_at is not None]
+        if not ready:
+            return []
+        path = []
+        step = max(ready, key=lambda item: item.finished_at)
+        while step is not None:
+            path.append(step.id)
+            dependencies = [self.steps[dependency] for dependency in step.depends_on if self.steps[dependency].finished_at is not None]
+            step = max(dependencies, key=lambda item: item.finished_at) if dependencies else None
+        return list(reversed(path))
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        serial = sum(
+            step.finished_at - step.started_at
+            for step in self.steps.values()
+            if step.started_at is not None and step.finished_at is not None
+        )
+        return {
+            "id": self.id,
+            "server_id": self.server_id,
+            "state": self.state,
+            "error": self.error,
+            "created_at": self.created_at,
+            "elapsed_seconds": round(end - self.started_at, 3) if self.started_at is not None else None,
+            # 逐个串行启动时的耗时（各服务启动到就绪的时间之和）
+            "serial_seconds": round(serial, 3),
+            "critical_path": self.critical_path(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.summary(), "steps": [step.to_dict(self.started_at) for step in self.steps.values()]}
+
+    def follow(self, after: int = 0, heartbeat: float = 15) -> AsyncIterator[Optional[Tuple[int, Dict[str, Any]]]]:
+        """从第 after 个事件开始产生 (事件数, 事件)，直到启动结束；heartbeat 秒没有新事件时产生 None（见 EventLog.follow）"""
+        return self.log.follow(lambda: self.finished, after, heartbeat)
+
+
+class StartupOrchestrator:
+    """启动记录的管理：每台服务器同一时间只允许一次启动"""
+
+    def __init__(self, max_runs: int = ORCHESTRATOR_MAX_RUNS):
+        self.max_runs = max_runs
+        self.runs: "OrderedDict[str, StartupRun]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def active(self, server_id: str) -> Optional[StartupRun]:
+        for run in self.runs.values():
+            if run.server_id == server_id and not run.finished:
+                return run
+        return None
+
+    def start(self, conn, run: StartupRun) -> StartupRun:
+        """在后台执行启动，立即返回"""
+        self.runs[run.id] = run
+        trim_finished(self.runs, self.max_runs)
+        task = asyncio.create_task(run.run(conn))
+        self._tasks[run.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(run.id, None))
+        return run
+
+    def get(self, run_id: str) -> Optional[StartupRun]:
+        return self.runs.get(run_id)
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+
+
+# 全局启动编排实例
+startup_orchestrator = StartupOrchestrator()
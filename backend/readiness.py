@@ -0,0 +1,24 @@
+"""
+就绪探测命令
+服务的就绪探测（端口监听、HTTP 2xx、pg_isready、进程、自定义命令）转换为 shell 命令，
+远程启动编排（orchestrator.py）和本地服务重启（local_probe.py）共用
+"""
+import shlex
+from typing import Optional, Dict, Any
+
+
+def probe_command(probe: Optional[Dict[str, Any]]) -> Optional[str]:
+    """就绪探测对应的命令，通过时退出码为 0"""
+    if not probe:
+        return None
+    if probe["type"] == "port":
+        return f"(ss -ltn 2>/dev/null || netstat -ltn 2>/dev/null) | grep -qE ':{int(probe['port'])}\\s'"
+    if probe["type"] == "http":
+        return f"curl -s -o /dev/null -w '%{{http_code}}' --max-time 3 {shlex.quote(probe['url'])} | grep -q '^2'"
+    if probe["type"] == "pg_isready":
+        return f"pg_isready -q -h localhost -p {int(probe.get('port') or 5432)}"
+    if probe["type"] == "process":
+        return f"pgrep -f {shlex.quote(probe['pattern'])} >/dev/null"
+    if probe["type"] == "command":
+        return probe["command"]
+    return None
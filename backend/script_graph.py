@@ -0,0 +1,557 @@
+"""
+启动脚本依赖分析
+对 bash 启动脚本做一遍词法扫描，收集函数定义、调用顺序、等待/检查端口的语句（wait_for、check_port、
+pg_isready、curl 等）以及各函数启动进程时使用的端口，据此生成服务依赖图（DAG）：
+
+- 节点：启动服务的函数，带提供的端口和就绪探测（readiness probe）
+- 边：A -> B 表示 B 需要在 A 就绪之后启动，来源包括
+    call  B 的函数体中调用了 A
+    gate  调用 B 之前（或在 B 中）等待了 A 提供的端口
+    port  B 的命令中引用了 A 提供的端口（例如数据库连接串）
+    cwd   B 和依赖 A 的服务在同一目录下启动（同一份代码和配置），继承其依赖
+- levels：按拓扑分层，同一层的服务之间没有依赖，可以并行启动
+"""
+import re
+from typing import Optional, Dict, Any, List, Tuple, Set
+
+
+# 在命令开头出现、不是命令本身的关键字
+_PREFIX_WORDS = {"if", "then", "else", "elif", "do", "while", "until", "!", "time", "exec", "command"}
+# 会启动长期运行进程的命令
+_LAUNCHERS = {
+    "nohup", "setsid", "service", "systemctl", "docker", "docker-compose", "pg_ctl", "pg_ctlcluster",
+    "npm", "npx", "yarn", "pnpm", "node", "python", "python3", "gunicorn", "uvicorn", "celery",
+    "dramatiq", "nginx", "redis-server", "supervisorctl", "pm2",
+}
+# 不是服务的辅助函数（按函数名前缀）
+_HELPER_PREFIXES = ("stop", "kill", "check", "wait", "status", "log", "usage", "help", "clean", "print", "echo", "main")
+# 等待 / 检查类命令
+_GATE_COMMANDS = {"check_port", "wait_for", "wait_for_port", "wait_port", "wait-for-it", "wait-for-it.sh", "pg_isready", "curl", "wget", "nc", "lsof"}
+# 常见服务的默认端口（命令中没有写明端口时使用）
+_WELL_KNOWN_PORTS = {"postgresql": 5432, "postgres": 5432, "nginx": 80, "redis": 6379, "redis-server": 6379, "mysql": 3306}
+
+_VARIABLE = re.compile(r"\$\{(\w+)(?::?-([^}]*))?\}|\$(\w+)")
+_ASSIGNMENT = re.compile(r"^(\w+)=(.*)$", re.DOTALL)
+_HOST_PORT = re.compile(r"(?:^|[/@\s=])(?:localhost|127\.0\.0\.1|0\.0\.0\.0|\[::\]|::|[a-zA-Z][\w.-]*)?:(\d{2,5})(?=$|[/\s\"'])")
+_PORT_OPTION = re.compile(r"^--?(?:port|listen|bind)(?:=(?:[\w.]*:)?(\d{2,5}))?$")
+_PORT_VARIABLE = re.compile(r"(?:^|_)PORT=(\d{2,5})$")
+_URL = re.compile(r"https?://[^\s\"']+")
+_NUMBER = re.compile(r"^\d{2,5}$")
+
+
+def tokenize(script: str) -> List[Tuple[str, str, int]]:
+    """
+    把脚本切分为 (类型, 文本, 行号)：类型为 word（已去掉引号）或 op（; && || | & 换行 ( ) { }）
+
+    处理引号、注释、行尾续行、$( ) / 反引号（整体作为单词的一部分）和 here-document（跳过正文）
+    """
+    tokens: List[Tuple[str, str, int]] = []
+    i, n, line = 0, len(script), 1
+    word: List[str] = []
+    word_started = False
+    heredocs: List[Tuple[str, bool]] = []
+
+    def flush():
+        nonlocal word, word_started
+        if word_started:
+            text = "".join(word)
+            tokens.append(("op" if text in ("{", "}") else "word", text, line))
+        word, word_started = [], False
+
+    while i < n:
+        ch = script[i]
+        if ch == "\\" and i + 1 < n:
+            if script[i + 1] == "\n":
+                line += 1
+            else:
+                word.append(script[i + 1])
+                word_started = True
+            i += 2
+            continue
+        if ch == "'":
+            end = script.find("'", i + 1)
+            end = n if end < 0 else end
+            word.append(script[i + 1:end])
+            line += script.count("\n", i, end)
+            word_started = True
+            i = end + 1
+            continue
+        if ch == '"':
+            j = i + 1
+            while j < n and script[j] != '"':
+                j += 2 if script[j] == "\\" else 1
+            word.append(script[i + 1:j])
+            line += script.count("\n", i, j)
+            word_started = True
+            i = j + 1
+            continue
+        if ch == "`" or script.startswith("$(", i):
+            # 命令替换整体保留在单词中
+            close, depth, j = ("`", 1, i + 1) if ch == "`" else (")", 1, i + 2)
+            while j < n and depth:
+                if script[j] == close and (close == "`" or script[j - 1] != "\\"):
+                    depth -= 1
+                elif close == ")" and script[j] == "(":
+                    depth += 1
+                j += 1
+            word.append(script[i:j])
+            line += script.count("\n", i, j)
+            word_started = True
+            i = j
+            continue
+        if ch == "#" and not word_started:
+            end = script.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if ch in " \t":
+            flush()
+            i += 1
+            continue
+        if ch == "\n":
+            flush()
+            tokens.append(("op", "\n", line))
+            line += 1
+            i += 1
+            # 跳过 here-document 正文
+            for delimiter, strip_tabs in heredocs:
+                while i < n:
+                    end = script.find("\n", i)
+                    end = n if end < 0 else end
+                    body_line = script[i:end]
+                    i = end + 1
+                    line += 1
+                    if (body_line.lstrip("\t") if strip_tabs else body_line) == delimiter:
+                        break
+            heredocs = []
+            continue
+        if script.startswith("<<", i) and not script.startswith("<<<", i):
+            flush()
+            strip_tabs = script.startswith("<<-", i)
+            j = i + (3 if strip_tabs else 2)
+            while j < n and script[j] in " \t":
+                j += 1
+            k = j
+            while k < n and script[k] not in " \t\n;&|<>()":
+                k += 1
+            heredocs.append((script[j:k].strip("'\""), strip_tabs))
+            i = k
+            continue
+        two = script[i:i + 2]
+        if two in ("&&", "||", ";;"):
+            flush()
+            tokens.append(("op", two if two != ";;" else ";", line))
+            i += 2
+            continue
+        if ch == "&" and ((word and word[-1] in "<>") or script.startswith("&>", i)):
+            # 重定向 2>&1 / &> 不是后台运行
+            word.append(ch)
+            word_started = True
+            i += 1
+            continue
+        if ch in ";&|()":
+            flush()
+            tokens.append(("op", ch, line))
+            i += 1
+            continue
+        word.append(ch)
+        word_started = True
+        i += 1
+    flush()
+    return tokens
+
+
+def _expand(text: str, variables: Dict[str, str]) -> str:
+    """展开脚本中已赋值的变量（$NAME / ${NAME} / ${NAME:-默认值}）"""
+    def replace(match):
+        name = match.group(1) or match.group(3)
+        if name in variables:
+            return variables[name]
+        return match.group(2) if match.group(2) is not None else match.group(0)
+    return _VARIABLE.sub(replace, text) if "$" in text else text
+
+
+def _ports_in_words(words: List[str]) -> List[int]:
+    """命令中明确出现的端口：--port N / -p N:M / PORT=N / host:N"""
+    ports = []
+    for index, word in enumerate(words):
+        option = _PORT_OPTION.match(word)
+        if option:
+            value = option.group(1) or (words[index + 1] if index + 1 < len(words) else "")
+            if _NUMBER.match(value.split(":")[-1]):
+                ports.append(int(value.split(":")[-1]))
+            continue
+        if word == "-p" and index + 1 < len(words):
+            # docker run -p 宿主端口:容器端口 / pg_isready -p 端口
+            value = words[index + 1].split(":")[0]
+            if _NUMBER.match(value):
+                ports.append(int(value))
+            continue
+        variable = _PORT_VARIABLE.search(word)
+        if variable:
+            ports.append(int(variable.group(1)))
+            continue
+        for match in _HOST_PORT.finditer(word):
+            ports.append(int(match.group(1)))
+        if index > 0 and words[index - 1] == "runserver" and _NUMBER.match(word):
+            ports.append(int(word))
+    return [port for port in dict.fromkeys(ports) if 0 < port < 65536]
+
+
+def _gate(name: str, words: List[str], helpers: Set[str]) -> Optional[Dict[str, Any]]:
+    """识别等待 / 检查语句，返回 {"command", "port", "url", "kind"}"""
+    if name not in _GATE_COMMANDS and name not in helpers:
+        return None
+    args = words[1:]
+    if name == "lsof" and not any(arg.startswith("-i") for arg in args):
+        return None
+    if name == "nc" and "-z" not in args:
+        return None
+    url = next((match.group(0) for arg in args for match in _URL.finditer(arg)), None)
+    ports = _ports_in_words(args) or [int(arg) for arg in args if _NUMBER.match(arg)]
+    for arg in args:
+        if arg.startswith("-i:") and _NUMBER.match(arg[3:]):
+            ports.insert(0, int(arg[3:]))
+    if name == "pg_isready":
+        return {"command": name, "port": ports[0] if ports else 5432, "url": None, "kind": "pg_isready"}
+    if url and name in ("curl", "wget"):
+        return {"command": name, "port": ports[0] if ports else None, "url": url, "kind": "http"}
+    if not ports:
+        return None
+    return {"command": name, "port": ports[0], "url": url, "kind": "port"}
+
+
+class _Command:
+    __slots__ = ("function", "words", "line", "background")
+
+    def __init__(self, function: Optional[str], words: List[str], line: int, background: bool):
+        self.function = function
+        self.words = words
+        self.line = line
+        self.background = background
+
+
+def _collect(tokens: List[Tuple[str, str, int]]) -> Tuple[Dict[str, int], List[_Command], Dict[str, str], List[Tuple[int, int]]]:
+    """
+    按顺序收集简单命令及其所在的函数
+
+    Returns:
+        (函数名 -> 定义所在行, 命令列表, 全局变量, 顶层函数定义和变量赋值所在的行范围)
+    """
+    functions: Dict[str, int] = {}
+    commands: List[_Command] = []
+    variables: Dict[str, str] = {}
+    definitions: List[Tuple[int, int]] = []
+    # 函数栈：(函数名, 函数体开始时的括号深度)
+    stack: List[Tuple[str, int]] = []
+    depth = 0
+    pending_function: Optional[str] = None
+    current: List[Tuple[str, int]] = []
+
+    def finish(separator: str):
+        nonlocal current
+        words = [text for text, _ in current]
+        line = current[0][1] if current else 0
+        last_line = current[-1][1] if current else 0
+        current = []
+        # 去掉开头的控制关键字和变量赋值（赋值记录为全局变量，供端口解析使用）
+        assignments = []
+        while words and (words[0] in _PREFIX_WORDS or _ASSIGNMENT.match(words[0])):
+            if words[0] not in _PREFIX_WORDS:
+                assignments.append(words[0])
+            words = words[1:]
+        if not words:
+            for assignment in assignments:
+                name, value = _ASSIGNMENT.match(assignment).groups()
+                variables.setdefault(name, _expand(value, variables))
+            if assignments and not stack:
+                definitions.append((line, last_line))
+            return
+        function = stack[-1][0] if stack else None
+        expanded = [_expand(word, variables) for word in assignments + words]
+        commands.append(_Command(function, expanded, line, separator == "&"))
+
+    index = 0
+    while index < len(tokens):
+        kind, text, line = tokens[index]
+        if kind == "word":
+            # name() { ... } 或 function name { ... }
+            if not current and index + 2 < len(tokens) and tokens[index + 1][1] == "(" and tokens[index + 2][1] == ")":
+                pending_function = text
+                index += 3
+                continue
+            if not current and text == "function" and index + 1 < len(tokens) and tokens[index + 1][0] == "word":
+                pending_function = tokens[index + 1][1].rstrip("()")
+                index += 2
+                if index + 1 < len(tokens) and tokens[index][1] == "(" and tokens[index + 1][1] == ")":
+                    index += 2
+                continue
+            current.append((text, line))
+        elif text == "{":
+            finish(";")
+            depth += 1
+            if pending_function is not None:
+                functions[pending_function] = line
+                stack.append((pending_function, depth))
+                pending_function = None
+        elif text == "}":
+            finish(";")
+            if stack and stack[-1][1] == depth:
+                name, _ = stack.pop()
+                if not stack:
+                    definitions.append((functions[name], line))
+            depth = max(0, depth - 1)
+        elif text in ("(", ")"):
+            finish(";")
+        elif text == "\n":
+            if current:
+                finish("\n")
+        else:
+            finish(text)
+        index += 1
+    finish("\n")
+    return functions, commands, variables, definitions
+
+
+def _command_name(words: List[str]) -> Tuple[str, List[str]]:
+    """命令名（跳过 sudo / nohup 等前缀和环境变量赋值）以及去掉前缀后的参数"""
+    rest = list(words)
+    while rest and (_ASSIGNMENT.match(rest[0]) or rest[0] in ("sudo", "-S", "-E", "nohup", "setsid", "stdbuf", "-oL", "-eL", "env")):
+        if rest[0] == "sudo" and len(rest) > 2 and rest[1] == "-u":
+            rest = rest[3:]
+            continue
+        rest = rest[1:]
+    return (rest[0].rsplit("/", 1)[-1] if rest else ""), rest
+
+
+def _is_launch(command: _Command) -> bool:
+    if command.background:
+        return True
+    first = command.words[0] if command.words else ""
+    name, rest = _command_name(command.words)
+    if first in ("nohup", "setsid") or name in ("nohup", "setsid"):
+        return True
+    if name in ("service", "systemctl", "pg_ctl", "pg_ctlcluster", "supervisorctl", "pm2"):
+        return any(arg in ("start", "restart") for arg in rest[1:])
+    if name in ("docker", "docker-compose"):
+        return any(arg in ("start", "run", "up") for arg in rest[1:])
+    return name in _LAUNCHERS
+
+
+def _service_ports(command: _Command) -> List[int]:
+    """
+    启动命令监听的端口；service postgresql start 这类没有写端口的使用默认端口
+
+    URL 和 *PORT 以外的环境变量（如数据库连接串）是对其他服务的引用，不算作监听端口
+    """
+    words = [
+        word for word in command.words
+        if "://" not in word and (not _ASSIGNMENT.match(word) or _PORT_VARIABLE.search(word))
+    ]
+    ports = _ports_in_words(words)
+    if ports:
+        return ports
+    name, rest = _command_name(command.words)
+    for word in [name] + rest[1:]:
+        if word in _WELL_KNOWN_PORTS:
+            return [_WELL_KNOWN_PORTS[word]]
+    return []
+
+
+def analyze_script(script: str, service_names: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    分析启动脚本，生成服务依赖图
+
+    Args:
+        script: 脚本内容
+        service_names: 函数名 -> 显示名称（parse_start_script 识别出的服务）
+
+    Returns:
+        {
+            "nodes": [{"id", "name", "line", "start_command", "ports", "cwd", "probe"}],
+            "edges": [{"from", "to", "reason", "port"}],
+            "order": [...],     # 脚本实际执行时调用服务函数的顺序
+            "levels": [[...]],  # 拓扑分层，同一层可以并行启动
+            "warnings": [...]
+        }
+    """
+    service_names = service_names or {}
+    functions, commands, _, _ = _collect(tokenize(script))
+    by_function: Dict[Optional[str], List[_Command]] = {}
+    for command in commands:
+        by_function.setdefault(command.function, []).append(command)
+
+    helpers = {name for name in functions if name.lower().startswith(("check", "wait"))}
+
+    # 服务节点：启动了长期运行进程或监听端口的函数（辅助函数除外）
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for name, line in functions.items():
+        if name.lower().startswith(_HELPER_PREFIXES) and name not in service_names:
+            continue
+        body = by_function.get(name, [])
+        launches = [command for command in body if _is_launch(command) and _command_name(command.words)[0] not in functions]
+        if not launches:
+            continue
+        ports: List[int] = []
+        for command in launches:
+            ports.extend(_service_ports(command))
+        # 启动前所在的工作目录
+        cwd = None
+        for command in body:
+            if command is launches[0]:
+                break
+            if command.words[0] == "cd" and len(command.words) > 1:
+                cwd = command.words[1]
+        nodes[name] = {
+            "id": name,
+            "name": service_names.get(name, name),
+            "line": line,
+            "start_command": " ".join(launches[0].words),
+            "ports": list(dict.fromkeys(ports)),
+            "cwd": cwd,
+            "probe": None,
+        }
+
+    providers: Dict[int, str] = {}
+    for node in nodes.values():
+        for port in node["ports"]:
+            providers.setdefault(port, node["id"])
+
+    edges: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def add_edge(source: str, target: str, reason: str, port: Optional[int] = None):
+        if source != target and (source, target) not in edges:
+            edges[(source, target)] = {"from": source, "to": target, "reason": reason, "port": port}
+
+    # 节点自身：函数体中的调用、等待和引用的端口
+    for name, node in nodes.items():
+        for command in by_function.get(name, []):
+            command_name = _command_name(command.words)[0]
+            if command_name in nodes:
+                add_edge(command_name, name, "call")
+                continue
+            gate = _gate(command_name, command.words, helpers)
+            if gate:
+                owner = providers.get(gate["port"]) if gate["port"] else None
+                if owner == name or (owner is None and gate["port"] in node["ports"]):
+                    # 等待自己的端口：作为就绪探测
+                    node["probe"] = node["probe"] or _probe(gate)
+                elif owner:
+                    add_edge(owner, name, "gate", gate["port"])
+                continue
+            for port in _ports_in_words(command.words):
+                owner = providers.get(port)
+                if owner and owner != name and port not in node["ports"]:
+                    add_edge(owner, name, "port", port)
+
+    # 按脚本的执行顺序展开（从顶层开始，内联非服务函数）：
+    # 等待某个端口之后紧接着调用的服务依赖该端口的提供者（脚本中的等待通常是为下一个服务准备的，
+    # 之后的服务如果也依赖它，会通过调用或端口引用体现出来，不因为脚本是串行写的就全部串行）
+    order: List[str] = []
+    gated: List[Tuple[str, int]] = []
+
+    def walk(function: Optional[str], visiting: Set[Optional[str]]):
+        for command in by_function.get(function, []):
+            command_name = _command_name(command.words)[0]
+            if command_name in nodes:
+                if command_name not in order:
+                    order.append(command_name)
+                for owner, port in gated:
+                    add_edge(owner, command_name, "gate", port)
+                gated.clear()
+            elif command_name in functions and command_name not in visiting and command_name not in helpers:
+                walk(command_name, visiting | {command_name})
+            else:
+                gate = _gate(command_name, command.words, helpers)
+                owner = providers.get(gate["port"]) if gate and gate["port"] else None
+                if owner and owner in order:
+                    gated.append((owner, gate["port"]))
+                    nodes[owner]["probe"] = nodes[owner]["probe"] or _probe(gate)
+
+    walk(None, {None})
+
+    # 在同一工作目录（同一份代码和配置）中启动的服务依赖相同：后启动的继承先启动的服务的依赖
+    sequence = order + sorted((name for name in nodes if name not in order), key=lambda name: nodes[name]["line"])
+    for index, name in enumerate(sequence):
+        cwd = nodes[name]["cwd"]
+        if not cwd:
+            continue
+        for earlier in sequence[:index]:
+            if nodes[earlier]["cwd"] != cwd:
+                continue
+            for edge in [edge for edge in edges.values() if edge["to"] == earlier]:
+                add_edge(edge["from"], name, "cwd", edge["port"])
+
+    for node in nodes.values():
+        if node["probe"] is None and node["ports"]:
+            port = node["ports"][0]
+            postgres = port == 5432 or "postgres" in node["id"].lower()
+            node["probe"] = {"type": "pg_isready", "port": port} if postgres else {"type": "port", "port": port}
+
+    levels, warnings = _layer(list(nodes), edges)
+    return {
+        "nodes": list(nodes.values()),
+        "edges": list(edges.values()),
+        "order": order,
+        "levels": levels,
+        "warnings": warnings,
+    }
+
+
+def library_script(script: str) -> str:
+    """
+    只保留顶层的函数定义和变量赋值，得到可以 source 之后单独调用某个函数的脚本
+    （直接 source 启动脚本会执行脚本末尾的 main 等顶层命令）
+    """
+    _, _, _, definitions = _collect(tokenize(script))
+    lines = script.split("\n")
+    keep = set()
+    for start, end in definitions:
+        keep.update(range(start, end + 1))
+    return "\n".join(line for number, line in enumerate(lines, 1) if number in keep) + "\n"
+
+
+def _probe(gate: Dict[str, Any]) -> Dict[str, Any]:
+    if gate["kind"] == "http":
+        return {"type": "http", "url": gate["url"]}
+    if gate["kind"] == "pg_isready":
+        return {"type": "pg_isready", "port": gate["port"]}
+    return {"type": "port", "port": gate["port"]}
+
+
+def _layer(node_ids: List[str], edges: Dict[Tuple[str, str], Dict[str, Any]]) -> Tuple[List[List[str]], List[str]]:
+    """Kahn 算法分层；存在环时去掉环上的边并给出警告"""
+    warnings = []
+    while True:
+        incoming = {node_id: set() for node_id in node_ids}
+        for source, target in edges:
+            incoming[target].add(source)
+        levels = []
+        placed: Set[str] = set()
+        while len(placed) < len(node_ids):
+            level = [node_id for node_id in node_ids if node_id not in placed and incoming[node_id] <= placed]
+            if not level:
+                break
+            levels.append(level)
+            placed.update(level)
+        if len(placed) == len(node_ids):
+            return levels, warnings
+        # 剩余节点中存在环：去掉一条环上的边（从 target 能沿剩余的边回到 source）后重新分层
+        remaining = [(source, target) for source, target in edges if source not in placed and target not in placed]
+        source, target = next(edge for edge in remaining if _reachable(edge[1], edge[0], remaining))
+        del edges[(source, target)]
+        warnings.append(f"依赖存在环，已忽略 {source} -> {target}")
+
+
+def _reachable(start: str, goal: str, edges: List[Tuple[str, str]]) -> bool:
+    """沿 edges 从 start 出发能否到达 goal"""
+    seen = {start}
+    pending = [start]
+    while pending:
+        current = pending.pop()
+        if current == goal:
+            return True
+        for source, target in edges:
+            if source == current and target not in seen:
+                seen.add(target)
+                pending.append(target)
+    return False
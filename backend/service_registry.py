@@ -0,0 +1,346 @@
+"""
+服务注册表
+每个服务的名称匹配规则、启动/停止/重启/状态/就绪命令、端口、日志文件和进程特征集中在一处定义，
+持久化在 service_definitions 表中（首次启动时写入 DEFAULT_SERVICES），加载后编译为内存索引：
+服务名称到服务定义的查找先按标识/名称/别名精确匹配，再按关键词组匹配，结果按名称缓存，
+远程服务操作、本地服务操作和状态检查共用同一份定义
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from models import ServiceDefinition
+
+
+# 默认服务定义（顺序即匹配顺序；process_pattern 同时决定进程表快照中进程的归属顺序）
+#   match: 关键词组，服务名称（小写）包含某一组的全部关键词即匹配
+#   命令中的 {project_path} 替换为项目路径
+#   port_sufficient: 进程表快照中端口在监听即视为运行中
+#   scope: remote 表示只用于远程服务器
+DEFAULT_SERVICES: List[Dict[str, Any]] = [
+    {
+        "service_key": "postgresql",
+        "name": "PostgreSQL",
+        "match": [["postgresql"], ["postgres"]],
+        "start_command": "echo '123456' | sudo -S service postgresql start 2>/dev/null || (echo '123456' | sudo -S -u postgres /usr/lib/postgresql/12/bin/pg_ctl -D /var/lib/postgresql/12/main start 2>/dev/null || sudo service postgresql start || sudo -u postgres /usr/lib/postgresql/12/bin/pg_ctl -D /var/lib/postgresql/12/main start)",
+        "stop_command": "echo '123456' | sudo -S service postgresql stop 2>/dev/null || sudo service postgresql stop",
+        "restart_command": "echo '123456' | sudo -S service postgresql restart 2>/dev/null || sudo service postgresql restart",
+        "status_command": "pg_isready -h localhost -p 5432",
+        "readiness": {"type": "pg_isready", "port": 5432},
+        "ports": [5432],
+        "process_pattern": r"bin/postgres\s",
+        "port_sufficient": True,
+    },
+    {
+        "service_key": "backend",
+        "name": "Django Backend",
+        "match": [["backend"], ["django"]],
+        "start_command": "cd {project_path}/OnlineJudge && nohup python manage.py runserver 0.0.0.0:8086 >> /tmp/django.log 2>&1 &",
+        "stop_command": "pkill -f 'python.*manage.py runserver.*8086'",
+        # 只匹配Django Backend (8086端口)，排除Opsdashboard的main.py
+        "status_command": "ps aux | grep -E 'python.*manage.py runserver.*8086' | grep -v grep || echo 'NOT_RUNNING'",
+        "readiness": {"type": "port", "port": 8086},
+        "ports": [8086],
+        "log_file": "/tmp/django.log",
+        "process_pattern": r"python\S*\s+.*manage\.py\s+runserver.*8086",
+    },
+    {
+        "service_key": "nginx",
+        "name": "Nginx",
+        "match": [["nginx"]],
+        "start_command": "echo '123456' | sudo -S service nginx start 2>/dev/null || sudo service nginx start",
+        "stop_command": "echo '123456' | sudo -S service nginx stop 2>/dev/null || sudo service nginx stop",
+        "restart_command": "echo '123456' | sudo -S service nginx restart 2>/dev/null || sudo service nginx restart",
+        "status_command": "systemctl status nginx 2>&1 | head -3 || service nginx status 2>&1 | head -3",
+        "readiness": {"type": "command", "command": "systemctl is-active --quiet nginx 2>/dev/null || service nginx status >/dev/null 2>&1"},
+        "log_file": "/var/log/nginx/error.log",
+        "process_pattern": r"nginx: master process",
+        # 本地 nginx 的操作执行前端传入的命令
+        "scope": "remote",
+    },
+    {
+        "service_key": "dramatiq",
+        "name": "Dramatiq Worker",
+        "match": [["dramatiq"]],
+        "start_command": "cd {project_path}/OnlineJudge && nohup python start_dramatiq_worker.py >> /tmp/dramatiq.log 2>&1 &",
+        "stop_command": "pkill -f 'start_dramatiq_worker\\.py|manage\\.py rundramatiq|dramatiq.*judge\\.tasks'",
+        "status_command": "ps aux | grep -E 'start_dramatiq_worker\\.py|manage\\.py rundramatiq|dramatiq.*judge\\.tasks' | grep -v grep || echo 'NOT_RUNNING'",
+        "readiness": {"type": "process", "pattern": "start_dramatiq_worker\\.py|manage\\.py rundramatiq|dramatiq.*judge\\.tasks"},
+        "log_file": "/tmp/dramatiq.log",
+        "process_pattern": r"start_dramatiq_worker\.py|manage\.py rundramatiq|dramatiq.*judge\.tasks",
+    },
+    {
+        "service_key": "heartbeat",
+        "name": "Heartbeat Monitor",
+        "match": [["heartbeat"]],
+        "start_command": "cd {project_path}/OnlineJudge && TOKEN=$(python -c \"import os,django;os.environ.setdefault('DJANGO_SETTINGS_MODULE','oj.settings');django.setup();from options.options import SysOptions;print(SysOptions.judge_server_token)\") && nohup python heartbeat_metaseek_judge.py >> /tmp/heartbeat.log 2>&1 &",
+        "stop_command": "pkill -f 'heartbeat_metaseek_judge\\.py'",
+        "status_command": "ps aux | grep -E 'heartbeat_metaseek_judge\\.py' | grep -v grep || echo 'NOT_RUNNING'",
+        "readiness": {"type": "process", "pattern": "heartbeat_metaseek_judge\\.py"},
+        "log_file": "/tmp/heartbeat.log",
+        "process_pattern": r"heartbeat_metaseek_judge\.py",
+    },
+    {
+        "service_key": "scratch_editor",
+        "name": "Scratch Editor",
+        "match": [["scratch", "editor"]],
+        "start_command": "cd {project_path}/scratch-editor && PORT=8601 nohup ./start-editor.sh >> /tmp/scratch_editor.log 2>&1 &",
+        "stop_command": "pkill -f 'scratch.*8601|webpack.*8601'",
+        "status_command": "ps aux | grep -E 'scratch.*8601|webpack.*8601|start-editor\\.sh' | grep -v grep || echo 'NOT_RUNNING'",
+        "readiness": {"type": "port", "port": 8601},
+        "ports": [8601],
+        "log_file": "/tmp/scratch_editor.log",
+        "process_pattern": r"scratch.*8601|webpack.*8601|start-editor\.sh",
+    },
+    {
+        "service_key": "scratch_runner",
+        "name": "Scratch Runner",
+        "match": [["scratch", "runner"]],
+        "start_command": "cd {project_path}/scratch-runner && PORT=3002 nohup node server.js >> logs/scratch-runner.log 2>&1 &",
+        "stop_command": "pkill -f 'scratch-runner|node.*server\\.js.*3002'",
+        # 优先使用端口检查（更可靠），然后检查进程（必须匹配3002端口或scratch-runner）
+        "status_command": "if lsof -i:3002 >/dev/null 2>&1; then echo 'RUNNING'; elif [ -n \"$(ps aux | grep -E 'node.*server\\.js.*3002|scratch-runner.*3002|PORT=3002' | grep -v grep | grep -v cursor | head -1)\" ]; then echo 'RUNNING'; else echo 'NOT_RUNNING'; fi",
+        "readiness": {"type": "port", "port": 3002},
+        "ports": [3002],
+        "log_file": "{project_path}/scratch-runner/logs/scratch-runner.log",
+        "process_pattern": r"node.*server\.js.*3002|scratch-runner.*3002|PORT=3002",
+        "port_sufficient": True,
+    },
+    {
+        "service_key": "judge_server",
+        "name": "Judge Server",
+        "match": [["judge", "server"]],
+        "start_command": "docker start metaseek-judge-dev 2>/dev/null || (docker run -d --name metaseek-judge-dev -p 12360:12360 metaseek-judge:dev 2>&1 || echo 'DOCKER_NOT_FOUND')",
+        "stop_command": "docker stop metaseek-judge-dev 2>/dev/null || echo 'DOCKER_NOT_FOUND'",
+        "restart_command": "docker stop metaseek-judge-dev 2>/dev/null; sleep 1; docker start metaseek-judge-dev 2>/dev/null || (docker run -d --name metaseek-judge-dev -p 12360:12360 metaseek-judge:dev 2>&1 || echo 'DOCKER_NOT_FOUND')",
+        "status_command": "docker ps | grep -E 'judge|metaseek-judge' || echo 'NOT_RUNNING'",
+        "readiness": {"type": "port", "port": 12360},
+        "docker_pattern": r"judge|metaseek-judge",
+    },
+    {
+        "service_key": "vue_frontend",
+        "name": "Vue Frontend",
+        "match": [["vue", "frontend"]],
+        "start_command": "cd {project_path}/OnlineJudgeFE-Vue && VUE_PORT=8081 nohup npm run dev >> /tmp/vue.log 2>&1 &",
+        "stop_command": "pkill -f 'vue|webpack.*8081'",
+        "status_command": "ps aux | grep -E 'vue|webpack.*8081' | grep -v grep || echo 'NOT_RUNNING'",
+        "readiness": {"type": "port", "port": 8081},
+        "ports": [8081],
+        "log_file": "/tmp/vue.log",
+        "process_pattern": r"vue|webpack.*8081",
+    },
+    {
+        "service_key": "react_classroom",
+        "name": "React Classroom",
+        "match": [["react"], ["classroom", "8080"]],
+        "start_command": "cd {project_path}/OnlineJudgeFE-React && nohup npm run dev -- --host 0.0.0.0 --port 8080 >> /tmp/react_classroom.log 2>&1 &",
+        "stop_command": "pkill -f 'vite.*8080|npm run dev.*--port 8080'",
+        "status_command": "ps aux | grep -E 'vite.*8080|npm run dev.*--port 8080' | grep -v grep || echo 'NOT_RUNNING'",
+        "readiness": {"type": "port", "port": 8080},
+        "ports": [8080],
+        "log_file": "/tmp/react_classroom.log",
+        "process_pattern": r"vite.*8080|npm run dev.*--port 8080",
+    },
+    {
+        # 名称只包含 judge 时停止 / 重启评测相关进程
+        "service_key": "judge",
+        "name": "Judge",
+        "match": [["judge"]],
+        "stop_command": "pkill -f 'dramatiq|judge'",
+        "restart_command": "pkill -f 'dramatiq|judge'; sleep 1; cd {project_path} && nohup python3 -m dramatiq judge 2>&1 &",
+        "scope": "remote",
+    },
+    {
+        "service_key": "frontend",
+        "name": "Frontend",
+        "match": [["frontend"], ["vite"]],
+        "start_command": "cd {project_path}/frontend && nohup npm run dev > /tmp/frontend.log 2>&1 &",
+        "stop_command": "pkill -f 'vite|npm.*dev'",
+        "status_command": "ps aux | grep -E 'vite|npm.*dev' | grep -v grep || echo 'NOT_RUNNING'",
+        "log_file": "/tmp/frontend.log",
+        "scope": "remote",
+    },
+]
+
+OPERATIONS = ("start", "stop", "restart", "status")
+
+# 数据库中可以修改的字段
+_FIELDS = (
+    "name", "match", "aliases", "start_command", "stop_command", "restart_command", "status_command",
+    "readiness", "ports", "log_file", "process_pattern", "docker_pattern", "port_sufficient", "scope", "sort_order", "is_active",
+)
+
+# 名称查找缓存的上限（服务名称来自请求，超过上限时丢弃最早的记录）
+_MEMO_SIZE = 512
+
+
+def _normalize(definition: Dict[str, Any], order: int = 0) -> Dict[str, Any]:
+    service = {field: definition.get(field) for field in ("service_key",) + _FIELDS}
+    service["match"] = [[keyword.lower() for keyword in group] for group in (service["match"] or []) if group]
+    service["aliases"] = list(service["aliases"] or [])
+    service["ports"] = list(service["ports"] or [])
+    service["port_sufficient"] = bool(service["port_sufficient"])
+    service["scope"] = service["scope"] or "all"
+    service["sort_order"] = order if service["sort_order"] is None else service["sort_order"]
+    service["is_active"] = True if service["is_active"] is None else bool(service["is_active"])
+    return service
+
+
+def _supports(service: Dict[str, Any], operation: Optional[str]) -> bool:
+    if operation is None:
+        return True
+    if operation == "restart":
+        return bool(service["restart_command"] or (service["start_command"] and service["stop_command"]))
+    return bool(service.get(f"{operation}_command"))
+
+
+def render(command: Optional[str], project_path: str) -> Optional[str]:
+    """替换命令中的 {project_path}"""
+    return command.replace("{project_path}", project_path) if command else command
+
+
+def _upgrade_table(db: Session):
+    """
+    补齐旧版本建表时没有的列（create_all 不会修改已存在的表）：
+    port_sufficient 新增后按默认定义回填；同一版本的 nginx 定义还没有限定为远程服务器
+    """
+    columns = {column["name"] for column in inspect(db.get_bind()).get_columns(ServiceDefinition.__tablename__)}
+    if "port_sufficient" in columns:
+        return
+    db.execute(text("ALTER TABLE service_definitions ADD COLUMN port_sufficient BOOLEAN NOT NULL DEFAULT FALSE"))
+    keys = [definition["service_key"] for definition in DEFAULT_SERVICES if definition.get("port_sufficient")]
+    db.query(ServiceDefinition).filter(ServiceDefinition.service_key.in_(keys)).update(
+        {ServiceDefinition.port_sufficient: True}, synchronize_session=False
+    )
+    db.query(ServiceDefinition).filter(ServiceDefinition.service_key == "nginx", ServiceDefinition.scope == "all").update(
+        {ServiceDefinition.scope: "remote"}, synchronize_session=False
+    )
+    db.commit()
+
+
+class ServiceRegistry:
+    """服务定义的内存索引"""
+
+    def __init__(self, definitions: Optional[List[Dict[str, Any]]] = None):
+        self._lock = threading.Lock()
+        self._compile(definitions if definitions is not None else DEFAULT_SERVICES)
+
+    def _compile(self, definitions: List[Dict[str, Any]]):
+        services = [_normalize(definition, index) for index, definition in enumerate(definitions)]
+        services = sorted((service for service in services if service["is_active"]), key=lambda service: service["sort_order"])
+        exact: Dict[str, str] = {}
+        for service in services:
+            for alias in [service["service_key"], service["name"]] + service["aliases"]:
+                exact.setdefault(alias.lower(), service["service_key"])
+        with self._lock:
+            self.services: "OrderedDict[str, Dict[str, Any]]" = OrderedDict((service["service_key"], service) for service in services)
+            self._exact = exact
+            # (名称, 操作, 范围) -> 服务标识，避免每次请求重复做子串匹配
+            self._memo: "OrderedDict[Tuple[str, Optional[str], str], Optional[str]]" = OrderedDict()
+            # 每次重新编译加一，依赖注册表的索引（如状态检查的进程特征）据此判断是否需要重建
+            self.version = getattr(self, "version", 0) + 1
+
+    def match(self, service_name: str, operation: Optional[str] = None, scope: str = "remote") -> Optional[Dict[str, Any]]:
+        """
+        按服务名称查找服务定义
+
+        Args:
+            operation: 只返回定义了该操作命令的服务（start / stop / restart / status），为空时不限
+            scope: remote 或 local，local 时跳过只用于远程服务器的定义
+        """
+        name = service_name.lower()
+        key = (name, operation, scope)
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                service_key = self._memo[key]
+                return self.services.get(service_key) if service_key else None
+            services = self.services
+            exact = self._exact.get(name)
+
+        def usable(service):
+            return _supports(service, operation) and (scope == "remote" or service["scope"] != "remote")
+
+        found = None
+        if exact and usable(services[exact]):
+            found = services[exact]
+        else:
+            for service in services.values():
+                if usable(service) and any(all(keyword in name for keyword in group) for group in service["match"]):
+                    found = service
+                    break
+        with self._lock:
+            self._memo[key] = found["service_key"] if found else None
+            if len(self._memo) > _MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return found
+
+    def command(self, service_name: str, operation: str, project_path: str, scope: str = "remote") -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        服务操作对应的命令
+
+        Returns:
+            (服务定义, 替换了项目路径的命令)；没有匹配的服务时为 (None, None)
+        """
+        service = self.match(service_name, operation, scope)
+        if service is None:
+            return None, None
+        if operation == "restart" and not service["restart_command"]:
+            command = f"{service['stop_command']}; sleep 1; {service['start_command']}"
+        else:
+            command = service[f"{operation}_command"]
+        return service, render(command, project_path)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(service) for service in self.services.values()]
+
+    def load(self, db: Session):
+        """从数据库加载服务定义，表为空时写入默认定义"""
+        try:
+            _upgrade_table(db)
+            rows = db.query(ServiceDefinition).order_by(ServiceDefinition.sort_order).all()
+            if not rows:
+                for index, definition in enumerate(DEFAULT_SERVICES):
+                    service = _normalize(definition, index)
+                    db.add(ServiceDefinition(service_key=service["service_key"], **{field: service[field] for field in _FIELDS}))
+                db.commit()
+                rows = db.query(ServiceDefinition).order_by(ServiceDefinition.sort_order).all()
+            self._compile([row.to_dict() for row in rows])
+        except Exception as e:
+            db.rollback()
+            print(f"Error loading service registry, using defaults: {e}")
+            self._compile(DEFAULT_SERVICES)
+
+    def save(self, db: Session, service_key: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """新增或更新一个服务定义并重新编译索引（sort_order 为空时保持原顺序，新服务排在最后）"""
+        if data.get("sort_order") is None:
+            data = {field: value for field, value in data.items() if field != "sort_order"}
+        row = db.query(ServiceDefinition).filter(ServiceDefinition.service_key == service_key).first()
+        if row is None:
+            service = _normalize({**data, "service_key": service_key}, len(self.services))
+            row = ServiceDefinition(service_key=service_key, **{field: service[field] for field in _FIELDS})
+            db.add(row)
+        else:
+            service = _normalize({**row.to_dict(), **data, "service_key": service_key})
+            for field in _FIELDS:
+                setattr(row, field, service[field])
+        db.commit()
+        self.load(db)
+        return row.to_dict()
+
+    def delete(self, db: Session, service_key: str) -> bool:
+        row = db.query(ServiceDefinition).filter(ServiceDefinition.service_key == service_key).first()
+        if row is None:
+            return False
+        db.delete(row)
+        db.commit()
+        self.load(db)
+        return True
+
+
+# 全局服务注册表实例（启动时从数据库加载，加载前使用默认定义）
+service_registry = ServiceRegistry()
@@ -0,0 +1,412 @@
+"""
+远程服务状态检查
+根据服务名称生成状态检查命令，并根据命令输出判断服务是否在运行
+"""
+import re
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+from service_registry import service_registry
+
+
+# 服务器整体状态检查命令（/api/status 使用）
+STATUS_CHECK_COMMANDS = [
+    "ps aux | grep -E '(python3.*manage.py|nginx|judge|heartbeat)' | grep -v grep || echo 'No services found'",
+    "systemctl status nginx 2>&1 | head -3 || echo 'Nginx not found'",
+    "curl -s http://localhost:8000/api/website/ 2>&1 | head -1 || echo 'API not responding'"
+]
+
+
+def resolve_status_check(service_name: str) -> Tuple[Optional[str], str]:
+    """
+    根据服务名称匹配健康检查命令（检查命令来自服务注册表）
+
+    Returns:
+        (服务标识, 检查命令)；不属于已知服务（见 known_services）的服务标识为 None
+    """
+    service, command = service_registry.command(service_name, "status", "")
+    if service:
+        key = service["service_key"]
+        return (key if key in _signatures().known else None), command
+
+    # 通用检查：使用服务名称的关键词
+    service_lower = service_name.lower()
+    keywords = []
+    if "dramatiq" in service_lower or "worker" in service_lower:
+        keywords.append("start_dramatiq_worker")
+    if "heartbeat" in service_lower:
+        keywords.append("heartbeat_metaseek_judge")
+    if "scratch" in service_lower:
+        if "editor" in service_lower:
+            keywords.append("scratch.*8601|start-editor")
+        elif "runner" in service_lower:
+            keywords.append("scratch-runner|node.*server\\.js.*3002")
+        else:
+            keywords.append("scratch")
+    if keywords:
+        pattern = "|".join(keywords)
+        return None, f"ps aux | grep -E '{pattern}' | grep -v grep || echo 'NOT_RUNNING'"
+    return None, f"ps aux | grep -i '{service_name}' | grep -v grep || echo 'NOT_RUNNING'"
+
+
+def classify_status(service_name: str, command: str, exec_result: Dict[str, Any]) -> str:
+    """
+    根据检查命令的执行结果判断服务状态
+
+    Returns:
+        "running" 或 "stopped"
+    """
+    stdout = exec_result.get("stdout") or ""
+    stderr = exec_result.get("stderr") or ""
+    service_lower = service_name.lower()
+
+    # 合并stdout和stderr进行检查（某些命令可能将输出写入stderr）
+    combined_output = (stdout + " " + stderr).strip()
+    output_lower = combined_output.lower()
+    exit_status = exec_result.get("exit_status", -1)
+
+    # 关键判断：如果明确包含NOT_RUNNING，说明服务未运行（检查stdout和stderr）
+    if "NOT_RUNNING" in stdout or "NOT_RUNNING" in stderr:
+        return "stopped"
+    # 对于pg_isready等特殊命令
+    elif "postgresql" in service_lower or "postgres" in service_lower:
+        if "accepting connections" in output_lower or exit_status == 0:
+            return "running"
+        return "stopped"
+    # 对于systemctl status命令
+    elif "systemctl" in command or "service" in command:
+        if "running" in output_lower or "active" in output_lower:
+            return "running"
+        return "stopped"
+    # 对于lsof端口检查命令（最可靠的方式）
+    elif "lsof -i:" in command or ("lsof" in command and "-i:" in command):
+        # 检查是否有RUNNING标记（新的检查命令格式）
+        if "RUNNING" in stdout or "RUNNING" in stderr:
+            return "running"
+        # lsof命令成功（exit_status == 0）说明端口在监听，服务在运行
+        elif exit_status == 0:
+            # 进一步验证：确保不是空输出
+            return "running" if stdout.strip() else "stopped"
+        # lsof失败，检查是否有进程检查的fallback
+        elif "ps aux" in command or "grep" in command:
+            # 如果fallback检查有输出且不是NOT_RUNNING，进一步验证
+            if stdout.strip() or stderr.strip():
+                # 验证输出是否包含相关关键词（避免误判）
+                if any(keyword in combined_output for keyword in ["node", "server.js", "scratch", "3002"]):
+                    return "running"
+            return "stopped"
+        return "stopped"
+    # 对于ps aux | grep命令（最常见的检查方式）
+    elif "ps aux" in command or ("grep" in command and "ps" in command):
+        # 如果命令执行成功（exit_status == 0）且有输出，说明找到了进程
+        if exit_status == 0 and (stdout.strip() or stderr.strip()):
+            # 检查输出是否包含进程信息关键词（更严格的验证）
+            process_keywords = ["python", "node", "npm", "vite", "webpack", "docker", "postgres", "bash", "sh"]
+            # 对于Django Backend，必须包含manage.py和8086
+            if "backend" in service_lower or "django" in service_lower:
+                if "manage.py" in combined_output and "8086" in combined_output:
+                    return "running"
+                return "stopped"
+            # 对于其他服务，检查关键词
+            elif any(keyword in combined_output for keyword in process_keywords):
+                return "running"
+        # 命令执行失败、输出为空或不包含关键词，认为未运行（更保守）
+        return "stopped"
+    # 对于docker ps命令
+    elif "docker ps" in command:
+        if stdout.strip() and "CONTAINER" in stdout:
+            return "running"
+        return "stopped"
+    # 默认判断：根据退出状态和输出
+    else:
+        if exit_status == 0:
+            if "running" in output_lower or "active" in output_lower:
+                return "running"
+            elif stdout.strip() and "NOT_RUNNING" not in stdout:
+                return "running"
+        return "stopped"
+
+
+def service_check_command(project_path: str, command: str) -> str:
+    """在项目目录下执行检查命令，并清理环境变量，避免npmrc等配置干扰"""
+    return f"cd {project_path} && unset NPM_CONFIG_PREFIX NPM_CONFIG_GLOBALCONFIG 2>/dev/null; {command}"
+
+
+# 进程表快照：每次检查只采集一次，已知服务的状态都从这份快照中判断
+SNAPSHOT_COMMANDS = {
+    # $$ 是执行批量脚本的 shell，它的命令行包含整个脚本，需要排除
+    "snapshot_ps": "ps -eo pid=,args= 2>/dev/null | awk -v self=$$ '$1 != self'",
+    "snapshot_ports": "ss -tlnpH 2>/dev/null || netstat -tlnp 2>/dev/null | tail -n +3",
+    "snapshot_docker": "docker ps --format '{{.Names}} {{.Image}}' 2>/dev/null || true",
+    "snapshot_postgresql": "pg_isready -h localhost -p 5432 2>&1",
+    "snapshot_nginx": "systemctl is-active nginx 2>/dev/null || service nginx status 2>&1 | head -3",
+}
+
+# 编辑器等工具的进程（命令行里常带有项目路径）不算作服务进程
+_PROCESS_EXCLUDE = re.compile(r"cursor|vscode-server", re.IGNORECASE)
+# ss -tlnp: "LISTEN 0 128 0.0.0.0:8086 0.0.0.0:* users:(("python",pid=123,fd=3))"
+# netstat -tlnp: "tcp 0 0 0.0.0.0:8086 0.0.0.0:* LISTEN 123/python"
+_LISTEN_MATCHER = re.compile(r"\S+:(?P<port>\d+)\s+\S+:(?:\*|\d+)(?:\s|$).*?(?:pid=(?P<pid>\d+)|\s(?P<netstat_pid>\d+)/|$)")
+_NGINX_ACTIVE = re.compile(r"^active$|\(running\)|is running", re.MULTILINE)
+
+
+class _Signatures:
+    """
+    从服务注册表编译的已知服务特征（注册表中有进程/容器特征的服务，后台轮询会定期检查这些服务）：
+      process: 匹配进程命令行（按注册表顺序，一个进程只归属于第一个匹配的服务）
+      ports: 服务监听的端口；port_sufficient 为 True 时端口在监听即视为运行中
+      docker: 匹配容器名称/镜像
+    """
+
+    def __init__(self, services: List[Dict[str, Any]]):
+        self.known: Dict[str, str] = {}
+        self.signatures: Dict[str, Dict[str, Any]] = {}
+        for service in services:
+            signature = {
+                "process": _valid_pattern(service, "process_pattern"),
+                "ports": tuple(service.get("ports") or ()),
+                "port_sufficient": bool(service.get("port_sufficient")),
+                "docker": _valid_pattern(service, "docker_pattern"),
+            }
+            if signature["process"] or signature["docker"]:
+                self.known[service["service_key"]] = service["name"]
+                self.signatures[service["service_key"]] = signature
+        # 服务标识不一定是合法的组名，正则中按序号命名分组
+        self._groups = {f"s{index}": key for index, key in enumerate(self.signatures)}
+        # 所有服务的进程特征合并成一个正则：从行首依次尝试每个分支，lastgroup 即为匹配到的服务，
+        # 每行进程只需匹配一次
+        processes = [(group, self.signatures[key]["process"]) for group, key in self._groups.items() if self.signatures[key]["process"]]
+        self.process_matcher = re.compile(
+            r"^\s*(?P<pid>\d+)\s+(?:" + "|".join(f"(?P<{group}>.*?(?:{pattern}))" for group, pattern in processes) + ")"
+        ) if processes else None
+        dockers = [(group, self.signatures[key]["docker"]) for group, key in self._groups.items() if self.signatures[key]["docker"]]
+        self.docker_matcher = re.compile(
+            "|".join(f"(?P<{group}>{pattern})" for group, pattern in dockers)
+        ) if dockers else None
+        self.port_owners = {port: key for key, signature in self.signatures.items() for port in signature["ports"]}
+
+    def owner(self, match: re.Match) -> str:
+        return self._groups[match.lastgroup]
+
+
+def _valid_pattern(service: Dict[str, Any], field: str) -> Optional[str]:
+    pattern = service.get(field)
+    if not pattern:
+        return None
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        print(f"Invalid {field} for service {service['service_key']}: {e}")
+        return None
+    return pattern
+
+
+_compiled: Optional[_Signatures] = None
+_compiled_version: Optional[int] = None
+_compiled_lock = threading.Lock()
+
+
+def _signatures() -> _Signatures:
+    """当前注册表的服务特征，注册表重新加载后重新编译"""
+    global _compiled, _compiled_version
+    with _compiled_lock:
+        if _compiled is None or _compiled_version != service_registry.version:
+            _compiled_version = service_registry.version
+            _compiled = _Signatures(service_registry.list())
+        return _compiled
+
+
+def known_services() -> Dict[str, str]:
+    """已知服务：服务标识 -> 显示名称"""
+    return dict(_signatures().known)
+
+
+def classify_snapshot(results: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    根据进程表快照判断所有已知服务的状态
+
+    Args:
+        results: 批量执行结果中 SNAPSHOT_COMMANDS 对应的各项
+
+    Returns:
+        {服务标识: {"status", "pids", "ports", "containers", "output"}}
+    """
+    compiled = _signatures()
+    services = {
+        key: {"status": "stopped", "pids": [], "ports": [], "containers": [], "output": []}
+        for key in compiled.signatures
+    }
+
+    for line in (results.get("snapshot_ps", {}).get("stdout") or "").splitlines():
+        match = compiled.process_matcher.match(line) if compiled.process_matcher else None
+        if not match or _PROCESS_EXCLUDE.search(line):
+            continue
+        service = services[compiled.owner(match)]
+        service["pids"].append(int(match.group("pid")))
+        service["output"].append(line.strip())
+
+    for line in (results.get("snapshot_ports", {}).get("stdout") or "").splitlines():
+        match = _LISTEN_MATCHER.search(line)
+        if not match:
+            continue
+        key = compiled.port_owners.get(int(match.group("port")))
+        if not key:
+            continue
+        service = services[key]
+        port = int(match.group("port"))
+        if port not in service["ports"]:
+            service["ports"].append(port)
+        pid = match.group("pid") or match.group("netstat_pid")
+        if pid and int(pid) not in service["pids"]:
+            service["pids"].append(int(pid))
+
+    for line in (results.get("snapshot_docker", {}).get("stdout") or "").splitlines():
+        match = compiled.docker_matcher.search(line) if compiled.docker_matcher else None
+        if match:
+            services[compiled.owner(match)]["containers"].append(line.split()[0])
+            services[compiled.owner(match)]["output"].append(line.strip())
+
+    postgresql_output = results.get("snapshot_postgresql", {}).get("stdout") or ""
+    if "accepting connections" in postgresql_output and "postgresql" in services:
+        services["postgresql"]["output"].append(postgresql_output.strip())
+    nginx_output = results.get("snapshot_nginx", {}).get("stdout") or ""
+    if _NGINX_ACTIVE.search(nginx_output) and "nginx" in services:
+        services["nginx"]["output"].append(nginx_output.strip())
+
+    for key, service in services.items():
+        signature = compiled.signatures[key]
+        running = bool(service["containers"]) if signature.get("docker") else bool(service["output"])
+        if not running and signature.get("port_sufficient") and service["ports"]:
+            running = True
+        service["status"] = "running" if running else "stopped"
+        service["output"] = "\n".join(service["output"])
+    return services
+
+
+def build_service_checks(
+    project_path: str,
+    service_names: List[str],
+    prefix: str = "service_",
+    check_overrides: Optional[Dict[str, str]] = None,
+) -> Tuple[Dict[str, str], Dict[str, Tuple[Optional[str], Optional[str], str]]]:
+    """
+    为一组服务生成批量检查命令（重复的名称只检查一次）
+    已知服务共用一份进程表快照，其他服务仍使用各自的检查命令；
+    check_overrides 为其他服务指定检查命令（例如启动脚本中解析出的检查命令）
+
+    Returns:
+        (批量命令 {命令名: 实际执行的命令}, {服务名称: (批量命令名或None, 服务标识, 检查命令)})
+    """
+    commands = {}
+    checks = {}
+    for index, service_name in enumerate(dict.fromkeys(service_names)):
+        service_key, command = resolve_status_check(service_name)
+        if service_key is None and check_overrides and check_overrides.get(service_name):
+            command = check_overrides[service_name]
+        if service_key in _signatures().signatures:
+            commands.update(SNAPSHOT_COMMANDS)
+            checks[service_name] = (None, service_key, command)
+        else:
+            checks[service_name] = (f"{prefix}{index}", service_key, command)
+            commands[f"{prefix}{index}"] = service_check_command(project_path, command)
+    return commands, checks
+
+
+def collect_service_results(checks: Dict[str, Tuple[Optional[str], Optional[str], str]], batch_result: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    根据批量执行结果判断每个服务的状态
+
+    Returns:
+        {服务名称: {"service_key", "success", "status", "output", "error", "pids", "ports", "containers"}}
+    """
+    results = batch_result.get("results", {})
+    snapshot_ok = all(results.get(name, {}).get("exit_status") is not None for name in SNAPSHOT_COMMANDS)
+    classified = classify_snapshot(results) if snapshot_ok else {}
+
+    services = {}
+    for service_name, (name, service_key, command) in checks.items():
+        if name is None:
+            if not snapshot_ok:
+                services[service_name] = {
+                    "service_key": service_key,
+                    "success": False,
+                    "status": "unknown",
+                    "output": "",
+                    "error": batch_result.get("error") or "进程表采集失败",
+                }
+                continue
+            if service_key not in classified:
+                # 检查期间注册表被修改，该服务已不再是已知服务
+                services[service_name] = {
+                    "service_key": service_key,
+                    "success": False,
+                    "status": "unknown",
+                    "output": "",
+                    "error": "服务定义已变更",
+                }
+                continue
+            services[service_name] = {
+                "service_key": service_key,
+                "success": True,
+                "error": None,
+                **classified[service_key],
+            }
+            continue
+
+        exec_result = results.get(name)
+        if not exec_result:
+            services[service_name] = {
+                "service_key": service_key,
+                "success": False,
+                "status": "unknown",
+                "output": "",
+                "error": batch_result.get("error") or "状态检查失败",
+            }
+            continue
+        # 批量脚本超时或输出被截断时没有退出码，无法判断状态
+        if exec_result.get("exit_status") is None:
+            status = "unknown"
+        else:
+            status = classify_status(service_name, command, exec_result)
+        services[service_name] = {
+            "service_key": service_key,
+            "success": exec_result.get("success", False),
+            "status": status,
+            "output": exec_result.get("stdout", ""),
+            "error": exec_result.get("stderr") if not exec_result.get("success") else None,
+        }
+    return services
+
+
+def probe_services(
+    conn,
+    project_path: str,
+    service_names: List[str],
+    timeout: Optional[float] = None,
+    check_overrides: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """
+    在一个SSH连接上通过一次批量执行检查多个服务的状态
+
+    Args:
+        conn: 连接池中的 SSHConnection
+        project_path: 项目路径
+        service_names: 服务名称列表
+        check_overrides: 未知服务名称 -> 检查命令，见 build_service_checks
+
+    Returns:
+        {
+            "success": bool,
+            "error": Optional[str],
+            "services": {服务名称: {"service_key", "success", "status", "output", "error", ...}}
+        }
+    """
+    commands, checks = build_service_checks(project_path, service_names, check_overrides=check_overrides)
+    if not checks:
+        return {"success": True, "error": None, "services": {}}
+    batch_result = conn.execute_batch(commands, timeout=timeout)
+    return {
+        "success": batch_result.get("success", False),
+        "error": batch_result.get("error"),
+        "services": collect_service_results(checks, batch_result),
+    }
@@ -1,21 +1,965 @@
 """
 SSH连接管理模块
 支持密码认证和密钥认证两种方式
+
+连接按 (host, port, user, 凭据指纹) 放入连接池复用，
+避免每个请求都重新进行 TCP + 密钥交换 + 认证握手。
+同一条连接上的多个命令各自使用独立的 session channel，可以并发执行。
+a 开头的方法（aget_connection / aexecute_command 等）在专用线程池中执行阻塞的SSH操作，
+供 FastAPI 的 async 接口直接 await，不会阻塞事件循环。
 """
+import asyncio
+import functools
 import paramiko
 import os
 import io
-from typing import Optional, Dict, Any
+import hashlib
+import re
+import uuid
+import threading
+import time
+import codecs
+import select
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
 
+try:
+    import zstandard  # 可选依赖：安装后远程有 zstd 时优先使用 zstd 压缩传输
+except ImportError:
+    zstandard = None
+
+
+# 连接池默认参数
+DEFAULT_KEEPALIVE_INTERVAL = 30   # 秒，transport 保活包间隔
+DEFAULT_IDLE_TIMEOUT = 300        # 秒，空闲超过该时间的连接会被回收
+DEFAULT_EVICT_INTERVAL = 60       # 秒，后台检查并回收空闲连接的间隔
+DEFAULT_MAX_SESSIONS = 10         # 每条连接的并发 channel 上限（OpenSSH MaxSessions 默认值）
+DEFAULT_SESSION_WAIT_TIMEOUT = 60 # 秒，等待空闲 channel 名额的最长时间
+DEFAULT_CHANNEL_WORKERS = 32      # execute_many 并发执行使用的线程数
+DEFAULT_ASYNC_WORKERS = 32        # async 接口执行阻塞SSH操作使用的线程数
+DEFAULT_KEY_CACHE_SIZE = 32       # 已解析私钥的缓存条数
+DEFAULT_CHUNK_SIZE = 32768        # 流式读取时每次接收的最大字节数
+DEFAULT_MAX_OUTPUT_BYTES = 16 * 1024 * 1024  # execute_command 最多保留的输出字节数
+# 压缩传输：auto 时按预计输出大小和实测链路吞吐自动选择，off 关闭
+DEFAULT_TRANSFER_COMPRESSION = os.getenv("SSH_TRANSFER_COMPRESSION", "auto").lower()
+DEFAULT_COMPRESS_MIN_BYTES = 16 * 1024              # 预计输出小于该值时不压缩
+DEFAULT_COMPRESS_FAST_LINK_BPS = 32 * 1024 * 1024   # 实测吞吐（字节/秒）高于该值时不压缩，压缩耗时反而超过节省的传输时间
+THROUGHPUT_SAMPLE_MIN_BYTES = 64 * 1024             # 传输量达到该值时才用于估算链路吞吐
+
+# 私钥格式的尝试顺序（PKey 为通用兜底）
+_KEY_CLASSES = [paramiko.RSAKey, paramiko.ECDSAKey, paramiko.Ed25519Key, paramiko.PKey]
+
+PoolKey = Tuple[str, int, str, str]
+
+
+def _credential_fingerprint(
+    password: Optional[str] = None,
+    private_key_path: Optional[str] = None,
+    private_key_content: Optional[str] = None,
+) -> str:
+    """计算凭据指纹（不保存明文，只用于区分连接池中的连接）"""
+    digest = hashlib.sha256()
+    for part in (password, private_key_path, private_key_content):
+        digest.update(b"\x00" if part is None else b"\x01" + part.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def server_connect_kwargs(server_config: Dict[str, Any], timeout: int = 10) -> Dict[str, Any]:
+    """根据服务器配置（ServerConfig.to_dict()）生成 get_connection 的参数，按认证类型选择凭据"""
+    auth_type = server_config.get("auth_type")
+    return {
+        "host": server_config.get("host"),
+        "user": server_config.get("user"),
+        "port": server_config.get("port") or 22,
+        "password": server_config.get("password") if auth_type == "password" else None,
+        "private_key_path": server_config.get("private_key_path") if auth_type == "key" else None,
+        "private_key_content": server_config.get("private_key_content") if auth_type == "key" else None,
+        "timeout": timeout,
+    }
+
+
+class SSHConnection:
+    """连接池中的一条SSH连接（封装 paramiko.SSHClient）"""
+
+    def __init__(self, manager: "SSHManager", key: PoolKey, connect_kwargs: Dict[str, Any]):
+        self.manager = manager
+        self.key = key
+        self.client: Optional[paramiko.SSHClient] = None
+        self.created_at = 0.0
+        self.last_used = 0.0
+        # 当前打开的 channel 数，大于0时不会被空闲回收
+        self.active_sessions = 0
+        # 正在 get_connection 中取出（检查/重连）该连接的调用数，大于0时不会被空闲回收
+        self.checkouts = 0
+        # 并发 channel 上限，服务器拒绝打开新会话时会自动下调到服务器实际的 MaxSessions
+        self.max_sessions = manager.max_sessions
+        self._connect_kwargs = connect_kwargs
+        self._lock = threading.Lock()
+        self._slots = threading.Condition()
+        # 实测链路吞吐（字节/秒，指数平均），用于决定是否压缩传输
+        self.throughput: Optional[float] = None
+        # 远程最近一次报告的压缩程序（zstd / gzip / none）
+        self.remote_codec: Optional[str] = None
+        # 远程没有压缩程序时改用SSH传输层压缩（没有打开的 channel 时重建连接生效，见 _enable_transport_compression）
+        self.transport_compression = False
+
+    @property
+    def host(self) -> str:
+        return self.key[0]
+
+    @property
+    def transport(self) -> Optional[paramiko.Transport]:
+        return self.client.get_transport() if self.client else None
+
+    def is_alive(self) -> bool:
+        """transport 仍处于活动且已认证状态"""
+        transport = self.transport
+        return bool(transport and transport.is_active() and transport.is_authenticated())
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def connect(self) -> Dict[str, Any]:
+        """建立（或重建）底层连接"""
+        with self._lock:
+            if self.is_alive():
+                return {"success": True, "message": "连接成功", "error": None}
+            self._close_client()
+            client, result = self.manager._open_client(**self._connect_kwargs, compress=self.transport_compression)
+            if client is not None:
+                self.client = client
+                transport = client.get_transport()
+                if transport and self.manager.keepalive_interval:
+                    transport.set_keepalive(self.manager.keepalive_interval)
+                self.created_at = time.monotonic()
+                self.touch()
+            return result
+
+    def ensure_alive(self) -> Dict[str, Any]:
+        """发现连接已断开时自动重连"""
+        if self.is_alive():
+            return {"success": True, "message": "连接成功", "error": None}
+        return self.connect()
+
+    def _acquire_session(self, timeout: Optional[float] = None) -> bool:
+        """占用一个 channel 名额，名额用尽时等待"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._slots:
+            while self.active_sessions >= self.max_sessions:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._slots.wait(remaining)
+            self.active_sessions += 1
+            return True
+
+    def _release_session(self):
+        with self._slots:
+            self.active_sessions -= 1
+            self._slots.notify()
+
+    def open_channel(self) -> paramiko.Channel:
+        """
+        在共享 transport 上打开一个新的 session channel
+
+        超过并发上限时阻塞等待；用完后必须调用 release_channel()
+        """
+        while True:
+            if not self._acquire_session(timeout=self.manager.session_wait_timeout):
+                raise paramiko.SSHException("等待可用SSH会话超时")
+            transport = self.transport
+            try:
+                if transport is None:
+                    raise paramiko.SSHException("未建立连接")
+                return transport.open_session(timeout=self.manager.session_wait_timeout)
+            except paramiko.SSHException:
+                if not self.is_alive():
+                    self._release_session()
+                    raise
+                # transport 正常但 channel 打开失败，说明服务器拒绝了更多会话（超过其 MaxSessions）。
+                # paramiko 在并发打开时不一定抛出 ChannelException，这里统一按拒绝处理：
+                # 把上限下调到其他正在使用的会话数，等有会话结束后重试
+                with self._slots:
+                    others = self.active_sessions - 1
+                    if others > 0:
+                        self.max_sessions = others
+                self._release_session()
+                if others <= 0:
+                    raise
+            except Exception:
+                self._release_session()
+                raise
+
+    def release_channel(self, channel: paramiko.Channel):
+        """关闭 channel 并归还名额"""
+        try:
+            channel.close()
+        finally:
+            self._release_session()
+
+    def test_connection(self) -> Dict[str, Any]:
+        """
+        测试连接是否有效
+
+        Returns:
+            同 SSHManager.test_connection
+        """
+        result = self.execute_command('whoami && hostname')
+        if result.get("success"):
+            return {
+                "success": True,
+                "message": "连接正常",
+                "output": result.get("stdout", "").strip(),
+                "error": None
+            }
+        return {
+            "success": False,
+            "message": "命令执行失败" if result.get("exit_status") is not None else f"测试失败: {result.get('error')}",
+            "output": (result.get("stdout") or "").strip() or None,
+            "error": (result.get("stderr") or "").strip() or result.get("error")
+        }
+
+    def stream_command(
+        self,
+        command: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_bytes: Optional[int] = None,
+        encoding: Optional[str] = "utf-8",
+        timeout: Optional[float] = None,
+    ) -> "CommandStream":
+        """
+        流式执行命令，连接失效时自动重连并重试一次（仅限打开 channel 阶段）
+
+        Args:
+            command: 要执行的命令
+            chunk_size: 每次从 channel 读取的最大字节数
+            max_bytes: 最多保留的输出字节数（stdout+stderr），超出部分读取后丢弃，默认使用管理器配置，为 0 时不限制
+            encoding: 增量解码使用的编码，为 None 时输出原始字节
+            timeout: 命令总超时时间（秒），为 None 时不限制
+
+        Returns:
+            CommandStream，迭代得到 (stream, chunk)
+
+        Raises:
+            paramiko.SSHException 等：无法建立连接或打开 channel
+        """
+        for attempt in range(2):
+            alive = self.ensure_alive()
+            if not alive.get("success"):
+                raise paramiko.SSHException(alive.get("message") or "未建立连接")
+            self.touch()
+            try:
+                channel = self.open_channel()
+            except (paramiko.SSHException, EOFError, OSError):
+                # 连接在使用中断开：重连后重试一次
+                if attempt == 0 and not self.is_alive():
+                    continue
+                raise
+            try:
+                channel.exec_command(command)
+            except Exception:
+                self.release_channel(channel)
+                raise
+            return CommandStream(
+                channel,
+                release=self._release_stream_channel,
+                chunk_size=chunk_size,
+                max_bytes=self.manager.max_output_bytes if max_bytes is None else (max_bytes or None),
+                encoding=encoding,
+                timeout=timeout,
+            )
+
+    def _release_stream_channel(self, channel: paramiko.Channel):
+        self.release_channel(channel)
+        self.touch()
+
+    def execute_command(
+        self,
+        command: str,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        encoding: Optional[str] = "utf-8",
+        compress: bool = False,
+        size_hint: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        在池化连接上执行命令（stream_command 的汇总版本）
+
+        Args:
+            compress: 允许压缩传输 stdout（读取大文件、日志时使用），是否实际压缩按 size_hint 和实测吞吐自动决定
+            size_hint: 预计的输出字节数，未知时为 None
+
+        Returns:
+            同 SSHManager.execute_command，另含 "truncated": 输出是否因超过 max_bytes 被截断；
+            encoding 为 None 时 stdout / stderr 为原始字节；压缩传输时另含 "compression"
+        """
+        if compress and self.transport_compression:
+            self._enable_transport_compression()
+        if compress and self._should_compress(size_hint):
+            return self._execute_compressed(command, max_bytes, timeout, encoding)
+        started = time.monotonic()
+        try:
+            stream = self.stream_command(command, max_bytes=max_bytes, timeout=timeout, encoding=encoding)
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            return {
+                "success": False,
+                "stdout": None,
+                "stderr": None,
+                "exit_status": None,
+                "error": str(e)
+            }
+        result = _collect_stream(stream)
+        self._record_transfer(None, stream.bytes_received, stream.bytes_received, time.monotonic() - started)
+        return result
+
+    def _should_compress(self, size_hint: Optional[int]) -> bool:
+        """按预计输出大小和实测链路吞吐决定是否压缩"""
+        if self.manager.transfer_compression == "off":
+            return False
+        if size_hint is not None and size_hint < self.manager.compress_min_bytes:
+            return False
+        # 远程没有压缩程序时改用传输层压缩，不再包装命令
+        if self.remote_codec == "none":
+            return False
+        return self.throughput is None or self.throughput < self.manager.compress_fast_link_bps
+
+    def _transport_compressed(self) -> bool:
+        transport = self.transport
+        return transport is not None and getattr(transport, "remote_compression", "none") != "none"
+
+    def _enable_transport_compression(self):
+        """
+        重建连接并启用SSH传输层压缩：重连会关闭所有 channel，只在没有打开的 channel 时进行，
+        否则留到下一次压缩传输；服务器不支持传输层压缩时不再尝试
+        """
+        if self._transport_compressed():
+            return
+        with self._slots:
+            if self.active_sessions > 0:
+                return
+            with self._lock:
+                self._close_client()
+            self.connect()
+            if not self._transport_compressed():
+                self.transport_compression = False
+
+    def _record_transfer(self, codec: Optional[str], raw_bytes: int, wire_bytes: int, elapsed: float):
+        """记录一次传输：更新链路吞吐估计和管理器的压缩统计"""
+        if wire_bytes >= THROUGHPUT_SAMPLE_MIN_BYTES and elapsed > 0:
+            sample = wire_bytes / elapsed
+            self.throughput = sample if self.throughput is None else 0.7 * self.throughput + 0.3 * sample
+        if codec is None:
+            transport = self.transport
+            if transport is not None and getattr(transport, "remote_compression", "none") != "none":
+                codec = "transport"
+        self.manager._record_transfer(codec, raw_bytes, wire_bytes)
+
+    def _execute_compressed(
+        self,
+        command: str,
+        max_bytes: Optional[int],
+        timeout: Optional[float],
+        encoding: Optional[str],
+    ) -> Dict[str, Any]:
+        """远程压缩 stdout 后传输，边接收边解压"""
+        started = time.monotonic()
+        try:
+            stream = self.stream_command(
+                build_compressed_script(command, allow_zstd=zstandard is not None),
+                max_bytes=0,
+                timeout=timeout,
+                encoding=None,
+            )
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            return {
+                "success": False,
+                "stdout": None,
+                "stderr": None,
+                "exit_status": None,
+                "error": str(e)
+            }
+
+        limit = self.manager.max_output_bytes if max_bytes is None else (max_bytes or None)
+        stdout_parts: List[bytes] = []
+        stderr_parts: List[bytes] = []
+        captured = 0
+        truncated = False
+        header = b""
+        codec = None
+        decompressor = None
+        try:
+            for name, chunk in stream:
+                if name == "stderr":
+                    stderr_parts.append(chunk)
+                    continue
+                if truncated:
+                    continue
+                if codec is None:
+                    # 第一行是远程选择的压缩程序
+                    header += chunk
+                    newline = header.find(b"\n")
+                    if newline < 0:
+                        continue
+                    codec = header[:newline].decode("ascii", "replace").strip()
+                    chunk = header[newline + 1:]
+                    decompressor = _new_decompressor(codec)
+                data = decompressor.decompress(chunk) if decompressor else chunk
+                if limit is not None and captured + len(data) > limit:
+                    data = data[:max(0, limit - captured)]
+                    truncated = True
+                captured += len(data)
+                if data:
+                    stdout_parts.append(data)
+            if decompressor is not None and not truncated:
+                tail = decompressor.flush()
+                if tail:
+                    stdout_parts.append(tail)
+        except Exception as e:
+            return {
+                "success": False,
+                "stdout": None,
+                "stderr": None,
+                "exit_status": None,
+                "error": f"压缩传输失败: {e}"
+            }
+        finally:
+            stream.close()
+
+        stdout = b"".join(stdout_parts)
+        stderr, exit_status = split_exit_marker(b"".join(stderr_parts))
+        if exit_status is None:
+            exit_status = stream.exit_status
+        self.remote_codec = codec
+        if codec == "none":
+            self.transport_compression = True
+        self._record_transfer(codec if codec != "none" else None, len(stdout), stream.bytes_received, time.monotonic() - started)
+
+        if encoding:
+            stdout = stdout.decode(encoding, "replace")
+            stderr = stderr.decode(encoding, "replace")
+        if stream.timed_out:
+            error = "命令执行超时"
+        elif exit_status != 0:
+            error = stderr if encoding else stderr.decode("utf-8", "replace")
+        else:
+            error = None
+        return {
+            "success": exit_status == 0 and not stream.timed_out,
+            "stdout": stdout,
+            "stderr": stderr,
+            "exit_status": exit_status,
+            "error": error,
+            "truncated": truncated,
+            "compression": codec,
+        }
+
+    def execute_many(self, commands: List[str]) -> List[Dict[str, Any]]:
+        """
+        在同一条连接上并发执行多条命令（每条命令一个 channel，受 max_sessions 限制）
+
+        Returns:
+            与 commands 顺序一致的结果字典列表，格式同 execute_command
+        """
+        if len(commands) <= 1:
+            return [self.execute_command(command) for command in commands]
+        futures = [self.manager._channel_executor.submit(self.execute_command, command) for command in commands]
+        return [future.result() for future in futures]
+
+    def execute_batch(
+        self,
+        commands: Dict[str, str],
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        把多条检查命令合并成一个脚本，在一个 channel 中一次执行完毕
+
+        每条命令在独立的子 shell 中运行，输出用分隔标记包围，执行后再拆分回各自的结果。
+
+        Args:
+            commands: {检查名称: 命令}，按插入顺序执行
+
+        Returns:
+            {
+                "success": bool,          # 脚本是否完整执行（不代表每条检查都成功）
+                "results": {检查名称: 同 execute_command 的结果字典},
+                "exit_status": Optional[int],
+                "error": Optional[str]
+            }
+        """
+        names = list(commands)
+        token = uuid.uuid4().hex
+        exec_result = self.execute_command(
+            build_batch_script([commands[name] for name in names], token),
+            max_bytes=max_bytes,
+            timeout=timeout,
+        )
+        if exec_result.get("stdout") is None:
+            return {
+                "success": False,
+                "results": {},
+                "exit_status": None,
+                "error": exec_result.get("error")
+            }
+        sections = parse_batch_output(
+            exec_result.get("stdout", ""), exec_result.get("stderr", ""), len(names), token
+        )
+        results = dict(zip(names, sections))
+        incomplete = [name for name, section in results.items() if section["exit_status"] is None]
+        return {
+            "success": not incomplete,
+            "results": results,
+            "exit_status": exec_result.get("exit_status"),
+            "error": f"批量命令输出不完整: {', '.join(incomplete)}" if incomplete else None
+        }
+
+    async def aexecute_batch(self, commands: Dict[str, str], **kwargs) -> Dict[str, Any]:
+        """execute_batch 的异步版本"""
+        return await self.manager.run_blocking(self.execute_batch, commands, **kwargs)
+
+    async def aexecute_command(self, command: str, **kwargs) -> Dict[str, Any]:
+        """execute_command 的异步版本"""
+        return await self.manager.run_blocking(self.execute_command, command, **kwargs)
+
+    async def aexecute_many(self, commands: List[str]) -> List[Dict[str, Any]]:
+        """execute_many 的异步版本"""
+        return await self.manager.run_blocking(self.execute_many, commands)
+
+    async def atest_connection(self) -> Dict[str, Any]:
+        """test_connection 的异步版本"""
+        return await self.manager.run_blocking(self.test_connection)
+
+    def _close_client(self):
+        if self.client:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+            self.client = None
+
+    def close(self):
+        """关闭底层连接"""
+        with self._lock:
+            self._close_client()
+
+
+class CommandStream:
+    """
+    流式读取命令输出
+
+    迭代得到 (stream, chunk)：stream 为 "stdout" 或 "stderr"，chunk 为增量解码后的文本
+    （encoding 为 None 时为原始字节）。stdout 与 stderr 交替读取，
+    不会因为某一个管道写满而死锁。迭代结束后可读取 exit_status / truncated / timed_out。
+    """
+
+    def __init__(
+        self,
+        channel: paramiko.Channel,
+        release=None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_bytes: Optional[int] = None,
+        encoding: Optional[str] = "utf-8",
+        timeout: Optional[float] = None,
+    ):
+        self.channel = channel
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.encoding = encoding
+        self.timeout = timeout
+        self.exit_status: Optional[int] = None
+        self.truncated = False
+        self.timed_out = False
+        self.bytes_received = 0
+        self._release = release
+        self._closed = False
+        self._close_lock = threading.Lock()
+        # 不向远程命令提供输入
+        channel.shutdown_write()
+
+    def __iter__(self):
+        return self._iterate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _iterate(self):
+        channel = self.channel
+        decoders = {}
+        if self.encoding:
+            decoders = {
+                "stdout": codecs.getincrementaldecoder(self.encoding)(errors="replace"),
+                "stderr": codecs.getincrementaldecoder(self.encoding)(errors="replace"),
+            }
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        captured = 0
+        try:
+            while True:
+                got_data = False
+                for name, ready, recv in (
+                    ("stdout", channel.recv_ready, channel.recv),
+                    ("stderr", channel.recv_stderr_ready, channel.recv_stderr),
+                ):
+                    if not ready():
+                        continue
+                    data = recv(self.chunk_size)
+                    if not data:
+                        continue
+                    got_data = True
+                    self.bytes_received += len(data)
+                    # 超过最大保留字节数后继续读取（让远程命令正常结束），但丢弃内容
+                    if self.max_bytes is not None:
+                        remaining = self.max_bytes - captured
+                        if remaining <= 0:
+                            self.truncated = True
+                            continue
+                        if len(data) > remaining:
+                            data = data[:remaining]
+                            self.truncated = True
+                    captured += len(data)
+                    chunk = decoders[name].decode(data) if decoders else data
+                    if chunk:
+                        yield name, chunk
+                if got_data:
+                    continue
+
+                if channel.closed or (channel.eof_received and channel.exit_status_ready()):
+                    if not (channel.recv_ready() or channel.recv_stderr_ready()):
+                        break
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.timed_out = True
+                    break
+                wait = 0.5 if deadline is None else max(0.0, min(0.5, deadline - time.monotonic()))
+                select.select([channel], [], [], wait)
+
+            for name, decoder in decoders.items():
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    yield name, tail
+            if not self.timed_out and channel.exit_status_ready():
+                self.exit_status = channel.recv_exit_status()
+        finally:
+            self.close()
+
+    def close(self):
+        """关闭 channel（未读完的输出会被丢弃，可在其他线程调用以中止读取）"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._release:
+            self._release(self.channel)
+        else:
+            self.channel.close()
+
+
+def _collect_stream(stream: CommandStream) -> Dict[str, Any]:
+    """读取完整的流式输出并汇总为标准结果字典"""
+    stdout_parts: List = []
+    stderr_parts: List = []
+    try:
+        for name, chunk in stream:
+            (stdout_parts if name == "stdout" else stderr_parts).append(chunk)
+    except Exception as e:
+        return {
+            "success": False,
+            "stdout": None,
+            "stderr": None,
+            "exit_status": None,
+            "error": str(e)
+        }
+    finally:
+        stream.close()
+
+    empty = "" if stream.encoding else b""
+    stdout_text = empty.join(stdout_parts)
+    stderr_text = empty.join(stderr_parts)
+    exit_status = stream.exit_status
+    if stream.timed_out:
+        error = "命令执行超时"
+    elif exit_status != 0:
+        error = stderr_text if stream.encoding else stderr_text.decode("utf-8", "replace")
+    else:
+        error = None
+
+    return {
+        "success": exit_status == 0,
+        "stdout": stdout_text,
+        "stderr": stderr_text,
+        "exit_status": exit_status,
+        "error": error,
+        "truncated": stream.truncated
+    }
+
+
+# 压缩传输时命令的退出码写在 stderr 末尾（stdout 的退出码是压缩程序的）
+_EXIT_MARKER = "@@exit:"
+_EXIT_MARKER_LINE = re.compile(rb"(?:^|\n)@@exit:(\d+)\n?$")
+
+
+def build_compressed_script(command: str, allow_zstd: bool = False) -> str:
+    """
+    生成压缩传输脚本：第一行输出选择的压缩程序（zstd / gzip / none），之后是压缩后的 stdout
+
+    命令在子 shell 中执行（其中的 exit 不会跳过标记），退出码通过 stderr 末尾的标记传回
+    """
+    choose = "if command -v gzip >/dev/null 2>&1; then z='gzip -1 -c'; c=gzip; else z=cat; c=none; fi"
+    if allow_zstd:
+        choose = "if command -v zstd >/dev/null 2>&1; then z='zstd -1 -q -c'; c=zstd; el" + choose
+    return (
+        f"{choose}; "
+        "printf '%s\\n' \"$c\"; "
+        f"{{ ( {command}\n); echo \"{_EXIT_MARKER}$?\" >&2; }} | $z"
+    )
+
+
+def split_exit_marker(stderr: bytes) -> Tuple[bytes, Optional[int]]:
+    """从 stderr 末尾取出退出码标记，返回 (去掉标记的 stderr, 退出码)"""
+    match = _EXIT_MARKER_LINE.search(stderr)
+    if not match:
+        return stderr, None
+    keep = match.start() + (1 if stderr[match.start():match.start() + 1] == b"\n" else 0)
+    return stderr[:keep], int(match.group(1))
+
+
+def _new_decompressor(codec: str):
+    """按远程选择的压缩程序创建流式解压器，none 时返回 None"""
+    if codec == "gzip":
+        return zlib.decompressobj(wbits=31)
+    if codec == "zstd":
+        if zstandard is None:
+            raise IOError("本地未安装 zstandard，无法解压 zstd 输出")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if codec == "none":
+        return None
+    raise IOError(f"未知的压缩格式: {codec}")
+
+
+def build_batch_script(commands: List[str], token: str) -> str:
+    """
+    生成批量执行脚本
+
+    每条命令前后在 stdout 和 stderr 上各输出一次分隔标记，结束标记中带有该命令的退出码
+    """
+    lines = []
+    for index, command in enumerate(commands):
+        lines.append(f"printf '%s\\n' '{token}:B:{index}'; printf '%s\\n' '{token}:B:{index}' >&2")
+        lines.append("(")
+        lines.append(command)
+        lines.append(")")
+        lines.append("__batch_rc=$?")
+        lines.append(f"printf '\\n%s:%d\\n' '{token}:E:{index}' \"$__batch_rc\"; printf '\\n%s\\n' '{token}:E:{index}' >&2")
+    return "\n".join(lines) + "\n"
+
+
+def parse_batch_output(stdout: str, stderr: str, count: int, token: str) -> List[Dict[str, Any]]:
+    """把 build_batch_script 脚本的输出拆分回每条命令的结果字典（缺少结束标记的 exit_status 为 None）"""
+    results = []
+    for index in range(count):
+        begin = f"{token}:B:{index}\n"
+        out_match = re.search(
+            re.escape(begin) + r"(.*?)\n" + re.escape(f"{token}:E:{index}:") + r"(-?\d+)\n", stdout, re.S
+        )
+        err_match = re.search(
+            re.escape(begin) + r"(.*?)\n" + re.escape(f"{token}:E:{index}") + r"\n", stderr, re.S
+        )
+        if out_match:
+            section_stdout = out_match.group(1)
+            exit_status: Optional[int] = int(out_match.group(2))
+        else:
+            # 没有结束标记：输出被截断或脚本被中断，保留已输出的部分
+            start = stdout.find(begin)
+            section_stdout = stdout[start + len(begin):] if start >= 0 else ""
+            exit_status = None
+        section_stderr = err_match.group(1) if err_match else ""
+        if exit_status is None:
+            error = section_stderr or "命令未执行完成"
+        elif exit_status != 0:
+            error = section_stderr
+        else:
+            error = None
+        results.append({
+            "success": exit_status == 0,
+            "stdout": section_stdout,
+            "stderr": section_stderr,
+            "exit_status": exit_status,
+            "error": error
+        })
+    return results
+
+
+def _run_command(client: paramiko.SSHClient, command: str) -> Dict[str, Any]:
+    """在给定客户端（非池化）上执行命令并返回标准结果字典"""
+    channel = client.get_transport().open_session()
+    try:
+        channel.exec_command(command)
+    except Exception:
+        channel.close()
+        raise
+    return _collect_stream(CommandStream(channel))
+
 
 class SSHManager:
-    """SSH连接管理器"""
-    
-    def __init__(self):
+    """SSH连接管理器（带连接池）"""
+
+    def __init__(
+        self,
+        keepalive_interval: int = DEFAULT_KEEPALIVE_INTERVAL,
+        idle_timeout: int = DEFAULT_IDLE_TIMEOUT,
+        evict_interval: int = DEFAULT_EVICT_INTERVAL,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        session_wait_timeout: int = DEFAULT_SESSION_WAIT_TIMEOUT,
+        channel_workers: int = DEFAULT_CHANNEL_WORKERS,
+        async_workers: int = DEFAULT_ASYNC_WORKERS,
+        key_cache_size: int = DEFAULT_KEY_CACHE_SIZE,
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        transfer_compression: str = DEFAULT_TRANSFER_COMPRESSION,
+        compress_min_bytes: int = DEFAULT_COMPRESS_MIN_BYTES,
+        compress_fast_link_bps: int = DEFAULT_COMPRESS_FAST_LINK_BPS,
+    ):
         self.client: Optional[paramiko.SSHClient] = None
-    
-    def connect(
+        self.keepalive_interval = keepalive_interval
+        self.idle_timeout = idle_timeout
+        self.evict_interval = evict_interval
+        self._evict_task: Optional[asyncio.Task] = None
+        self.max_sessions = max_sessions
+        self.session_wait_timeout = session_wait_timeout
+        self.max_output_bytes = max_output_bytes
+        self.transfer_compression = transfer_compression
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_fast_link_bps = compress_fast_link_bps
+        # 传输统计：按压缩方式（None 为未压缩）累计解压后字节数和实际传输字节数
+        self._transfer_stats: Dict[Optional[str], Dict[str, int]] = {}
+        self._transfer_lock = threading.Lock()
+        self._channel_executor = ThreadPoolExecutor(
+            max_workers=channel_workers, thread_name_prefix="ssh-channel"
+        )
+        # 与 _channel_executor 分开，避免 aexecute_many 中嵌套提交任务时互相占满导致死锁
+        self._async_executor = ThreadPoolExecutor(
+            max_workers=async_workers, thread_name_prefix="ssh-async"
+        )
+        self._pool: Dict[PoolKey, SSHConnection] = {}
+        self._pool_lock = threading.Lock()
+        # 已解析的私钥（LRU）及识别出的密钥类型
+        self.key_cache_size = key_cache_size
+        self._key_cache: "OrderedDict[tuple, paramiko.PKey]" = OrderedDict()
+        self._key_types: Dict[tuple, type] = {}
+        self._key_lock = threading.Lock()
+
+    def _record_transfer(self, codec: Optional[str], raw_bytes: int, wire_bytes: int):
+        with self._transfer_lock:
+            stats = self._transfer_stats.setdefault(codec, {"transfers": 0, "raw_bytes": 0, "wire_bytes": 0})
+            stats["transfers"] += 1
+            stats["raw_bytes"] += raw_bytes
+            stats["wire_bytes"] += wire_bytes
+
+    def transfer_stats(self) -> Dict[str, Any]:
+        """压缩传输统计：各压缩方式的传输次数、解压后字节数、实际传输字节数和节省的字节数"""
+        with self._transfer_lock:
+            snapshot = {codec or "plain": dict(stats) for codec, stats in self._transfer_stats.items()}
+        for stats in snapshot.values():
+            stats["bytes_saved"] = stats["raw_bytes"] - stats["wire_bytes"]
+        compressed = [stats for codec, stats in snapshot.items() if codec != "plain"]
+        raw = sum(stats["raw_bytes"] for stats in compressed)
+        wire = sum(stats["wire_bytes"] for stats in compressed)
+        return {
+            "mode": self.transfer_compression,
+            "zstd_available": zstandard is not None,
+            "bytes_saved": raw - wire,
+            "compression_ratio": round(raw / wire, 3) if wire else None,
+            "by_codec": snapshot,
+        }
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """在SSH专用线程池中执行阻塞函数并等待结果"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._async_executor, functools.partial(func, *args, **kwargs))
+
+    def _load_private_key(
+        self,
+        private_key_path: Optional[str] = None,
+        private_key_content: Optional[str] = None,
+    ) -> Tuple[Optional[paramiko.PKey], Optional[Dict[str, Any]]]:
+        """
+        加载私钥（带缓存）
+
+        解析结果按私钥内容哈希（或文件路径+修改时间+大小）缓存，
+        同时记住识别出的密钥类型，避免每次连接都逐个格式试错和重复执行加密私钥的 KDF。
+
+        Returns:
+            (私钥对象, 失败时的错误结果字典)
+        """
+        try:
+            # 计算缓存键：内容按哈希，文件按路径+修改时间+大小（文件被替换后自动失效）
+            if private_key_content:
+                content_hash = hashlib.sha256(private_key_content.encode("utf-8")).hexdigest()
+                cache_key = ("content", content_hash)
+                type_key = cache_key
+            elif private_key_path and os.path.exists(private_key_path):
+                stat = os.stat(private_key_path)
+                cache_key = ("path", private_key_path, stat.st_mtime_ns, stat.st_size)
+                type_key = ("path", private_key_path)
+            else:
+                return None, {
+                    "success": False,
+                    "message": "私钥文件不存在",
+                    "error": f"Private key file not found: {private_key_path}"
+                }
+
+            with self._key_lock:
+                private_key = self._key_cache.get(cache_key)
+                if private_key is not None:
+                    self._key_cache.move_to_end(cache_key)
+                    return private_key, None
+                known_type = self._key_types.get(type_key)
+
+            # 依次尝试RSA、ECDSA、Ed25519，最后使用通用方法；已知类型优先尝试
+            key_classes = list(_KEY_CLASSES)
+            if known_type in key_classes:
+                key_classes.remove(known_type)
+                key_classes.insert(0, known_type)
+
+            private_key = None
+            last_error = None
+            for key_class in key_classes:
+                try:
+                    if private_key_content:
+                        private_key = key_class.from_private_key(io.StringIO(private_key_content))
+                    else:
+                        private_key = key_class.from_private_key_file(private_key_path)
+                    break
+                except Exception as e:
+                    last_error = e
+
+            if not private_key:
+                if last_error is not None:
+                    raise last_error
+                return None, {
+                    "success": False,
+                    "message": "无法解析私钥格式",
+                    "error": "Unable to parse private key format"
+                }
+
+            with self._key_lock:
+                self._key_types[type_key] = type(private_key)
+                self._key_cache[cache_key] = private_key
+                while len(self._key_cache) > self.key_cache_size:
+                    self._key_cache.popitem(last=False)
+            return private_key, None
+        except Exception as e:
+            return None, {
+                "success": False,
+                "message": f"私钥加载失败: {str(e)}",
+                "error": str(e)
+            }
+
+    def _open_client(
         self,
         host: str,
         user: str,
@@ -23,36 +967,21 @@ class SSHManager:
         password: Optional[str] = None,
         private_key_path: Optional[str] = None,
         private_key_content: Optional[str] = None,
-        timeout: int = 10
-    ) -> Dict[str, Any]:
+        timeout: int = 10,
+        compress: bool = False
+    ) -> Tuple[Optional[paramiko.SSHClient], Dict[str, Any]]:
         """
-        连接到SSH服务器
-        
-        Args:
-            host: 服务器IP或域名
-            user: 用户名
-            port: SSH端口，默认22
-            password: 密码（如果使用密码认证）
-            private_key_path: 私钥文件路径（如果使用密钥认证）
-            private_key_content: 私钥内容（如果使用密钥认证，字符串形式）
-            timeout: 连接超时时间（秒）
-        
+        建立一个新的SSH客户端连接（compress 为 True 时启用SSH传输层压缩）
+
         Returns:
-            {
-                "success": bool,
-                "message": str,
-                "error": Optional[str]
-            }
+            (已连接的客户端或None, 结果字典)
         """
+        client = None
         try:
-            # 关闭已有连接
-            if self.client:
-                self.client.close()
-            
             # 创建SSH客户端
-            self.client = paramiko.SSHClient()
-            self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
             # 准备认证参数
             auth_kwargs = {
                 'hostname': host,
@@ -61,110 +990,249 @@ class SSHManager:
                 'timeout': timeout,
                 'look_for_keys': False,  # 不自动查找密钥
                 'allow_agent': False,    # 不使用SSH agent
+                'compress': compress,
             }
-            
+
             # 优先使用密钥认证
             if private_key_content or private_key_path:
-                try:
-                    private_key = None
-                    
-                    # 从内容或文件加载私钥
-                    if private_key_content:
-                        # 从字符串内容加载，尝试多种密钥格式
-                        key_file = io.StringIO(private_key_content)
-                        try:
-                            # 尝试RSA密钥
-                            private_key = paramiko.RSAKey.from_private_key(key_file)
-                        except:
-                            try:
-                                # 尝试ECDSA密钥
-                                key_file.seek(0)
-                                private_key = paramiko.ECDSAKey.from_private_key(key_file)
-                            except:
-                                try:
-                                    # 尝试Ed25519密钥
-                                    key_file.seek(0)
-                                    private_key = paramiko.Ed25519Key.from_private_key(key_file)
-                                except:
-                                    # 尝试使用通用方法
-                                    key_file.seek(0)
-                                    private_key = paramiko.PKey.from_private_key(key_file)
-                    elif private_key_path and os.path.exists(private_key_path):
-                        # 从文件加载，尝试多种密钥格式
-                        try:
-                            private_key = paramiko.RSAKey.from_private_key_file(private_key_path)
-                        except:
-                            try:
-                                private_key = paramiko.ECDSAKey.from_private_key_file(private_key_path)
-                            except:
-                                try:
-                                    private_key = paramiko.Ed25519Key.from_private_key_file(private_key_path)
-                                except:
-                                    # 使用通用方法
-                                    private_key = paramiko.PKey.from_private_key_file(private_key_path)
-                    else:
-                        return {
-                            "success": False,
-                            "message": "私钥文件不存在",
-                            "error": f"Private key file not found: {private_key_path}"
-                        }
-                    
-                    if private_key:
-                        auth_kwargs['pkey'] = private_key
-                    else:
-                        return {
-                            "success": False,
-                            "message": "无法解析私钥格式",
-                            "error": "Unable to parse private key format"
-                        }
-                except Exception as e:
-                    return {
-                        "success": False,
-                        "message": f"私钥加载失败: {str(e)}",
-                        "error": str(e)
-                    }
+                private_key, error_result = self._load_private_key(private_key_path, private_key_content)
+                if error_result:
+                    client.close()
+                    return None, error_result
+                auth_kwargs['pkey'] = private_key
             elif password:
                 # 使用密码认证
                 auth_kwargs['password'] = password
             else:
-                return {
+                client.close()
+                return None, {
                     "success": False,
                     "message": "请提供密码或私钥",
                     "error": "Either password or private key must be provided"
                 }
-            
+
             # 尝试连接
-            self.client.connect(**auth_kwargs)
-            
-            return {
+            client.connect(**auth_kwargs)
+
+            return client, {
                 "success": True,
                 "message": "连接成功",
                 "error": None
             }
-            
+
         except paramiko.AuthenticationException as e:
-            return {
+            client.close()
+            return None, {
                 "success": False,
                 "message": "认证失败，请检查用户名、密码或密钥",
                 "error": f"Authentication failed: {str(e)}"
             }
         except paramiko.SSHException as e:
-            return {
+            client.close()
+            return None, {
                 "success": False,
                 "message": f"SSH连接错误: {str(e)}",
                 "error": f"SSH error: {str(e)}"
             }
         except Exception as e:
-            return {
+            if client:
+                client.close()
+            return None, {
                 "success": False,
                 "message": f"连接失败: {str(e)}",
                 "error": str(e)
             }
-    
+
+    def get_connection(
+        self,
+        host: str,
+        user: str,
+        port: int = 22,
+        password: Optional[str] = None,
+        private_key_path: Optional[str] = None,
+        private_key_content: Optional[str] = None,
+        timeout: int = 10
+    ) -> Dict[str, Any]:
+        """
+        从连接池中取出一条连接（没有或已失效时自动建立）
+
+        参数同 connect()
+
+        Returns:
+            {
+                "success": bool,
+                "message": str,
+                "error": Optional[str],
+                "connection": Optional[SSHConnection]
+            }
+        """
+        port = int(port or 22)
+        key: PoolKey = (host, port, user, _credential_fingerprint(password, private_key_path, private_key_content))
+        self.evict_idle()
+
+        with self._pool_lock:
+            conn = self._pool.get(key)
+            if conn is None:
+                conn = SSHConnection(self, key, {
+                    "host": host,
+                    "user": user,
+                    "port": port,
+                    "password": password,
+                    "private_key_path": private_key_path,
+                    "private_key_content": private_key_content,
+                    "timeout": timeout,
+                })
+                self._pool[key] = conn
+            # 取出期间（以及交给调用方、尚未打开 channel 时）不会被 evict_idle 回收
+            conn.checkouts += 1
+            conn.touch()
+
+        try:
+            result = conn.ensure_alive()
+            if not result.get("success"):
+                # 建立失败的连接不留在池中
+                with self._pool_lock:
+                    if self._pool.get(key) is conn:
+                        del self._pool[key]
+                return {**result, "connection": None}
+            conn.touch()
+            return {**result, "connection": conn}
+        finally:
+            with self._pool_lock:
+                conn.checkouts -= 1
+
+    async def aget_connection(self, **kwargs) -> Dict[str, Any]:
+        """get_connection 的异步版本，参数同 get_connection"""
+        return await self.run_blocking(self.get_connection, **kwargs)
+
+    def evict_idle(self) -> int:
+        """
+        回收空闲超时或已断开的连接（get_connection 时和后台定时执行，见 start_eviction）
+
+        Returns:
+            被回收的连接数
+        """
+        now = time.monotonic()
+        evicted = []
+        with self._pool_lock:
+            for key, conn in list(self._pool.items()):
+                if conn.client is None or conn.active_sessions > 0 or conn.checkouts > 0:
+                    continue
+                idle = now - conn.last_used
+                if idle > self.idle_timeout or not conn.is_alive():
+                    evicted.append(self._pool.pop(key))
+        for conn in evicted:
+            conn.close()
+        return len(evicted)
+
+    async def start_eviction(self):
+        """启动后台回收任务：没有请求取用连接时，空闲连接也会按时关闭（interval 为 0 时不启动）"""
+        if self.evict_interval <= 0 or self._evict_task is not None:
+            return
+        self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def stop_eviction(self):
+        if self._evict_task is None:
+            return
+        self._evict_task.cancel()
+        try:
+            await self._evict_task
+        except asyncio.CancelledError:
+            pass
+        self._evict_task = None
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(min(self.evict_interval, self.idle_timeout))
+            try:
+                await self.run_blocking(self.evict_idle)
+            except Exception as e:
+                print(f"Error evicting idle SSH connections: {e}")
+
+    def close_all(self):
+        """关闭连接池中的所有连接"""
+        with self._pool_lock:
+            conns = list(self._pool.values())
+            self._pool.clear()
+        for conn in conns:
+            conn.close()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """连接池状态（不包含凭据信息）"""
+        now = time.monotonic()
+        with self._pool_lock:
+            conns = list(self._pool.values())
+        return {
+            "size": len(conns),
+            "connections": [
+                {
+                    "host": conn.key[0],
+                    "port": conn.key[1],
+                    "user": conn.key[2],
+                    "alive": conn.is_alive(),
+                    "active_sessions": conn.active_sessions,
+                    "max_sessions": conn.max_sessions,
+                    "idle_seconds": round(now - conn.last_used, 1),
+                    "age_seconds": round(now - conn.created_at, 1),
+                    "throughput_bps": round(conn.throughput) if conn.throughput else None,
+                    "remote_codec": conn.remote_codec,
+                    "transport_compression": conn.transport_compression,
+                }
+                for conn in conns
+            ],
+            "transfer": self.transfer_stats(),
+        }
+
+    def connect(
+        self,
+        host: str,
+        user: str,
+        port: int = 22,
+        password: Optional[str] = None,
+        private_key_path: Optional[str] = None,
+        private_key_content: Optional[str] = None,
+        timeout: int = 10
+    ) -> Dict[str, Any]:
+        """
+        连接到SSH服务器（独占的非池化连接，新代码请使用 get_connection）
+
+        Args:
+            host: 服务器IP或域名
+            user: 用户名
+            port: SSH端口，默认22
+            password: 密码（如果使用密码认证）
+            private_key_path: 私钥文件路径（如果使用密钥认证）
+            private_key_content: 私钥内容（如果使用密钥认证，字符串形式）
+            timeout: 连接超时时间（秒）
+
+        Returns:
+            {
+                "success": bool,
+                "message": str,
+                "error": Optional[str]
+            }
+        """
+        # 关闭已有连接
+        if self.client:
+            self.client.close()
+            self.client = None
+
+        client, result = self._open_client(
+            host=host,
+            user=user,
+            port=port,
+            password=password,
+            private_key_path=private_key_path,
+            private_key_content=private_key_content,
+            timeout=timeout
+        )
+        self.client = client
+        return result
+
     def test_connection(self) -> Dict[str, Any]:
         """
         测试当前连接是否有效
-        
+
         Returns:
             {
                 "success": bool,
@@ -180,27 +1248,24 @@ class SSHManager:
                 "output": None,
                 "error": "No active connection"
             }
-        
+
         try:
             # 执行简单命令测试连接
-            stdin, stdout, stderr = self.client.exec_command('whoami && hostname')
-            exit_status = stdout.channel.recv_exit_status()
-            output = stdout.read().decode('utf-8').strip()
-            error = stderr.read().decode('utf-8').strip()
-            
-            if exit_status == 0:
+            result = _run_command(self.client, 'whoami && hostname')
+
+            if result["success"]:
                 return {
                     "success": True,
                     "message": "连接正常",
-                    "output": output,
+                    "output": result["stdout"].strip(),
                     "error": None
                 }
             else:
                 return {
                     "success": False,
                     "message": "命令执行失败",
-                    "output": output,
-                    "error": error
+                    "output": result["stdout"].strip(),
+                    "error": result["stderr"].strip()
                 }
         except Exception as e:
             return {
@@ -209,14 +1274,14 @@ class SSHManager:
                 "output": None,
                 "error": str(e)
             }
-    
+
     def execute_command(self, command: str) -> Dict[str, Any]:
         """
         执行SSH命令
-        
+
         Args:
             command: 要执行的命令
-        
+
         Returns:
             {
                 "success": bool,
@@ -234,20 +1299,9 @@ class SSHManager:
                 "exit_status": None,
                 "error": "未建立连接"
             }
-        
+
         try:
-            stdin, stdout, stderr = self.client.exec_command(command)
-            exit_status = stdout.channel.recv_exit_status()
-            stdout_text = stdout.read().decode('utf-8')
-            stderr_text = stderr.read().decode('utf-8')
-            
-            return {
-                "success": exit_status == 0,
-                "stdout": stdout_text,
-                "stderr": stderr_text,
-                "exit_status": exit_status,
-                "error": None if exit_status == 0 else stderr_text
-            }
+            return _run_command(self.client, command)
         except Exception as e:
             return {
                 "success": False,
@@ -256,16 +1310,17 @@ class SSHManager:
                 "exit_status": None,
                 "error": str(e)
             }
-    
+
     def close(self):
-        """关闭SSH连接"""
+        """关闭独占连接（连接池中的连接不受影响）"""
         if self.client:
             self.client.close()
             self.client = None
-    
+
     def __del__(self):
         """析构函数，确保连接被关闭"""
         self.close()
+        self.close_all()
 
 
 # 全局SSH管理器实例
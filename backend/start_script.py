@@ -0,0 +1,302 @@
+"""
+启动脚本解析与缓存
+解析启动脚本中的函数定义，识别其中的服务和依赖；解析结果按服务器、脚本路径缓存，
+远程脚本的修改时间和大小不变时只需一次 stat 往返，内容相同的脚本只解析一次
+"""
+import hashlib
+import re
+import shlex
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+from script_graph import analyze_script, library_script
+
+
+# 最多缓存的不同脚本内容（按内容哈希）
+SCRIPT_CACHE_SIZE = 64
+
+_FUNCTION_PATTERN = re.compile(r'^(\w+)\(\)\s*\{')
+
+# 函数名关键词 -> 服务信息
+_SERVICE_KEYWORDS = {
+    'postgresql': {'name': 'PostgreSQL', 'type': 'dependency'},
+    'backend': {'name': 'Backend', 'type': 'service'},
+    'frontend': {'name': 'Frontend', 'type': 'service'},
+    'nginx': {'name': 'Nginx', 'type': 'service'},
+    'judge': {'name': 'Judge Server', 'type': 'service'},
+    'heartbeat': {'name': 'Heartbeat Monitor', 'type': 'service'},
+    'scratch': {'name': 'Scratch Runner', 'type': 'service'},
+}
+
+# 启动命令和检查命令的匹配规则（按顺序取第一个匹配）
+_START_PATTERNS = [
+    re.compile(r'(nohup\s+[^\n&]+)', re.MULTILINE),
+    re.compile(r'(python3\s+[^\n&]+)', re.MULTILINE),
+    re.compile(r'(npm\s+run\s+[^\n&]+)', re.MULTILINE),
+    re.compile(r'(service\s+\w+\s+start)', re.MULTILINE),
+    re.compile(r'(sudo\s+service\s+\w+\s+start)', re.MULTILINE),
+]
+_CHECK_PATTERNS = [
+    re.compile(r'(pg_isready[^\n]+)', re.MULTILINE),
+    re.compile(r'(curl\s+[^\n]+)', re.MULTILINE),
+    re.compile(r'(ps\s+aux\s+\|\s+grep[^\n]+)', re.MULTILINE),
+    re.compile(r'(check_port\s+\d+)', re.MULTILINE),
+]
+
+_STAT_HEADER = re.compile(rb"^@@stat:(\d+):(\d+)\n")
+_MISSING_HEADER = b"@@missing\n"
+
+
+def _first_match(patterns: List[re.Pattern], content: str) -> Optional[str]:
+    for pattern in patterns:
+        match = pattern.search(content)
+        if match:
+            return match.group(1).strip()
+    return None
+
+
+# 解析启动脚本，提取服务和依赖
+def parse_start_script(script_content: str) -> Dict[str, Any]:
+    """
+    解析启动脚本，提取服务和依赖信息
+    返回格式：
+    {
+        "services": [
+            {"name": "PostgreSQL", "type": "dependency", "start_command": "...", "stop_command": "...", "check_command": "..."},
+            {"name": "Backend", "type": "service", "start_command": "...", "stop_command": "...", "check_command": "..."}
+        ],
+        "dependencies": [...],
+        "functions": [...],
+        "graph": {"nodes", "edges", "order", "levels", "warnings"}  # 服务依赖图，见 script_graph.analyze_script
+    }
+    """
+    services = []
+    dependencies = []
+
+    # 解析函数定义
+    functions = {}
+    current_function = None
+    current_content = []
+
+    for line in script_content.split('\n'):
+        func_match = _FUNCTION_PATTERN.match(line.strip())
+        if func_match:
+            if current_function:
+                functions[current_function] = '\n'.join(current_content)
+            current_function = func_match.group(1)
+            current_content = []
+        elif current_function:
+            current_content.append(line)
+
+    if current_function:
+        functions[current_function] = '\n'.join(current_content)
+
+    # 识别服务和依赖
+    for func_name, func_content in functions.items():
+        func_lower = func_name.lower()
+        for keyword, info in _SERVICE_KEYWORDS.items():
+            if keyword in func_lower:
+                service_info = {
+                    "name": info['name'],
+                    "type": info['type'],
+                    "function_name": func_name,
+                    "start_command": _first_match(_START_PATTERNS, func_content),
+                    "check_command": _first_match(_CHECK_PATTERNS, func_content),
+                }
+
+                if info['type'] == 'dependency':
+                    dependencies.append(service_info)
+                else:
+                    services.append(service_info)
+                break
+
+    try:
+        graph = analyze_script(
+            script_content,
+            {info["function_name"]: info["name"] for info in dependencies + services},
+        )
+    except Exception as e:
+        print(f"Error analyzing start script dependencies: {e}")
+        graph = None
+
+    return {
+        "services": services,
+        "dependencies": dependencies,
+        "functions": list(functions.keys()),
+        "graph": graph
+    }
+
+
+def find_script_service(parsed: Optional[Dict[str, Any]], service_name: str) -> Optional[Dict[str, Any]]:
+    """在解析结果中按显示名称或函数名查找服务（不区分大小写）"""
+    if not parsed:
+        return None
+    name_lower = service_name.lower()
+    for service in parsed["dependencies"] + parsed["services"]:
+        if name_lower in (service["name"].lower(), service["function_name"].lower()):
+            return service
+    return None
+
+
+_CHECK_PORT = re.compile(r'^check_port\s+(\d+)$')
+
+
+def script_check_command(service: Dict[str, Any]) -> Optional[str]:
+    """
+    把解析出的检查命令转换为可以单独执行的命令
+
+    check_port 是启动脚本内定义的函数，脱离脚本无法执行，改为直接检查监听端口
+    """
+    command = service.get("check_command")
+    if not command:
+        return None
+    match = _CHECK_PORT.match(command)
+    if match:
+        port = match.group(1)
+        return f"if (ss -ltn 2>/dev/null || netstat -ltn 2>/dev/null) | grep -qE ':{port}\\s'; then echo 'RUNNING'; else echo 'NOT_RUNNING'; fi"
+    return command
+
+
+def build_fetch_script(path: str, known_stat: Optional[Tuple[int, int]]) -> str:
+    """
+    生成读取脚本：第一行输出 @@stat:<修改时间>:<大小>（文件不存在时为 @@missing），
+    修改时间和大小与 known_stat 不同时再输出文件内容
+    """
+    quoted = shlex.quote(path)
+    known = f"{known_stat[0]}:{known_stat[1]}" if known_stat else ""
+    return (
+        f"s=$(stat -L -c '%Y:%s' -- {quoted} 2>/dev/null) || {{ echo '@@missing'; exit 0; }}; "
+        "echo \"@@stat:$s\"; "
+        f"[ \"$s\" = '{known}' ] || cat -- {quoted}"
+    )
+
+
+class StartScriptCache:
+    """
+    启动脚本解析结果缓存
+
+    (服务器ID, 脚本路径) -> 远程文件的 (修改时间, 大小) 和内容哈希；内容哈希 -> 解析结果。
+    load() 每次只做一次往返：stat 未变化时远程不输出内容，直接复用解析结果；
+    内容变化时重新传输，哈希相同（例如只是 touch）时仍复用之前的解析结果
+    """
+
+    def __init__(self, max_entries: int = SCRIPT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._files: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._parsed: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 内容哈希 -> 只含函数定义和变量赋值的脚本（按函数单独启动服务时使用）
+        self._libraries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.parses = 0
+
+    def _parse(self, content: str) -> Tuple[str, Dict[str, Any]]:
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._lock:
+            parsed = self._parsed.get(digest)
+            if parsed is not None:
+                self._parsed.move_to_end(digest)
+                return digest, parsed
+        parsed = parse_start_script(content)
+        library = library_script(content)
+        with self._lock:
+            self.parses += 1
+            self._parsed[digest] = parsed
+            self._libraries[digest] = library
+            while len(self._parsed) > self.max_entries:
+                evicted, _ = self._parsed.popitem(last=False)
+                self._libraries.pop(evicted, None)
+        return digest, parsed
+
+    def load(self, conn, server_id: str, path: str) -> Dict[str, Any]:
+        """
+        读取并解析远程启动脚本（阻塞调用）
+
+        Returns:
+            {
+                "success": bool,
+                "missing": bool,          # 脚本不存在
+                "parsed": Optional[dict], # parse_start_script 的结果
+                "sha256": Optional[str],
+                "cached": bool,           # 脚本未变化，没有重新传输
+                "error": Optional[str]
+            }
+        """
+        key = (server_id, path)
+        with self._lock:
+            entry = self._files.get(key)
+            known_stat = entry["stat"] if entry and entry["sha256"] in self._parsed else None
+
+        exec_result = conn.execute_command(build_fetch_script(path, known_stat), encoding=None)
+        stdout = exec_result.get("stdout") or b""
+        result = {"success": False, "missing": False, "parsed": None, "sha256": None, "cached": False, "error": None}
+        if stdout.startswith(_MISSING_HEADER):
+            self.invalidate(server_id, path)
+            result["missing"] = True
+            result["error"] = f"启动脚本不存在: {path}"
+            return result
+        header = _STAT_HEADER.match(stdout)
+        if not header or not exec_result.get("success"):
+            error = exec_result.get("error")
+            result["error"] = (error.decode("utf-8", "replace") if isinstance(error, bytes) else error) or "读取启动脚本失败"
+            return result
+
+        stat = (int(header.group(1)), int(header.group(2)))
+        if known_stat == stat:
+            with self._lock:
+                parsed = self._parsed.get(entry["sha256"])
+                if parsed is not None:
+                    self.hits += 1
+                    entry["checked_at"] = time.time()
+            if parsed is None:
+                # 解析结果刚被淘汰，重新读取内容
+                self.invalidate(server_id, path)
+                return self.load(conn, server_id, path)
+            result.update(success=True, parsed=parsed, sha256=entry["sha256"], cached=True)
+            return result
+
+        content = stdout[header.end():].decode("utf-8", "replace")
+        digest, parsed = self._parse(content)
+        with self._lock:
+            self.misses += 1
+            self._files[key] = {"stat": stat, "sha256": digest, "checked_at": time.time()}
+        result.update(success=True, parsed=parsed, sha256=digest)
+        return result
+
+    def peek(self, server_id: str, path: Optional[str]) -> Optional[Dict[str, Any]]:
+        """不访问远程，直接返回上次的解析结果（可能已过期），没有时返回 None"""
+        if not path:
+            return None
+        with self._lock:
+            entry = self._files.get((server_id, path))
+            return self._parsed.get(entry["sha256"]) if entry else None
+
+    def library(self, sha256: str) -> Optional[str]:
+        """load() 返回的内容哈希对应的函数库脚本，见 script_graph.library_script"""
+        with self._lock:
+            return self._libraries.get(sha256)
+
+    def invalidate(self, server_id: str, path: Optional[str] = None) -> bool:
+        """删除服务器（或其中一个脚本路径）的缓存，返回是否删除了记录"""
+        with self._lock:
+            keys = [key for key in self._files if key[0] == server_id and (path is None or key[1] == path)]
+            for key in keys:
+                del self._files[key]
+        return bool(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "parsed": len(self._parsed),
+                "hits": self.hits,
+                "misses": self.misses,
+                "parses": self.parses,
+            }
+
+
+# 全局启动脚本缓存实例
+start_script_cache = StartScriptCache()
@@ -0,0 +1,303 @@
+"""
+后台状态轮询
+定期检查每台激活服务器的整体状态和已知服务状态，把最新结果保存在内存快照中，
+读接口直接返回快照，避免多人同时打开页面时反复对同一台服务器执行相同的检查命令
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Optional, Dict, Any, List
+
+from ssh_manager import ssh_manager, server_connect_kwargs
+from service_status import STATUS_CHECK_COMMANDS, known_services, build_service_checks, collect_service_results
+
+
+# 轮询间隔（秒），为 0 时关闭后台轮询
+STATUS_POLL_INTERVAL = float(os.getenv("STATUS_POLL_INTERVAL", "30"))
+# 抖动比例：每轮间隔在 interval*(1±jitter) 之间随机，各服务器的检查也在该范围内错开
+STATUS_POLL_JITTER = float(os.getenv("STATUS_POLL_JITTER", "0.2"))
+# 同时检查的服务器数量
+STATUS_POLL_CONCURRENCY = int(os.getenv("STATUS_POLL_CONCURRENCY", "8"))
+# 单次检查脚本的超时时间（秒）
+STATUS_PROBE_TIMEOUT = 30
+# 全量检查（/api/fleet/status）的整体截止时间（秒）和并发数
+FLEET_STATUS_DEADLINE = float(os.getenv("FLEET_STATUS_DEADLINE", "8"))
+FLEET_STATUS_WORKERS = int(os.getenv("FLEET_STATUS_WORKERS", "16"))
+
+
+def _list_active_servers() -> List[Dict[str, Any]]:
+    """读取所有激活的服务器配置"""
+    from database import SessionLocal
+    from models import ServerConfig
+
+    session = SessionLocal()
+    try:
+        servers = session.query(ServerConfig).filter(ServerConfig.is_active == True).all()
+        return [server.to_dict() for server in servers]
+    finally:
+        session.close()
+
+
+def probe_server(server_config: Dict[str, Any], timeout: float = STATUS_PROBE_TIMEOUT) -> Dict[str, Any]:
+    """
+    检查一台服务器：整体状态检查和所有已知服务的状态检查合并为一次批量执行
+
+    Returns:
+        {
+            "server_id": str,
+            "success": bool,
+            "error": Optional[str],
+            "updated_at": float,       # 检查完成的时间戳
+            "status": Optional[dict],  # 同 /api/status 的返回内容
+            "services": {服务标识: {"service_name", "success", "status", "output"}}
+        }
+    """
+    server_id = server_config.get("server_id")
+    snapshot = {
+        "server_id": server_id,
+        "success": False,
+        "error": None,
+        "updated_at": time.time(),
+        "status": None,
+        "services": {},
+    }
+
+    result = ssh_manager.get_connection(**server_connect_kwargs(server_config))
+    if not result.get("success"):
+        snapshot["error"] = f"SSH连接失败: {result.get('message')}"
+        snapshot["status"] = {"success": False, "error": snapshot["error"]}
+        return snapshot
+    conn = result["connection"]
+
+    project_path = server_config.get("project_path", "")
+    commands = {
+        f"check_{index}": f"cd {project_path} && {cmd}" for index, cmd in enumerate(STATUS_CHECK_COMMANDS)
+    }
+    service_commands, checks = build_service_checks(project_path, list(known_services().values()))
+    commands.update(service_commands)
+
+    batch_result = conn.execute_batch(commands, timeout=timeout)
+    results = batch_result.get("results", {})
+    if not results:
+        snapshot["error"] = batch_result.get("error") or "状态检查失败"
+        snapshot["status"] = {"success": False, "error": snapshot["error"]}
+        snapshot["updated_at"] = time.time()
+        return snapshot
+
+    all_output = []
+    for index in range(len(STATUS_CHECK_COMMANDS)):
+        exec_result = results.get(f"check_{index}", {})
+        if exec_result.get("success"):
+            all_output.append(exec_result.get("stdout", ""))
+    snapshot["status"] = {"success": True, "stdout": "\n".join(all_output), "server_id": server_id}
+
+    for service_name, service in collect_service_results(checks, batch_result).items():
+        # 没有拿到结果的服务不写入快照，读取时会回退到实时检查
+        if service["status"] != "unknown":
+            snapshot["services"][service["service_key"]] = _snapshot_entry(service_name, service)
+
+    snapshot["success"] = batch_result.get("success", False)
+    snapshot["error"] = batch_result.get("error")
+    snapshot["updated_at"] = time.time()
+    return snapshot
+
+
+def _snapshot_entry(service_name: str, service: Dict[str, Any]) -> Dict[str, Any]:
+    """快照中保存的单个服务状态"""
+    return {
+        "service_name": service_name,
+        "success": service["success"],
+        "status": service["status"],
+        "output": service["output"],
+        "pids": service.get("pids", []),
+        "ports": service.get("ports", []),
+        "containers": service.get("containers", []),
+    }
+
+
+class StatusPoller:
+    """后台状态轮询器"""
+
+    def __init__(
+        self,
+        interval: float = STATUS_POLL_INTERVAL,
+        jitter: float = STATUS_POLL_JITTER,
+        concurrency: int = STATUS_POLL_CONCURRENCY,
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._background: set = set()
+
+    def get(self, server_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取服务器的最新快照
+
+        Returns:
+            快照字典（附带 age_seconds 和 stale），没有快照时返回 None
+        """
+        snapshot = self._snapshots.get(server_id)
+        if not snapshot:
+            return None
+        age = time.time() - snapshot["updated_at"]
+        # 超过两个轮询周期未更新视为过期
+        stale_after = self.interval * 2 if self.interval > 0 else 0
+        return {
+            **snapshot,
+            "services": dict(snapshot["services"]),
+            "age_seconds": round(age, 1),
+            "stale": age > stale_after,
+        }
+
+    def update(self, snapshot: Dict[str, Any]):
+        """保存快照"""
+        self._snapshots[snapshot["server_id"]] = snapshot
+
+    def invalidate_service(self, server_id: str, service_key: str):
+        """服务被启动/停止后，丢弃快照中该服务的旧状态"""
+        snapshot = self._snapshots.get(server_id)
+        if snapshot:
+            snapshot["services"].pop(service_key, None)
+
+    def update_services(self, server_id: str, services: Dict[str, Dict[str, Any]]):
+        """用实时检查的结果刷新快照中已知服务的状态（没有快照时不创建）"""
+        snapshot = self._snapshots.get(server_id)
+        if not snapshot:
+            return
+        for service_name, service in services.items():
+            if service.get("service_key") in known_services() and service.get("status") != "unknown":
+                snapshot["services"][service["service_key"]] = _snapshot_entry(service_name, service)
+
+    async def probe(self, server_config: Dict[str, Any], timeout: float = STATUS_PROBE_TIMEOUT) -> Dict[str, Any]:
+        """立即检查一台服务器并更新快照"""
+        snapshot = await ssh_manager.run_blocking(probe_server, server_config, timeout)
+        self.update(snapshot)
+        return snapshot
+
+    async def probe_fleet(
+        self,
+        servers: Optional[List[Dict[str, Any]]] = None,
+        deadline: float = FLEET_STATUS_DEADLINE,
+        workers: int = FLEET_STATUS_WORKERS,
+    ) -> Dict[str, Any]:
+        """
+        并发检查多台服务器（默认所有激活的服务器）
+
+        最多同时检查 workers 台，整体耗时不超过 deadline 秒；截止时仍未返回的服务器
+        标记为 timed_out，并附上该服务器上一次的快照（如果有），不会拖慢其他服务器的结果
+
+        Returns:
+            {
+                "success": bool,           # 所有服务器都在截止时间内检查成功
+                "elapsed": float,
+                "deadline": float,
+                "timed_out": [server_id],
+                "servers": {server_id: 快照 + {"timed_out": bool}}
+            }
+        """
+        started = time.monotonic()
+        if servers is None:
+            servers = await ssh_manager.run_blocking(_list_active_servers)
+        semaphore = asyncio.Semaphore(max(1, workers))
+
+        async def probe_one(server_config: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                # 命令超时不超过剩余的截止时间
+                remaining = deadline - (time.monotonic() - started)
+                try:
+                    return await self.probe(server_config, timeout=max(1.0, remaining))
+                except Exception as e:
+                    print(f"Error probing server {server_config.get('server_id')}: {e}")
+                    return {
+                        "server_id": server_config.get("server_id"),
+                        "success": False,
+                        "error": f"状态检查失败: {e}",
+                        "updated_at": time.time(),
+                        "status": None,
+                        "services": {},
+                    }
+
+        tasks = {asyncio.create_task(probe_one(server)): server["server_id"] for server in servers}
+        done, pending = (await asyncio.wait(tasks, timeout=deadline)) if tasks else (set(), set())
+        for task in pending:
+            # 不取消未完成的检查：它们在后台跑完后仍会更新快照，下次读取即可拿到结果
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        results = {}
+        timed_out = []
+        for task, server_id in tasks.items():
+            if task in done:
+                results[server_id] = {**task.result(), "timed_out": False}
+                continue
+            timed_out.append(server_id)
+            previous = self.get(server_id)
+            results[server_id] = {
+                "server_id": server_id,
+                "success": False,
+                "error": f"状态检查超时（{deadline}秒）",
+                "timed_out": True,
+                "updated_at": previous["updated_at"] if previous else None,
+                "status": previous["status"] if previous else None,
+                "services": previous["services"] if previous else {},
+                "age_seconds": previous["age_seconds"] if previous else None,
+                "stale": True,
+            }
+
+        return {
+            "success": all(result.get("success") for result in results.values()),
+            "elapsed": round(time.monotonic() - started, 3),
+            "deadline": deadline,
+            "timed_out": timed_out,
+            "servers": results,
+        }
+
+    async def start(self):
+        """启动后台轮询任务（interval 为 0 时不启动）"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台轮询任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _probe_staggered(self, server_config: Dict[str, Any], semaphore: asyncio.Semaphore):
+        # 各服务器的检查在抖动范围内错开，避免同时打到所有主机
+        await asyncio.sleep(random.uniform(0, self.interval * self.jitter))
+        async with semaphore:
+            try:
+                await self.probe(server_config)
+            except Exception as e:
+                print(f"Error polling server {server_config.get('server_id')}: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                servers = await ssh_manager.run_blocking(_list_active_servers)
+                active_ids = {server["server_id"] for server in servers}
+                for server_id in list(self._snapshots):
+                    if server_id not in active_ids:
+                        del self._snapshots[server_id]
+
+                semaphore = asyncio.Semaphore(self.concurrency)
+                await asyncio.gather(*(self._probe_staggered(server, semaphore) for server in servers))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in status poller: {e}")
+            await asyncio.sleep(self.interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+# 全局状态轮询实例
+status_poller = StatusPoller()
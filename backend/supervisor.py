@@ -0,0 +1,292 @@
+"""
+本地服务守护
+本地服务由后端直接启动并保留进程句柄（PID、进程组、启动时间、日志文件），
+状态、停止和重启直接作用于记录的进程组，不再用 pkill -f / ss 按命令行和端口查找；
+后台循环回收退出的子进程，异常退出的服务按退避策略自动重启，资源占用从 /proc 读取
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+from local_probe import pid_alive, process_tree, process_usage
+
+
+# 检查子进程状态的间隔（秒）
+SUPERVISOR_INTERVAL = float(os.getenv("SUPERVISOR_INTERVAL", "1"))
+# 异常退出后自动重启的初始等待和最大等待（秒），连续异常退出时每次翻倍
+SUPERVISOR_BACKOFF = float(os.getenv("SUPERVISOR_BACKOFF", "1"))
+SUPERVISOR_MAX_BACKOFF = float(os.getenv("SUPERVISOR_MAX_BACKOFF", "60"))
+# 运行超过该时间（秒）后退出不再计入连续异常退出
+SUPERVISOR_STABLE_SECONDS = float(os.getenv("SUPERVISOR_STABLE_SECONDS", "30"))
+# 连续异常退出超过该次数后不再自动重启
+SUPERVISOR_MAX_RESTARTS = int(os.getenv("SUPERVISOR_MAX_RESTARTS", "10"))
+# 停止时 SIGTERM 之后等待进程组退出的时间（秒），超时后发送 SIGKILL
+SUPERVISOR_STOP_TIMEOUT = float(os.getenv("SUPERVISOR_STOP_TIMEOUT", "10"))
+
+
+def foreground_command(command: str) -> str:
+    """去掉命令末尾的后台运行符（& / & disown），由守护进程直接持有前台进程"""
+    command = command.rstrip()
+    if command.endswith("disown"):
+        command = command[:-len("disown")].rstrip()
+    if command.endswith("&") and not command.endswith("&&"):
+        command = command[:-1].rstrip()
+    return command
+
+
+class SupervisedProcess:
+    """一个受守护的本地服务"""
+
+    def __init__(self, key: str, command: str, cwd: Optional[str], log_file: str, autorestart: bool = True):
+        self.key = key
+        self.command = command
+        self.cwd = cwd
+        self.log_file = log_file
+        self.autorestart = autorestart
+        self.popen: Optional[subprocess.Popen] = None
+        self.log_fd: Optional[int] = None
+        # running / stopping / stopped / exited / backoff / failed
+        self.state = "stopped"
+        self.started_at: Optional[float] = None
+        self.exited_at: Optional[float] = None
+        self.exit_code: Optional[int] = None
+        self.restarts = 0
+        # 连续异常退出次数（用于计算退避时间）
+        self.crashes = 0
+        self.next_restart_at: Optional[float] = None
+        self._cpu_sample: Optional[tuple] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.popen.pid if self.popen else None
+
+    @property
+    def running(self) -> bool:
+        return self.popen is not None and self.popen.poll() is None
+
+    def spawn(self):
+        """启动进程：新建会话（进程组ID即PID），标准输出和错误追加到日志文件"""
+        self.log_fd = os.open(self.log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            self.popen = subprocess.Popen(
+                ["/bin/bash", "--noprofile", "--norc", "-c", "unset NPM_CONFIG_PREFIX NPM_CONFIG_GLOBALCONFIG 2>/dev/null; " + self.command],
+                cwd=self.cwd or None,
+                stdin=subprocess.DEVNULL,
+                stdout=self.log_fd,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        except Exception:
+            self._close_log()
+            raise
+        self.state = "running"
+        self.started_at = time.time()
+        self.exited_at = None
+        self.exit_code = None
+        self.next_restart_at = None
+        self._cpu_sample = None
+
+    def _close_log(self):
+        if self.log_fd is not None:
+            os.close(self.log_fd)
+            self.log_fd = None
+
+    def reap(self) -> bool:
+        """回收已退出的进程，返回本次是否回收了进程"""
+        if self.popen is None or self.exited_at is not None:
+            return False
+        code = self.popen.poll()
+        if code is None:
+            return False
+        self.exit_code = code
+        self.exited_at = time.time()
+        self._close_log()
+        return True
+
+    def signal_group(self, signum: int):
+        if self.popen is None:
+            return
+        try:
+            os.killpg(self.popen.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def group_alive(self) -> bool:
+        """进程组中是否还有进程（主进程退出后子进程可能仍在运行）"""
+        if self.popen is None:
+            return False
+        try:
+            os.killpg(self.popen.pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def usage(self) -> Optional[Dict[str, Any]]:
+        """进程树的资源占用；cpu_percent 为与上次读取之间的平均 CPU 使用率"""
+        if not self.running:
+            return None
+        usage = process_usage(process_tree(self.popen.pid))
+        now = time.monotonic()
+        if self._cpu_sample:
+            elapsed = now - self._cpu_sample[1]
+            usage["cpu_percent"] = round(max(usage["cpu_seconds"] - self._cpu_sample[0], 0) / elapsed * 100, 1) if elapsed > 0 else None
+        else:
+            usage["cpu_percent"] = None
+        self._cpu_sample = (usage["cpu_seconds"], now)
+        return usage
+
+    def to_dict(self, usage: bool = False) -> Dict[str, Any]:
+        data = {
+            "service_key": self.key,
+            "state": self.state,
+            "pid": self.pid,
+            "pgid": self.pid,
+            "command": self.command,
+            "cwd": self.cwd,
+            "log_file": self.log_file,
+            "autorestart": self.autorestart,
+            "started_at": self.started_at,
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at and self.state == "running" else None,
+            "exit_code": self.exit_code,
+            "exited_at": self.exited_at,
+            "restarts": self.restarts,
+            "crashes": self.crashes,
+            "next_restart_at": self.next_restart_at,
+        }
+        if usage:
+            data["usage"] = self.usage()
+        return data
+
+
+class LocalSupervisor:
+    """本地服务守护：服务标识 -> 受守护的进程"""
+
+    def __init__(self, interval: float = SUPERVISOR_INTERVAL):
+        self.interval = interval
+        self.processes: "OrderedDict[str, SupervisedProcess]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, key: str) -> Optional[SupervisedProcess]:
+        return self.processes.get(key)
+
+    def running(self, key: str) -> bool:
+        process = self.processes.get(key)
+        return process is not None and process.state == "running" and process.running
+
+    def spawn(self, key: str, command: str, cwd: Optional[str] = None, log_file: Optional[str] = None, autorestart: bool = True) -> SupervisedProcess:
+        """
+        启动服务并开始守护（command 中末尾的 & 会被去掉，进程在前台运行）
+        已在运行时直接返回现有进程
+        """
+        process = self.processes.get(key)
+        if process is not None and process.running:
+            return process
+        process = SupervisedProcess(
+            key, foreground_command(command), cwd,
+            log_file or f"/tmp/opsdashboard_{key}.log", autorestart=autorestart,
+        )
+        if key in self.processes:
+            process.restarts = self.processes[key].restarts
+        process.spawn()
+        self.processes[key] = process
+        return process
+
+    async def terminate(self, key: str, timeout: float = SUPERVISOR_STOP_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """
+        停止服务：对进程组发送 SIGTERM，超时后发送 SIGKILL，并回收主进程
+        不在守护中时返回 None
+
+        Returns:
+            {"stopped": bool, "forced": bool, "pid": int, "stop_seconds": float}
+        """
+        process = self.processes.get(key)
+        if process is None or process.popen is None:
+            return None
+        started = time.monotonic()
+        pid = process.pid
+        process.state = "stopping"
+        process.next_restart_at = None
+        process.signal_group(signal.SIGTERM)
+        deadline = started + timeout
+        interval = 0.02
+        while (process.popen.poll() is None or process.group_alive()) and time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, 0.5)
+        forced = process.popen.poll() is None or process.group_alive()
+        if forced:
+            process.signal_group(signal.SIGKILL)
+            await asyncio.to_thread(process.popen.wait)
+        process.reap()
+        process.state = "stopped"
+        return {
+            "stopped": not process.group_alive() and not pid_alive(pid),
+            "forced": forced,
+            "pid": pid,
+            "stop_seconds": round(time.monotonic() - started, 3),
+        }
+
+    def status(self, key: str, usage: bool = True) -> Optional[Dict[str, Any]]:
+        process = self.processes.get(key)
+        return process.to_dict(usage=usage) if process else None
+
+    def list(self, usage: bool = True) -> List[Dict[str, Any]]:
+        return [process.to_dict(usage=usage) for process in self.processes.values()]
+
+    def check(self):
+        """回收退出的子进程，异常退出的服务按退避策略安排或执行重启"""
+        now = time.time()
+        for process in self.processes.values():
+            if process.state == "running" and process.reap():
+                stable = process.exited_at - (process.started_at or process.exited_at) >= SUPERVISOR_STABLE_SECONDS
+                process.crashes = 1 if stable else process.crashes + 1
+                print(f"Local service {process.key} exited with code {process.exit_code} (crash #{process.crashes})")
+                if not process.autorestart:
+                    process.state = "exited"
+                elif process.crashes > SUPERVISOR_MAX_RESTARTS:
+                    process.state = "failed"
+                else:
+                    process.state = "backoff"
+                    delay = min(SUPERVISOR_BACKOFF * 2 ** (process.crashes - 1), SUPERVISOR_MAX_BACKOFF)
+                    process.next_restart_at = now + delay
+            elif process.state == "backoff" and process.next_restart_at is not None and now >= process.next_restart_at:
+                try:
+                    process.spawn()
+                    process.restarts += 1
+                except Exception as e:
+                    print(f"Error restarting local service {process.key}: {e}")
+                    process.state = "failed"
+
+    async def start(self):
+        """启动后台检查任务（interval 为 0 时不启动）"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台检查任务（受守护的服务继续运行）"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error in local supervisor: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# 全局本地服务守护实例
+local_supervisor = LocalSupervisor()
@@ -0,0 +1,66 @@
+"""local_probe 检查命令解析的测试"""
+from local_probe import LocalSnapshot, evaluate_check, native_check
+
+
+def _snapshot(lines, ports=()):
+    snapshot = LocalSnapshot.__new__(LocalSnapshot)
+    snapshot.taken_at = 0
+    snapshot.ports = set(ports)
+    snapshot.lines = dict(lines)
+    return snapshot
+
+
+def test_ps_grep_single_quotes():
+    check = native_check("ps aux | grep -E 'heartbeat_metaseek_judge\\.py' | grep -v grep || echo 'NOT_RUNNING'")
+    assert check["process"].pattern == "heartbeat_metaseek_judge\\.py"
+    assert check["exclude"] == ("grep",)
+    assert check["port"] is None
+
+
+def test_ps_grep_double_quotes_and_excludes():
+    check = native_check('ps aux | grep -E "vite.*8080\\\\|x" | grep -v grep | grep -v "cursor" | grep -v vscode || echo "NOT_RUNNING"')
+    assert check["process"].pattern == "vite.*8080\\|x"
+    assert check["exclude"] == ("grep", "cursor", "vscode")
+
+
+def test_lsof_with_ps_fallback():
+    command = (
+        "if lsof -i:3002 >/dev/null 2>&1; then echo 'RUNNING'; "
+        "elif [ -n \"$(ps aux | grep -E 'node.*server\\.js.*3002' | grep -v grep | grep -v cursor | head -1)\" ]; "
+        "then echo 'RUNNING'; else echo 'NOT_RUNNING'; fi"
+    )
+    check = native_check(command)
+    assert check["port"] == 3002
+    assert check["process"].pattern == "node.*server\\.js.*3002"
+    assert check["exclude"] == ("grep", "cursor")
+
+
+def test_unrecognized_commands_fall_back():
+    assert native_check("pg_isready -h localhost -p 5432") is None
+    assert native_check("ps aux | grep -E 'x' | grep -v grep | wc -l") is None
+    assert native_check("ps aux | grep -E 'x' | grep -v grep || echo 'NOT_RUNNING'; rm -rf /tmp/x") is None
+    # 按列位置匹配的正则无法在快照上判断
+    assert native_check("ps aux | grep -E '^postgres' | grep -v grep || echo 'NOT_RUNNING'") is None
+    assert native_check("ps aux | grep -E '(' | grep -v grep || echo 'NOT_RUNNING'") is None
+
+
+def test_evaluate_matches_user_and_kernel_threads():
+    snapshot = _snapshot({
+        10: "postgres 10 /usr/lib/postgresql/12/bin/postgres -D /var/lib/postgresql/12/main",
+        11: "root 11 [kworker/0:1]",
+        12: "root 12 grep -E postgres",
+    })
+    by_user = native_check("ps aux | grep -E 'postgres' | grep -v grep || echo 'NOT_RUNNING'")
+    assert evaluate_check(by_user, snapshot) == {"running": True, "pids": [10]}
+    kernel = native_check("ps aux | grep -E '\\[kworker' | grep -v grep || echo 'NOT_RUNNING'")
+    assert evaluate_check(kernel, snapshot) == {"running": True, "pids": [11]}
+
+
+def test_evaluate_port_short_circuits():
+    check = native_check(
+        "if lsof -i:3002 >/dev/null 2>&1; then echo 'RUNNING'; "
+        "elif [ -n \"$(ps aux | grep -E 'scratch-runner' | grep -v grep | head -1)\" ]; "
+        "then echo 'RUNNING'; else echo 'NOT_RUNNING'; fi"
+    )
+    assert evaluate_check(check, _snapshot({}, ports=[3002])) == {"running": True, "pids": []}
+    assert evaluate_check(check, _snapshot({})) == {"running": False, "pids": []}
@@ -0,0 +1,19 @@
+"""script_graph 分层的回归测试"""
+from script_graph import _layer
+
+
+def test_layer_breaks_only_cycle_edges():
+    # A -> B 不在环上，只能去掉环 A -> C -> A 上的边，B 仍在 A 之后启动
+    edges = {("A", "B"): {}, ("A", "C"): {}, ("C", "A"): {}}
+    levels, warnings = _layer(["A", "B", "C"], edges)
+    position = {node: index for index, level in enumerate(levels) for node in level}
+    assert ("A", "B") in edges
+    assert position["A"] < position["B"]
+    assert len(warnings) == 1 and "A -> B" not in warnings[0]
+
+
+def test_layer_without_cycle():
+    edges = {("A", "B"): {}, ("B", "C"): {}}
+    levels, warnings = _layer(["C", "B", "A"], edges)
+    assert levels == [["A"], ["B"], ["C"]]
+    assert warnings == []
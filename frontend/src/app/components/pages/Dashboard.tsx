@@ -3,7 +3,7 @@ import React from 'react';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/app/components/ui/card';
 import { StatusBadge, ServiceStatus } from '@/app/components/StatusBadge';
 import { Server, Clock, RefreshCw, RotateCw, ChevronDown, ChevronUp, Loader2, Terminal } from 'lucide-react';
-import { fetchStatus, fetchConfig, fetchServers, ServiceHealth, restartProject, getRestartLog, switchServer } from '@/app/components/ui/api';
+import { fetchStatus, fetchFleetStatus, fetchConfig, fetchServers, ServiceHealth, restartProject, getRestartLog, restartLogStreamUrl, switchServer } from '@/app/components/ui/api';
 import { Button } from '@/app/components/ui/button';
 import { ScrollArea } from '@/app/components/ui/scroll-area';
 import { toast } from 'sonner';
@@ -41,6 +41,8 @@ export function Dashboard() {
   const [logContents, setLogContents] = useState<Record<string, string>>({});
   const [logPolling, setLogPolling] = useState<Record<string, NodeJS.Timeout>>({});
   const logPollingRefs = useRef<Record<string, NodeJS.Timeout>>({});
+  const logStreamRefs = useRef<Record<string, EventSource>>({});
+  const logCursorRefs = useRef<Record<string, string | undefined>>({});
   const logScrollRefs = useRef<Record<string, HTMLDivElement | null>>({});
 
   // 加载服务器列表
@@ -80,6 +82,36 @@ export function Dashboard() {
     }
   };
 
+  // 根据状态检查输出解析各服务状态
+  const parseServices = (output: string): ServiceHealth[] => {
+    const newServices: ServiceHealth[] = [];
+
+    // Parse Backend - 查找 [RUNNING] 标记或包含 runserver 的进程信息
+    const backendStatus: ServiceStatus = (output.includes('[RUNNING]') && output.includes('Django Backend')) || 
+                                         output.includes('python3 manage.py runserver') ? 'running' : 'stopped';
+    newServices.push({ name: 'Django Backend', description: 'API 服务', status: backendStatus, lastCheck: '刚刚' });
+
+    // Parse Nginx - 查找 [RUNNING] 标记或包含 Active: active (running)
+    const nginxStatus: ServiceStatus = (output.includes('[RUNNING]') && output.includes('Nginx')) || 
+                                      output.includes('Active: active (running)') ? 'running' : 'stopped';
+    newServices.push({ name: 'Nginx', description: 'Web 服务器', status: nginxStatus, lastCheck: '刚刚' });
+
+    // Parse API Health - 查找 [OK] 标记或包含 -> 200 的状态码
+    const apiStatus: ServiceStatus = (output.includes('[OK]') && output.includes('API Health')) || 
+                                    (output.includes('/api/website/ -> 200') || output.includes('-> 200 [OK]')) ? 'running' : 'error';
+    newServices.push({ name: 'API Health', description: '接口连通性', status: apiStatus, lastCheck: '刚刚' });
+
+    // Parse Scratch Editor - 查找状态标记
+    let classroomStatus: ServiceStatus = 'warning';
+    if (output.includes('host=metaseek.cc -> 200') || (output.includes('[OK]') && output.includes('Scratch Editor'))) {
+      classroomStatus = 'running';
+    } else if (output.includes('host=metaseek.cc -> 000') || (output.includes('[STOPPED]') && output.includes('Scratch Editor'))) {
+      classroomStatus = 'stopped';
+    }
+    newServices.push({ name: 'Scratch Editor', description: '课堂编辑器', status: classroomStatus, lastCheck: '刚刚' });
+    return newServices;
+  };
+
   // 加载单个服务器的状态
   const loadServerStatus = async (serverId: string) => {
     const server = servers[serverId];
@@ -106,32 +138,7 @@ export function Dashboard() {
       const statusRes = await fetchStatus(serverId);
 
       if (statusRes.success) {
-        const output = statusRes.stdout || '';
-        const newServices: ServiceHealth[] = [];
-
-        // Parse Backend - 查找 [RUNNING] 标记或包含 runserver 的进程信息
-        const backendStatus: ServiceStatus = (output.includes('[RUNNING]') && output.includes('Django Backend')) || 
-                                             output.includes('python3 manage.py runserver') ? 'running' : 'stopped';
-        newServices.push({ name: 'Django Backend', description: 'API 服务', status: backendStatus, lastCheck: '刚刚' });
-
-        // Parse Nginx - 查找 [RUNNING] 标记或包含 Active: active (running)
-        const nginxStatus: ServiceStatus = (output.includes('[RUNNING]') && output.includes('Nginx')) || 
-                                          output.includes('Active: active (running)') ? 'running' : 'stopped';
-        newServices.push({ name: 'Nginx', description: 'Web 服务器', status: nginxStatus, lastCheck: '刚刚' });
-
-        // Parse API Health - 查找 [OK] 标记或包含 -> 200 的状态码
-        const apiStatus: ServiceStatus = (output.includes('[OK]') && output.includes('API Health')) || 
-                                        (output.includes('/api/website/ -> 200') || output.includes('-> 200 [OK]')) ? 'running' : 'error';
-        newServices.push({ name: 'API Health', description: '接口连通性', status: apiStatus, lastCheck: '刚刚' });
-
-        // Parse Scratch Editor - 查找状态标记
-        let classroomStatus: ServiceStatus = 'warning';
-        if (output.includes('host=metaseek.cc -> 200') || (output.includes('[OK]') && output.includes('Scratch Editor'))) {
-          classroomStatus = 'running';
-        } else if (output.includes('host=metaseek.cc -> 000') || (output.includes('[STOPPED]') && output.includes('Scratch Editor'))) {
-          classroomStatus = 'stopped';
-        }
-        newServices.push({ name: 'Scratch Editor', description: '课堂编辑器', status: classroomStatus, lastCheck: '刚刚' });
+        const newServices = parseServices(statusRes.stdout || '');
 
         setServerStatuses(prev => ({
           ...prev,
@@ -189,12 +196,32 @@ export function Dashboard() {
         });
         setServerStatuses(prev => ({ ...prev, ...initialStatuses }));
         
-        // 加载每个服务器的状态
-        const serverIds = Object.keys(response.servers);
-        for (const serverId of serverIds) {
-          await loadServerStatus(serverId);
+        // 一次请求并发获取所有服务器的状态，超时的服务器不会拖慢整个页面
+        const fleetRes = await fetchFleetStatus();
+        const now = new Date().toLocaleTimeString();
+        setServerStatuses(prev => {
+          const next = { ...prev };
+          Object.keys(response.servers).forEach(serverId => {
+            const result = fleetRes.servers?.[serverId];
+            if (!result || !next[serverId]) return;
+            next[serverId] = {
+              ...next[serverId],
+              services: result.status?.success ? parseServices(result.status.stdout || '') : next[serverId].services,
+              config: response.servers[serverId],
+              lastCheck: result.timed_out ? '超时' : now,
+              loading: false,
+            };
+          });
+          return next;
+        });
+        const failed = Object.values(fleetRes.servers || {}).filter((result: any) => !result.success);
+        if (fleetRes.timed_out?.length) {
+          toast.warning(`${fleetRes.timed_out.length} 台服务器检查超时: ${fleetRes.timed_out.join(', ')}`);
+        } else if (failed.length) {
+          toast.error(`${failed.length} 台服务器状态获取失败`);
+        } else {
+          toast.success('系统状态已更新');
         }
-        toast.success('系统状态已更新');
       } else {
         toast.error('未找到服务器配置');
       }
@@ -273,14 +300,51 @@ export function Dashboard() {
     }
   };
 
-  // 开始轮询日志
+  // 开始跟踪日志：优先使用 SSE 只接收新追加的内容，浏览器不支持或连接失败时退回轮询
   const startLogPolling = (serverId: string) => {
-    // 清除之前的轮询
-    if (logPollingRefs.current[serverId]) {
-      clearInterval(logPollingRefs.current[serverId]);
+    stopLogPolling(serverId);
+
+    if (typeof EventSource === 'undefined') {
+      startLogIntervalPolling(serverId);
+      return;
     }
 
-    // 立即获取一次日志
+    const source = new EventSource(restartLogStreamUrl(serverId));
+    let opened = false;
+    source.addEventListener('open', () => {
+      opened = true;
+    });
+    source.addEventListener('data', (event: MessageEvent) => {
+      const payload = JSON.parse(event.data);
+      setLogContents(prev => ({
+        ...prev,
+        [serverId]: trimLogLines((prev[serverId] || '') + payload.data),
+      }));
+      scrollLogToBottom(serverId);
+    });
+    source.addEventListener('reset', () => {
+      // 日志文件被截断或重新创建（重启项目时会重写日志）
+      setLogContents(prev => ({ ...prev, [serverId]: '' }));
+    });
+    source.addEventListener('missing', () => {
+      setLogContents(prev => ({ ...prev, [serverId]: '[日志文件尚未创建，请稍候...]' }));
+    });
+    source.onerror = () => {
+      if (!opened) {
+        // 流式接口不可用，改为轮询
+        source.close();
+        delete logStreamRefs.current[serverId];
+        startLogIntervalPolling(serverId);
+      }
+      // 已建立过连接时由 EventSource 带 Last-Event-ID 自动重连
+    };
+    logStreamRefs.current[serverId] = source;
+  };
+
+  // 轮询日志（SSE 不可用时的后备方案）
+  const startLogIntervalPolling = (serverId: string) => {
+    // 立即获取一次日志（从文件末尾重新开始）
+    delete logCursorRefs.current[serverId];
     fetchLogContent(serverId);
 
     // 每1秒轮询一次，以获得更好的实时性
@@ -291,37 +355,57 @@ export function Dashboard() {
     logPollingRefs.current[serverId] = interval;
   };
 
-  // 停止轮询日志
+  // 停止跟踪日志
   const stopLogPolling = (serverId: string) => {
+    if (logStreamRefs.current[serverId]) {
+      logStreamRefs.current[serverId].close();
+      delete logStreamRefs.current[serverId];
+    }
     if (logPollingRefs.current[serverId]) {
       clearInterval(logPollingRefs.current[serverId]);
       delete logPollingRefs.current[serverId];
     }
   };
 
+  // 只保留最近的日志行，和轮询时的窗口大小一致
+  const trimLogLines = (content: string, maxLines: number = 500) => {
+    const lines = content.split('\n');
+    return lines.length > maxLines + 1 ? lines.slice(-(maxLines + 1)).join('\n') : content;
+  };
+
+  // 日志滚动到底部（等待 DOM 更新后再滚动）
+  const scrollLogToBottom = (serverId: string) => {
+    setTimeout(() => {
+      const scrollContainer = logScrollRefs.current[serverId];
+      if (scrollContainer) {
+        // 查找最近的 ScrollArea viewport
+        const scrollArea = scrollContainer.closest('[data-slot="scroll-area"]');
+        if (scrollArea) {
+          const viewport = scrollArea.querySelector('[data-slot="scroll-area-viewport"]') as HTMLElement;
+          if (viewport) {
+            viewport.scrollTop = viewport.scrollHeight;
+          }
+        }
+      }
+    }, 50);
+  };
+
   // 获取日志内容
   const fetchLogContent = async (serverId: string) => {
     try {
-      const response = await getRestartLog(serverId, 500); // 增加行数以显示更多内容
+      // 按游标只获取上次之后新增的内容
+      const cursor = logCursorRefs.current[serverId];
+      const response = await getRestartLog(serverId, 500, cursor ?? '');
       if (response.success) {
+        logCursorRefs.current[serverId] = response.cursor ?? undefined;
         setLogContents(prev => {
-          const newContent = response.log_content || '';
+          const delta = response.log_content || '';
+          const newContent = !cursor || response.reset || response.missing
+            ? delta
+            : trimLogLines((prev[serverId] || '') + delta);
           // 如果内容有变化，更新状态并滚动到底部
           if (prev[serverId] !== newContent) {
-            // 使用 setTimeout 确保 DOM 更新后再滚动
-            setTimeout(() => {
-              const scrollContainer = logScrollRefs.current[serverId];
-              if (scrollContainer) {
-                // 查找最近的 ScrollArea viewport
-                const scrollArea = scrollContainer.closest('[data-slot="scroll-area"]');
-                if (scrollArea) {
-                  const viewport = scrollArea.querySelector('[data-slot="scroll-area-viewport"]') as HTMLElement;
-                  if (viewport) {
-                    viewport.scrollTop = viewport.scrollHeight;
-                  }
-                }
-              }
-            }, 50);
+            scrollLogToBottom(serverId);
             return {
               ...prev,
               [serverId]: newContent,
@@ -372,6 +456,7 @@ export function Dashboard() {
   useEffect(() => {
     return () => {
       Object.values(logPollingRefs.current).forEach(interval => clearInterval(interval));
+      Object.values(logStreamRefs.current).forEach(source => source.close());
     };
   }, []);
 
@@ -1,95 +1,167 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/app/components/ui/card';
 import { Button } from '@/app/components/ui/button';
+import { Input } from '@/app/components/ui/input';
 import { Label } from '@/app/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/app/components/ui/select';
 import { Switch } from '@/app/components/ui/switch';
 import { ScrollArea } from '@/app/components/ui/scroll-area';
 import { toast } from 'sonner';
-import { FileText, RefreshCw, Download, Trash2, Loader2 } from 'lucide-react';
-import { fetchLogs } from '@/app/components/ui/api';
-
-interface LogEntry {
-  timestamp: string;
-  level?: string;
-  message: string;
-  raw?: string;
-}
+import { FileText, RefreshCw, Download, Trash2, Loader2, Search } from 'lucide-react';
+import { fetchLogRecords, LogRecord } from '@/app/components/ui/api';
 
 const logSources = [
-  { value: 'backend-error', label: 'Backend Error Log', path: '/tmp/oj_error.log' },
-  { value: 'nginx-access', label: 'Nginx Access Log', path: '/var/log/nginx/access.log' },
-  { value: 'nginx-error', label: 'Nginx Error Log', path: '/var/log/nginx/error.log' },
-  { value: 'judge', label: 'Scratch Editor Log', path: '/tmp/scratch_editor.log' },
-  { value: 'scratch', label: 'Scratch Runner Log', path: '/home/ubuntu/MetaSeekOJ/logs/scratch-runner.log' },
+  { value: 'backend-error', label: 'Backend Error Log' },
+  { value: 'backend-access', label: 'Backend Access Log' },
+  { value: 'nginx-access', label: 'Nginx Access Log' },
+  { value: 'nginx-error', label: 'Nginx Error Log' },
+  { value: 'scratch-editor', label: 'Scratch Editor Log' },
+  { value: 'scratch-runner', label: 'Scratch Runner Log' },
+];
+
+const levelOptions = [
+  { value: 'all', label: '全部级别' },
+  { value: 'ERROR,CRITICAL', label: '错误' },
+  { value: 'WARNING', label: '警告' },
+  { value: 'INFO', label: '信息' },
+  { value: 'DEBUG', label: '调试' },
 ];
 
+// 每页加载的记录数，以及页面最多保留的记录数
+const PAGE_SIZE = 100;
+const MAX_LOG_ENTRIES = 1000;
+
+interface LogFilters {
+  level: string;
+  q: string;
+  since: string;
+  until: string;
+}
+
+const emptyFilters: LogFilters = { level: 'all', q: '', since: '', until: '' };
+
 export function Logs() {
   const [selectedSource, setSelectedSource] = useState<string>('backend-error');
-  const [logs, setLogs] = useState<LogEntry[]>([]);
+  const [logs, setLogs] = useState<LogRecord[]>([]);
   const [autoRefresh, setAutoRefresh] = useState(false);
   const [isRefreshing, setIsRefreshing] = useState(false);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  // 输入框中的过滤条件，点击查询后才生效
+  const [draftFilters, setDraftFilters] = useState<LogFilters>(emptyFilters);
+  const [filters, setFilters] = useState<LogFilters>(emptyFilters);
+  // 继续加载更早记录的游标；为空表示已到文件开头
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  // 文件末尾的游标，自动刷新时只获取之后新增的记录
+  const tailCursorRef = useRef<string | null>(null);
 
   useEffect(() => {
     handleRefresh(true);
-  }, [selectedSource]);
+  }, [selectedSource, filters]);
 
   useEffect(() => {
     let interval: NodeJS.Timeout;
     if (autoRefresh) {
       interval = setInterval(() => {
-        handleRefresh(true);
+        loadNewRecords();
       }, 5000);
     }
     return () => clearInterval(interval);
-  }, [autoRefresh, selectedSource]);
+  }, [autoRefresh, selectedSource, filters]);
+
+  const buildQuery = () => ({
+    source: selectedSource,
+    level: filters.level === 'all' ? undefined : filters.level,
+    q: filters.q.trim() || undefined,
+    since: filters.since || undefined,
+    until: filters.until || undefined,
+    limit: PAGE_SIZE,
+  });
 
   const handleSourceChange = (value: string) => {
     setSelectedSource(value);
     setLogs([]);
+    setNextCursor(null);
+    tailCursorRef.current = null;
+  };
+
+  const applyFilters = () => {
+    setFilters({ ...draftFilters });
   };
 
-  const parseLogLine = (line: string): LogEntry => {
-    let level = 'INFO';
-    if (line.toLowerCase().includes('error')) level = 'ERROR';
-    else if (line.toLowerCase().includes('warn')) level = 'WARNING';
-    
-    const timeMatch = line.match(/\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}/) || line.match(/\d{2}\/\w+\/\d{4}:\d{2}:\d{2}:\d{2}/);
-    const timestamp = timeMatch ? timeMatch[0] : '';
-    
-    return {
-        timestamp,
-        level,
-        message: line,
-        raw: line
-    };
+  const resetFilters = () => {
+    setDraftFilters(emptyFilters);
+    setFilters(emptyFilters);
   };
 
+  // 加载第一页（最新的记录）
   const handleRefresh = async (silent = false) => {
     if (!silent) {
       setIsRefreshing(true);
       toast.info('正在刷新日志...');
     }
-    
+
     try {
-        const sourceConfig = logSources.find(s => s.value === selectedSource);
-        if (!sourceConfig) return;
+      const res = await fetchLogRecords(buildQuery());
+      if (res.success) {
+        setLogs(res.records);
+        setNextCursor(res.next_cursor);
+        tailCursorRef.current = res.tail_cursor;
+        if (!silent) toast.success('日志已刷新');
+      } else {
+        if (!silent) toast.error('刷新失败: ' + res.error);
+      }
+    } catch (e: any) {
+      if (!silent) toast.error('请求失败: ' + e.message);
+    } finally {
+      if (!silent) setIsRefreshing(false);
+    }
+  };
 
-        const cmd = `tail -n 100 ${sourceConfig.path}`;
-        const res = await fetchLogs(cmd);
+  // 获取 tail_cursor 之后新增的记录，加到最前面
+  const loadNewRecords = async () => {
+    if (!tailCursorRef.current) {
+      handleRefresh(true);
+      return;
+    }
+    try {
+      const res = await fetchLogRecords({ ...buildQuery(), after: tailCursorRef.current });
+      if (!res.success) return;
+      if (res.reset) {
+        // 文件被截断或轮转，重新加载第一页
+        handleRefresh(true);
+        return;
+      }
+      tailCursorRef.current = res.tail_cursor;
+      if (res.records.length > 0) {
+        setLogs(prev => [...res.records, ...prev].slice(0, MAX_LOG_ENTRIES));
+      }
+    } catch (e) {
+      // 自动刷新失败时静默，下次继续
+    }
+  };
 
-        if (res.success) {
-            const lines = (res.stdout || '').split('\n').filter(Boolean).reverse();
-            const parsedLogs = lines.map(parseLogLine);
-            setLogs(parsedLogs);
-            if (!silent) toast.success('日志已刷新');
+  // 加载更早的一页
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const res = await fetchLogRecords({ ...buildQuery(), cursor: nextCursor });
+      if (res.success) {
+        if (res.reset) {
+          toast.info('日志文件已轮转，已重新加载');
+          setLogs(res.records);
+          tailCursorRef.current = res.tail_cursor;
         } else {
-            if (!silent) toast.error('刷新失败: ' + res.error);
+          setLogs(prev => [...prev, ...res.records].slice(0, MAX_LOG_ENTRIES));
         }
-    } catch (e) {
-        if (!silent) toast.error('请求失败');
+        setNextCursor(res.next_cursor);
+      } else {
+        toast.error('加载失败: ' + res.error);
+      }
+    } catch (e: any) {
+      toast.error('请求失败: ' + e.message);
     } finally {
-        if (!silent) setIsRefreshing(false);
+      setIsLoadingMore(false);
     }
   };
 
@@ -112,10 +184,11 @@ export function Logs() {
 
   const getLevelColor = (level?: string) => {
     switch (level?.toUpperCase()) {
+      case 'CRITICAL': return 'text-red-400';
       case 'ERROR': return 'text-red-500';
       case 'WARNING': return 'text-yellow-500';
       case 'INFO': return 'text-blue-500';
-      case 'LOG': return 'text-green-500';
+      case 'DEBUG': return 'text-green-500';
       default: return 'text-slate-400';
     }
   };
@@ -133,9 +206,9 @@ export function Logs() {
             <FileText className="w-5 h-5" />
             日志查看器
           </CardTitle>
-          <CardDescription>选择日志源并配置刷新选项</CardDescription>
+          <CardDescription>选择日志源、过滤条件并配置刷新选项</CardDescription>
         </CardHeader>
-        <CardContent>
+        <CardContent className="space-y-4">
           <div className="flex flex-wrap items-end gap-4">
             <div className="flex-1 min-w-[200px] space-y-2">
               <Label htmlFor="log-source">日志源</Label>
@@ -173,6 +246,65 @@ export function Logs() {
               <Button variant="outline" onClick={handleDownload}><Download className="w-4 h-4 mr-2" />下载</Button>
             </div>
           </div>
+
+          <div className="flex flex-wrap items-end gap-4">
+            <div className="w-[140px] space-y-2">
+              <Label htmlFor="log-level">级别</Label>
+              <Select
+                value={draftFilters.level}
+                onValueChange={(value) => setDraftFilters({ ...draftFilters, level: value })}
+              >
+                <SelectTrigger id="log-level">
+                  <SelectValue />
+                </SelectTrigger>
+                <SelectContent>
+                  {levelOptions.map(option => (
+                    <SelectItem key={option.value} value={option.value}>
+                      {option.label}
+                    </SelectItem>
+                  ))}
+                </SelectContent>
+              </Select>
+            </div>
+
+            <div className="flex-1 min-w-[200px] space-y-2">
+              <Label htmlFor="log-query">关键字</Label>
+              <Input
+                id="log-query"
+                placeholder="搜索日志内容"
+                value={draftFilters.q}
+                onChange={(e) => setDraftFilters({ ...draftFilters, q: e.target.value })}
+                onKeyDown={(e) => { if (e.key === 'Enter') applyFilters(); }}
+              />
+            </div>
+
+            <div className="space-y-2">
+              <Label htmlFor="log-since">开始时间</Label>
+              <Input
+                id="log-since"
+                type="datetime-local"
+                step="1"
+                value={draftFilters.since}
+                onChange={(e) => setDraftFilters({ ...draftFilters, since: e.target.value })}
+              />
+            </div>
+
+            <div className="space-y-2">
+              <Label htmlFor="log-until">结束时间</Label>
+              <Input
+                id="log-until"
+                type="datetime-local"
+                step="1"
+                value={draftFilters.until}
+                onChange={(e) => setDraftFilters({ ...draftFilters, until: e.target.value })}
+              />
+            </div>
+
+            <div className="flex gap-2">
+              <Button onClick={applyFilters}><Search className="w-4 h-4 mr-2" />查询</Button>
+              <Button variant="outline" onClick={resetFilters}>重置</Button>
+            </div>
+          </div>
         </CardContent>
       </Card>
 
@@ -180,7 +312,7 @@ export function Logs() {
         <CardHeader>
           <div className="flex items-center justify-between">
             <CardTitle className="text-base">日志内容</CardTitle>
-            <span className="text-sm text-slate-500">{logs.length} 条记录 (显示最近 100 行)</span>
+            <span className="text-sm text-slate-500">{logs.length} 条记录 (最多保留 {MAX_LOG_ENTRIES} 条)</span>
           </div>
         </CardHeader>
         <CardContent>
@@ -191,17 +323,23 @@ export function Logs() {
               </div>
             ) : (
               <div className="font-mono text-xs space-y-1">
-                {logs.map((log, index) => (
-                  <div key={index} className="flex gap-3 hover:bg-slate-900 px-2 py-1 rounded">
+                {logs.map((log) => (
+                  <div key={`${log.source}-${log.offset}`} className="flex gap-3 hover:bg-slate-900 px-2 py-1 rounded">
                     <span className="text-slate-500 shrink-0">{log.timestamp}</span>
-                    {log.level && (
-                      <span className={`font-semibold shrink-0 w-16 ${getLevelColor(log.level)}`}>
-                        [{log.level}]
-                      </span>
-                    )}
-                    <span className="text-slate-300 break-all">{log.message}</span>
+                    <span className={`font-semibold shrink-0 w-16 ${getLevelColor(log.level)}`}>
+                      [{log.level}]
+                    </span>
+                    <span className="text-slate-300 break-all whitespace-pre-wrap">{log.message}</span>
                   </div>
                 ))}
+                {nextCursor && logs.length < MAX_LOG_ENTRIES && (
+                  <div className="flex justify-center pt-2">
+                    <Button variant="outline" size="sm" onClick={handleLoadMore} disabled={isLoadingMore}>
+                      {isLoadingMore && <Loader2 className="w-4 h-4 mr-2 animate-spin" />}
+                      加载更早的日志
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
           </ScrollArea>
@@ -211,7 +349,7 @@ export function Logs() {
       <div className="grid grid-cols-1 md:grid-cols-4 gap-4">
         <Card>
           <CardContent className="pt-6">
-            <div className="text-2xl font-semibold text-red-600">{logs.filter(l => l.level === 'ERROR').length}</div>
+            <div className="text-2xl font-semibold text-red-600">{logs.filter(l => l.level === 'ERROR' || l.level === 'CRITICAL').length}</div>
             <p className="text-sm text-slate-600 mt-1">错误 (Errors)</p>
           </CardContent>
         </Card>
@@ -6,7 +6,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { AlertDialog, AlertDialogAction, AlertDialogCancel, AlertDialogContent, AlertDialogDescription, AlertDialogFooter, AlertDialogHeader, AlertDialogTitle } from '@/app/components/ui/alert-dialog';
 import { toast } from 'sonner';
 import { RotateCw, Square, Activity, Loader2, Play, Database, Package, Server, RefreshCw, Network, AlertTriangle } from 'lucide-react';
-import { fetchServers, switchServer, serviceOperation, localServiceStatus, localServiceOperation } from '@/app/components/ui/api';
+import { fetchServers, switchServer, serviceOperation, bulkServiceStatus, localServiceStatus, localServiceOperation } from '@/app/components/ui/api';
 
 // 根据启动脚本写死的服务列表
 interface ServiceItem {
@@ -231,8 +231,36 @@ export function Services() {
 
   // 检查所有服务状态（批量刷新不逐个 toast）
   const checkAllServicesStatus = async (items: ServiceItem[]) => {
-    for (const item of items) {
-      await checkServiceStatus(item.id, false);
+    if (!currentServerId) return;
+    if (currentServerId === LOCAL_SERVER_ID) {
+      for (const item of items) {
+        await checkServiceStatus(item.id, false);
+      }
+    } else if (items.length > 0) {
+      // 远程服务器一次请求检查所有服务
+      setLoadingOperations(prev => {
+        const newState = { ...prev };
+        items.forEach(item => { newState[`${item.id}-status`] = 'checking'; });
+        return newState;
+      });
+      try {
+        const result = await bulkServiceStatus(currentServerId, items.map(item => item.name));
+        items.forEach(item => {
+          const status = result.services?.[item.name]?.status;
+          updateServiceStatus(item.id, status === 'running' ? 'running' : status === 'stopped' ? 'stopped' : 'error');
+        });
+      } catch (error: any) {
+        console.error('批量检查服务状态失败:', error);
+        items.forEach(item => updateServiceStatus(item.id, 'error'));
+        toast.error('刷新服务状态失败', { description: error?.message || '未知错误' });
+        return;
+      } finally {
+        setLoadingOperations(prev => {
+          const newState = { ...prev };
+          items.forEach(item => { delete newState[`${item.id}-status`]; });
+          return newState;
+        });
+      }
     }
     if (items.length > 0) {
       toast.success('已刷新所有服务状态', { description: `共 ${items.length} 个服务` });
@@ -254,7 +282,8 @@ export function Services() {
         const result = await localServiceStatus(item.id, item.checkCommand, item.port);
         status = result.status === 'running' ? 'running' : result.status === 'stopped' ? 'stopped' : 'error';
       } else {
-        const result = await serviceOperation(currentServerId, item.name, 'status');
+        // 手动健康检查时强制实时检查，批量刷新使用后台快照
+        const result = await serviceOperation(currentServerId, item.name, 'status', undefined, showToast);
         status = result.status === 'running' ? 'running' : result.status === 'stopped' ? 'stopped' : 'error';
       }
       updateServiceStatus(serviceId, status);
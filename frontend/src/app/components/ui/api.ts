@@ -14,10 +14,32 @@ export interface ServerConfig {
   server_id?: string;
 }
 
-export async function fetchStatus(serverId?: string) {
-  const url = serverId 
-    ? `${API_BASE_URL}/status?server_id=${encodeURIComponent(serverId)}`
-    : `${API_BASE_URL}/status`;
+// fresh 为 true 时跳过后台轮询快照，强制实时检查
+export async function fetchStatus(serverId?: string, fresh: boolean = false) {
+  const params = new URLSearchParams();
+  if (serverId) params.set('server_id', serverId);
+  if (fresh) params.set('fresh', '1');
+  const query = params.toString();
+  const url = query ? `${API_BASE_URL}/status?${query}` : `${API_BASE_URL}/status`;
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+  }
+  const text = await response.text();
+  if (!text || text.trim() === '') {
+    throw new Error('服务器返回空响应');
+  }
+  try {
+    return JSON.parse(text);
+  } catch (e) {
+    console.error('JSON解析失败:', text);
+    throw new Error(`JSON解析失败: ${e}`);
+  }
+}
+
+// 并发获取所有服务器的状态，deadline 秒内未返回的服务器标记为 timed_out
+export async function fetchFleetStatus(deadline?: number) {
+  const url = deadline ? `${API_BASE_URL}/fleet/status?deadline=${deadline}` : `${API_BASE_URL}/fleet/status`;
   const response = await fetch(url);
   if (!response.ok) {
     throw new Error(`HTTP ${response.status}: ${response.statusText}`);
@@ -95,8 +117,9 @@ export async function restartService(service: string) {
   return response.json();
 }
 
-export async function syncCode(scope: string) {
-  const response = await fetch(`${API_BASE_URL}/sync`, {
+// background 为 true 时提交为后台任务，立即返回 job_id（见 fetchJob / jobStreamUrl）
+export async function syncCode(scope: string, background: boolean = false) {
+  const response = await fetch(`${API_BASE_URL}/sync${background ? '?background=true' : ''}`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -106,8 +129,8 @@ export async function syncCode(scope: string) {
   return response.json();
 }
 
-export async function buildFrontend(type: string, memory_limit: number = 8192, incremental: boolean = true) {
-  const response = await fetch(`${API_BASE_URL}/build`, {
+export async function buildFrontend(type: string, memory_limit: number = 8192, incremental: boolean = true, background: boolean = false) {
+  const response = await fetch(`${API_BASE_URL}/build${background ? '?background=true' : ''}`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -128,6 +151,99 @@ export async function fetchLogs(command: string) {
   return response.json();
 }
 
+// 按游标增量读取允许的日志文件，cursor 为空时返回文件末尾的内容
+export async function fetchLogRange(file: string, cursor?: string | null, serverId?: string) {
+  const response = await fetch(`${API_BASE_URL}/logs`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ file, cursor: cursor || null, server_id: serverId }),
+  });
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+export interface LogRecord {
+  offset: number;
+  source: string;
+  timestamp: string | null;
+  ts: number | null;
+  level: string;
+  message: string;
+  raw: string;
+  fields: Record<string, any>;
+}
+
+export interface LogQuery {
+  source: string;
+  serverId?: string;
+  level?: string;
+  q?: string;
+  since?: string;
+  until?: string;
+  limit?: number;
+  cursor?: string | null;  // 上次返回的 next_cursor：继续加载更早的记录
+  after?: string | null;   // 上次返回的 tail_cursor：只获取之后新增的记录
+}
+
+// 查询结构化日志记录（后端解析、过滤、分页，从新到旧）
+export async function fetchLogRecords(query: LogQuery) {
+  const response = await fetch(`${API_BASE_URL}/logs`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      source: query.source,
+      server_id: query.serverId,
+      level: query.level || null,
+      q: query.q || null,
+      since: query.since || null,
+      until: query.until || null,
+      limit: query.limit ?? 100,
+      cursor: query.cursor || null,
+      after: query.after || null,
+    }),
+  });
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+// 在本地日志索引中搜索（后台定期从各服务器同步），cursor 为上次返回的 next_cursor
+export async function searchLogs(params: {
+  q?: string;
+  serverId?: string;
+  source?: string;
+  level?: string;
+  since?: string;
+  until?: string;
+  limit?: number;
+  cursor?: string | null;
+}) {
+  const query = new URLSearchParams();
+  if (params.q) query.set('q', params.q);
+  if (params.serverId) query.set('server_id', params.serverId);
+  if (params.source) query.set('source', params.source);
+  if (params.level) query.set('level', params.level);
+  if (params.since) query.set('since', params.since);
+  if (params.until) query.set('until', params.until);
+  if (params.limit) query.set('limit', String(params.limit));
+  if (params.cursor) query.set('cursor', params.cursor);
+  const response = await fetch(`${API_BASE_URL}/logs/search?${query.toString()}`);
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
 export async function fixScratch() {
   const response = await fetch(`${API_BASE_URL}/fix/scratch`, {
     method: 'POST',
@@ -135,8 +251,8 @@ export async function fixScratch() {
   return response.json();
 }
 
-export async function restartProject(serverId: string, startScript?: string) {
-  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/restart-project`, {
+export async function restartProject(serverId: string, startScript?: string, background: boolean = false) {
+  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/restart-project${background ? '?background=true' : ''}`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -152,8 +268,10 @@ export async function restartProject(serverId: string, startScript?: string) {
   return response.json();
 }
 
-export async function getRestartLog(serverId: string, lines: number = 100) {
-  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/restart-log?lines=${lines}`);
+// 传入 cursor 时只返回游标之后新增的内容（首次传空字符串），返回的 cursor 用于下一次请求
+export async function getRestartLog(serverId: string, lines: number = 100, cursor?: string) {
+  const query = cursor !== undefined ? `cursor=${encodeURIComponent(cursor)}` : `lines=${lines}`;
+  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/restart-log?${query}`);
   
   if (!response.ok) {
     const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
@@ -163,6 +281,70 @@ export async function getRestartLog(serverId: string, lines: number = 100) {
   return response.json();
 }
 
+// 重启日志的 Server-Sent Events 地址：只推送新追加的内容，文件被截断/重建时推送 reset 事件
+export function restartLogStreamUrl(serverId: string) {
+  return `${API_BASE_URL}/servers/${serverId}/restart-log/stream`;
+}
+
+// 多台服务器同一日志源按时间合并的 Server-Sent Events 地址（records / host / lag 事件），serverIds 为空时跟踪所有服务器
+export function mergedLogStreamUrl(source: string, serverIds?: string[]) {
+  const params = new URLSearchParams({ source });
+  if (serverIds && serverIds.length > 0) params.set('server_ids', serverIds.join(','));
+  return `${API_BASE_URL}/logs/merged-stream?${params.toString()}`;
+}
+
+// nginx 访问日志统计（请求速率、状态码、热门/慢路径、request_time 分位数），serverId 为空时返回所有服务器合并的统计
+export async function fetchAccessStats(serverId?: string, windowMinutes?: number, top: number = 10) {
+  const params = new URLSearchParams({ top: String(top) });
+  if (windowMinutes) params.set('window', String(windowMinutes));
+  const url = serverId
+    ? `${API_BASE_URL}/servers/${serverId}/access-stats?${params.toString()}`
+    : `${API_BASE_URL}/fleet/access-stats?${params.toString()}`;
+  const response = await fetch(url);
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+// 按启动脚本解析出的依赖图并行启动服务，立即返回启动记录（run_id），services 为空时启动全部
+export async function startProjectOrchestrated(serverId: string, options: { startScript?: string; services?: string[]; readyTimeout?: number } = {}) {
+  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/startup`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      start_script: options.startScript,
+      services: options.services,
+      ready_timeout: options.readyTimeout,
+    }),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+
+  return response.json();
+}
+
+// 并行启动的进度（每个服务的状态和耗时、关键路径）
+export async function fetchStartupRun(serverId: string, runId: string) {
+  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/startup/${runId}`);
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+// 并行启动进度的 Server-Sent Events 地址（step / run 事件）
+export function startupRunStreamUrl(serverId: string, runId: string) {
+  return `${API_BASE_URL}/servers/${serverId}/startup/${runId}/stream`;
+}
+
 // 解析启动脚本
 export async function parseScript(serverId: string, scriptPath?: string) {
   const response = await fetch(`${API_BASE_URL}/servers/${serverId}/parse-script`, {
@@ -182,13 +364,16 @@ export async function parseScript(serverId: string, scriptPath?: string) {
 }
 
 // 服务操作（启动、停止、重启、状态检查）
+// 状态检查默认返回后台轮询快照，fresh 为 true 时强制实时检查
 export async function serviceOperation(
   serverId: string,
   serviceName: string,
   operation: 'start' | 'stop' | 'restart' | 'status',
-  scriptPath?: string
+  scriptPath?: string,
+  fresh: boolean = false
 ) {
-  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/service-operation`, {
+  const query = fresh ? '?fresh=1' : '';
+  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/service-operation${query}`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -208,6 +393,27 @@ export async function serviceOperation(
   return response.json();
 }
 
+// 批量检查服务状态：一次请求、一个SSH连接完成所有服务的检查
+export async function bulkServiceStatus(serverId: string, serviceNames: string[], fresh: boolean = false) {
+  const query = fresh ? '?fresh=1' : '';
+  const response = await fetch(`${API_BASE_URL}/servers/${serverId}/services/status${query}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      service_names: serviceNames,
+    }),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+
+  return response.json();
+}
+
 // 本地服务状态检查（用于 localhost 模式）
 export async function localServiceStatus(serviceId: string, checkCommand: string, port?: number) {
   const response = await fetch(`${API_BASE_URL}/services/local/status`, {
@@ -226,9 +432,10 @@ export async function localServiceStatus(serviceId: string, checkCommand: string
 export async function localServiceOperation(
   serviceId: string,
   operation: 'start' | 'stop' | 'restart',
-  command?: string
+  command?: string,
+  background: boolean = false
 ) {
-  const response = await fetch(`${API_BASE_URL}/services/local/operation`, {
+  const response = await fetch(`${API_BASE_URL}/services/local/operation${background ? '?background=true' : ''}`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify({ service_id: serviceId, operation, command: command || '' }),
@@ -239,3 +446,92 @@ export async function localServiceOperation(
   }
   return data;
 }
+
+// 后台任务：状态（queued / running / succeeded / failed / cancelled）、进度、结果和进度事件
+export async function fetchJob(jobId: string) {
+  const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+export async function fetchJobs(options: { host?: string; state?: string; limit?: number } = {}) {
+  const params = new URLSearchParams();
+  if (options.host) params.set('host', options.host);
+  if (options.state) params.set('state', options.state);
+  if (options.limit) params.set('limit', String(options.limit));
+  const response = await fetch(`${API_BASE_URL}/jobs?${params.toString()}`);
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+export async function cancelJob(jobId: string) {
+  const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/cancel`, { method: 'POST' });
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+// 后台任务进度的 Server-Sent Events 地址（state / progress / end 事件）
+export function jobStreamUrl(jobId: string) {
+  return `${API_BASE_URL}/jobs/${jobId}/stream`;
+}
+
+// 服务注册表：服务的匹配规则和启动/停止/重启/状态命令
+export interface ServiceDefinition {
+  service_key: string;
+  name: string;
+  match: string[][];
+  aliases: string[];
+  start_command?: string | null;
+  stop_command?: string | null;
+  restart_command?: string | null;
+  status_command?: string | null;
+  readiness?: Record<string, any> | null;
+  ports: number[];
+  log_file?: string | null;
+  process_pattern?: string | null;
+  docker_pattern?: string | null;
+  port_sufficient?: boolean;
+  scope: 'all' | 'remote';
+  sort_order: number;
+  is_active: boolean;
+}
+
+export async function fetchServiceRegistry(): Promise<{ success: boolean; services: ServiceDefinition[] }> {
+  const response = await fetch(`${API_BASE_URL}/services/registry`);
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+export async function saveServiceDefinition(serviceKey: string, definition: Omit<ServiceDefinition, 'service_key' | 'sort_order'> & { sort_order?: number }) {
+  const response = await fetch(`${API_BASE_URL}/services/registry/${serviceKey}`, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(definition),
+  });
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+export async function deleteServiceDefinition(serviceKey: string) {
+  const response = await fetch(`${API_BASE_URL}/services/registry/${serviceKey}`, { method: 'DELETE' });
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: `HTTP ${response.status}: ${response.statusText}` }));
+    throw new Error(errorData.detail || errorData.message || `HTTP ${response.status}`);
+  }
+  return response.json();
+}